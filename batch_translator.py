@@ -0,0 +1,197 @@
+"""
+Перевод с объединением одновременных запросов в пакеты
+"""
+
+import asyncio
+import logging
+import re
+
+from metrics import track_backend
+from text_utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+# Метка номера текста в склеенном запросе: [[0]] первый текст\n[[1]] второй...
+LINE_MARKER = re.compile(r'\[\[(\d+)\]\]')
+
+
+def google_translator(**kwargs):
+    """
+    Создает GoogleTranslator; deep-translator импортируется при первом переводе
+    """
+    from deep_translator import GoogleTranslator
+    return GoogleTranslator(**kwargs)
+
+
+def split_marked(translated: str, count: int):
+    """
+    Разбирает перевод склеенного запроса: в каждой строке ровно одна метка
+    [[i]], метки идут по порядку от 0 до count - 1. Возвращает переводы
+    без меток или None, если строки не соответствуют текстам
+    """
+    lines = [line for line in (translated or '').split('\n') if line.strip()]
+    if len(lines) != count:
+        return None
+    results = []
+    for i, line in enumerate(lines):
+        markers = LINE_MARKER.findall(line)
+        if markers != [str(i)]:
+            return None
+        result = ' '.join(LINE_MARKER.sub(' ', line).split())
+        if not result:
+            return None
+        results.append(result)
+    return results
+
+
+class BatchingTranslator:
+    """
+    Собирает запросы на перевод за window секунд и переводит их пакетами.
+
+    Пакеты группируются по паре языков. Одинаковые тексты (в том числе
+    запрошенные, пока такой же перевод уже выполняется) переводятся один
+    раз, результат получают все ожидающие. Пакет отправляется, когда
+    прошло window секунд с первого запроса или набралось max_batch текстов.
+
+    deep-translator выполняет translate_batch по одному запросу на текст,
+    поэтому однострочные тексты пакета склеиваются через перевод строки
+    в один запрос (не длиннее max_chars), каждая строка с меткой номера
+    текста, и разбираются обратно по меткам. Тексты разных пользователей
+    попадают в один запрос, поэтому совпадения числа строк недостаточно:
+    если сервис склеил или разбил строки и хотя бы одна метка потерялась,
+    повторилась или сдвинулась, пакет переводится по одному тексту через
+    translate_batch, а при ошибке запроса каждый текст
+    переводится отдельно, чтобы ошибка одного не затронула остальные.
+    """
+
+    def __init__(
+        self,
+        executor,
+        translator_factory=google_translator,
+        window: float = 0.01,
+        max_batch: int = 20,
+        max_chars: int = 4500,
+    ):
+        self.executor = executor
+        self.translator_factory = translator_factory
+        self.window = window
+        self.max_batch = max_batch
+        self.max_chars = max_chars
+        self._pending = {}  # (source, target) -> {нормализованный текст: исходный текст}
+        self._timers = {}  # (source, target) -> таймер отправки пакета
+        self._futures = {}  # (source, target, нормализованный текст) -> Future
+        self._tasks = set()
+        self.requests = 0
+        self.coalesced = 0
+        self.batches = 0
+        self.upstream_calls = 0
+
+    async def translate(self, text: str, source: str = 'ru', target: str = 'en') -> str:
+        """
+        Переводит текст; одновременные запросы объединяются в пакеты
+        """
+        self.requests += 1
+        pair = (source, target)
+        normalized = normalize_text(text)
+        key = (source, target, normalized)
+        future = self._futures.get(key)
+        if future is not None:
+            self.coalesced += 1
+        else:
+            future = self._futures[key] = asyncio.get_running_loop().create_future()
+            batch = self._pending.setdefault(pair, {})
+            batch[normalized] = text
+            if len(batch) >= self.max_batch:
+                self._flush(pair)
+            elif pair not in self._timers:
+                self._timers[pair] = asyncio.get_running_loop().call_later(self.window, self._flush, pair)
+        # Отмена одного ожидающего не должна отменять общий перевод
+        return await asyncio.shield(future)
+
+    def _flush(self, pair):
+        timer = self._timers.pop(pair, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(pair, None)
+        if not batch:
+            return
+        self.batches += 1
+        task = asyncio.create_task(self._run_batch(pair, batch))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, pair, batch: dict):
+        source, target = pair
+        await asyncio.gather(*(self._run_chunk(source, target, batch, chunk) for chunk in self._chunks(batch)))
+
+    async def _run_chunk(self, source: str, target: str, batch: dict, chunk: list):
+        texts = [batch[normalized] for normalized in chunk]
+        try:
+            with track_backend('translator'):
+                results, calls = await self.executor.run('translator', self._translate_chunk, source, target, texts)
+            self.upstream_calls += calls
+        except Exception as e:
+            if len(chunk) > 1:
+                # Ошибка на одном тексте не должна ронять весь пакет - переводим по одному
+                await asyncio.gather(*(self._run_chunk(source, target, batch, [normalized]) for normalized in chunk))
+                return
+            self._resolve((source, target, chunk[0]), error=e)
+            return
+        for normalized, translated in zip(chunk, results):
+            self._resolve((source, target, normalized), result=translated)
+
+    def _resolve(self, key, result=None, error=None):
+        future = self._futures.pop(key, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def _chunks(self, batch: dict) -> list:
+        """
+        Делит пакет на части, которые уходят одним запросом: однострочные
+        тексты суммарно до max_chars, многострочные - по одному
+        """
+        chunks = []
+        current = []
+        size = 0
+        for normalized, text in batch.items():
+            if '\n' in text.strip() or len(text) >= self.max_chars:
+                chunks.append([normalized])
+                continue
+            if current and size + 1 + len(text) > self.max_chars:
+                chunks.append(current)
+                current = []
+                size = 0
+            current.append(normalized)
+            size += len(text) + 1
+        if current:
+            chunks.append(current)
+        return chunks
+
+    def _translate_chunk(self, source: str, target: str, texts: list):
+        """
+        Переводит часть пакета (выполняется в пуле потоков).
+        Возвращает (переводы, число запросов к сервису)
+        """
+        # GoogleTranslator хранит параметры запроса в себе - у каждого потока свой экземпляр
+        translator = self.translator_factory(source=source, target=target)
+        if len(texts) == 1:
+            return [translator.translate(texts[0])], 1
+        translated = translator.translate('\n'.join(f"[[{i}]] {text.strip()}" for i, text in enumerate(texts)))
+        results = split_marked(translated, len(texts))
+        if results is not None:
+            return results, 1
+        logger.warning(f"Метки пакетного перевода из {len(texts)} текстов не сошлись, перевожу по одному")
+        return translator.translate_batch(texts), 1 + len(texts)
+
+    def stats(self) -> dict:
+        return {
+            'requests': self.requests,
+            'coalesced': self.coalesced,
+            'batches': self.batches,
+            'upstream_calls': self.upstream_calls,
+            'pending': sum(len(batch) for batch in self._pending.values()),
+        }
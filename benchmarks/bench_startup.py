@@ -0,0 +1,124 @@
+"""
+Бенчмарк холодного старта: время от запуска процесса до готового
+приложения (импорт main.py и create_app()), каждый замер - новый процесс
+
+Запуск:
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --runs 20 --json startup.json
+    python benchmarks/bench_startup.py --baseline startup.json  # код 1 при регрессии
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Сценарии: что выполняет процесс после запуска интерпретатора
+SCENARIOS = {
+    'python': 'pass',
+    'import': 'import main',
+    'create_app': 'import main; main.create_app()',
+    'ready': 'import main; app = main.create_app(); app.bot; app.dp; app.update_runner; app.http_client',
+    'warm_up': 'import main; main.create_app().warm_up()',
+}
+
+
+def run_once(code: str, env: dict, cwd: str) -> float:
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', f"import sys; sys.path.insert(0, {ROOT!r}); {code}"],
+        env=env,
+        cwd=cwd,
+        capture_output=True,
+        text=True,
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"{code!r} завершился с ошибкой:\n{result.stderr[-2000:]}")
+    return elapsed
+
+
+def percentile(values: list, q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def run(args) -> dict:
+    # Папки и базы создаются во временном каталоге, а не в репозитории
+    workdir = tempfile.mkdtemp(prefix='startup-bench-')
+    env = os.environ.copy()
+    env.update({
+        'BOT_TOKEN': '123456:startup-bench',
+        'CITIES_FILE': os.path.join(ROOT, 'data', 'cities.tsv'),
+        'TEST_PHOTOS_DIR': os.path.join(ROOT, 'test_photos'),
+        'METRICS_PORT': '0',
+    })
+    try:
+        # Прогрев: компиляция .pyc и дисковый кэш не должны попасть в замеры
+        run_once(SCENARIOS['warm_up'], env, workdir)
+        results = {}
+        for name in args.scenarios:
+            samples = [run_once(SCENARIOS[name], env, workdir) for _ in range(args.runs)]
+            results[name] = {
+                'p50_ms': round(statistics.median(samples) * 1000, 1),
+                'p95_ms': round(percentile(samples, 0.95) * 1000, 1),
+                'min_ms': round(min(samples) * 1000, 1),
+            }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return {'runs': args.runs, 'scenarios': results}
+
+
+def print_report(result: dict):
+    print(f"Замеров на сценарий: {result['runs']}")
+    print(f"{'сценарий':<12}{'p50 мс':>10}{'p95 мс':>10}{'min мс':>10}")
+    for name, values in result['scenarios'].items():
+        print(f"{name:<12}{values['p50_ms']:>10}{values['p95_ms']:>10}{values['min_ms']:>10}")
+
+
+def compare_with_baseline(result: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Возвращает список регрессий относительно сохраненного результата
+    """
+    regressions = []
+    for name, values in result['scenarios'].items():
+        old = baseline['scenarios'].get(name)
+        if old and values['p50_ms'] > old['p50_ms'] * (1 + tolerance):
+            regressions.append(f"{name} p50: {values['p50_ms']} > {old['p50_ms']} мс")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарк холодного старта бота')
+    parser.add_argument('--runs', type=int, default=10, help='замеров на сценарий')
+    parser.add_argument('--scenarios', nargs='+', choices=list(SCENARIOS), default=list(SCENARIOS),
+                        help='сценарии: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--json', help='сохранить результат в JSON')
+    parser.add_argument('--baseline', help='сравнить с сохраненным результатом JSON')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='допустимое ухудшение (доля)')
+    args = parser.parse_args()
+
+    result = run(args)
+    print_report(result)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare_with_baseline(result, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"РЕГРЕССИЯ: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Бенчмарк рендеринга ответов: str.format по MESSAGES против
+предкомпилированных шаблонов и кэша текста прогноза
+
+Запуск: python benchmarks/bench_templates.py
+"""
+
+import os
+import sys
+import timeit
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import MESSAGES, BOT_NAME  # noqa: E402
+from templates import render, static, WeatherRenderer  # noqa: E402
+
+NUMBER = 100000
+
+WEATHER_DATA = {
+    'id': 524901,
+    'name': 'Москва',
+    'dt': 1700000000,
+    'main': {'temp': 3.4, 'feels_like': -0.2, 'humidity': 81, 'pressure': 1012},
+    'weather': [{'description': 'пасмурно'}],
+    'wind': {'speed': 4.1},
+    'visibility': 10000,
+}
+
+
+def old_weather_message(weather_data):
+    """
+    Прежний вариант: str.format и datetime.now() на каждый запрос
+    """
+    return MESSAGES['weather_format'].format(
+        city=weather_data.get('name', ''),
+        temp=round(weather_data['main']['temp']),
+        feels_like=round(weather_data['main']['feels_like']),
+        description=weather_data['weather'][0]['description'].title(),
+        wind_speed=weather_data['wind']['speed'],
+        humidity=weather_data['main']['humidity'],
+        pressure=round(weather_data['main']['pressure'] * 0.750062),
+        visibility=round(weather_data['visibility'] / 1000),
+        time=datetime.now().strftime("%H:%M %d.%m.%Y")
+    )
+
+
+def report(name, seconds):
+    print(f"{name:<40} {seconds / NUMBER * 1e6:8.2f} мкс/сообщение")
+
+
+def main():
+    renderer = WeatherRenderer()
+    cases = [
+        ('start: str.format', lambda: MESSAGES['start'].format(bot_name=BOT_NAME)),
+        ('start: static()', lambda: static('start')),
+        ('translation: str.format', lambda: MESSAGES['translation'].format(
+            original_text='Привет', translated_text='Hello')),
+        ('translation: render()', lambda: render(
+            'translation', original_text='Привет', translated_text='Hello')),
+        ('weather: format + now() на запрос', lambda: old_weather_message(WEATHER_DATA)),
+        ('weather: WeatherRenderer (кэш)', lambda: renderer.render(WEATHER_DATA)),
+    ]
+    for name, func in cases:
+        report(name, timeit.timeit(func, number=NUMBER))
+
+
+if __name__ == '__main__':
+    main()
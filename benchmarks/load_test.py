@@ -0,0 +1,574 @@
+"""
+Нагрузочный тест бота: настоящий dp из main.py против локальных заглушек
+Telegram Bot API, OpenWeatherMap, переводчика и gTTS. Работает без сети.
+
+Поток обновлений смешивает /weather, /translate, /voice (с последующим
+текстом), /photo и загрузку фото. Отчет: обновлений в секунду,
+p50/p95/p99 по командам, лаг event loop и число запросов к API.
+
+Запуск:
+    python benchmarks/load_test.py --updates 2000 --rate 200
+    python benchmarks/load_test.py --json result.json
+    python benchmarks/load_test.py --baseline result.json  # код 1 при регрессии
+"""
+
+import argparse
+import asyncio
+import hashlib
+import importlib
+import itertools
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+from aiohttp import web
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+BOT_TOKEN = '123456:load-test'
+
+PHRASES = [
+    'Привет, как дела?',
+    'Доброе утро',
+    'Сегодня хорошая погода',
+    'Где находится вокзал?',
+    'Спасибо за помощь',
+    'Сколько это стоит?',
+    'Я люблю путешествовать',
+    'Встретимся вечером',
+    'Какой сегодня день?',
+    'Хорошего дня!',
+]
+
+COMMANDS = ('weather', 'translate', 'voice', 'photo', 'upload')
+
+
+class Backend:
+    """
+    Заглушка внешнего сервиса с задержкой (±50%) и долей ошибок
+    """
+
+    def __init__(self, name: str, latency: float, error_rate: float):
+        self.name = name
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self.errors = 0
+
+    def _next(self) -> bool:
+        self.calls += 1
+        failed = random.random() < self.error_rate
+        if failed:
+            self.errors += 1
+        return failed
+
+    def _delay(self) -> float:
+        return self.latency * random.uniform(0.5, 1.5)
+
+    async def call(self) -> bool:
+        """
+        Асинхронный вызов; возвращает True, если вызов должен завершиться ошибкой
+        """
+        await asyncio.sleep(self._delay())
+        return self._next()
+
+    def call_blocking(self):
+        """
+        Блокирующий вызов (выполняется в пуле потоков бота)
+        """
+        time.sleep(self._delay())
+        if self._next():
+            raise RuntimeError(f"{self.name}: сбой заглушки")
+
+
+class FakeTranslator:
+    """
+    Замена GoogleTranslator
+    """
+
+    def __init__(self, backend: Backend, source: str = 'ru', target: str = 'en'):
+        self.backend = backend
+        self.source = source
+        self.target = target
+
+    def translate(self, text: str) -> str:
+        self.backend.call_blocking()
+        return '\n'.join(f"[{self.target}] {line}" for line in text.split('\n'))
+
+    def translate_batch(self, batch: list) -> list:
+        return [self.translate(text) for text in batch]
+
+
+def make_fake_gtts(backend: Backend):
+    """
+    Замена класса gTTS: stream() отдает фиктивный аудиопоток
+    """
+    class FakeGTTS:
+        def __init__(self, text: str, lang: str = 'ru', slow: bool = False):
+            self.text = text
+
+        def stream(self):
+            backend.call_blocking()
+            yield b'\xff\xf3' * (len(self.text) * 200 + 1000)
+
+    return FakeGTTS
+
+
+def weather_payload(city_id: int) -> dict:
+    return {
+        'id': city_id,
+        'name': f"Город {city_id}",
+        'dt': int(time.time()),
+        'main': {'temp': 12.3, 'feels_like': 10.1, 'humidity': 70, 'pressure': 1013},
+        'weather': [{'description': 'облачно'}],
+        'wind': {'speed': 3.4},
+        'visibility': 10000,
+    }
+
+
+class MockServer:
+    """
+    Локальный Telegram Bot API (включая getUpdates и скачивание файлов)
+    и OpenWeatherMap на одном aiohttp-сервере
+    """
+
+    PHOTO_SIZE = 64 * 1024
+
+    def __init__(self, telegram_latency: float, weather: Backend):
+        self.telegram_latency = telegram_latency
+        self.weather = weather
+        self.updates = asyncio.Queue()
+        self.calls = Counter()
+        self._ids = itertools.count(1)
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post('/bot{token}/{method}', self.handle_method)
+        app.router.add_get('/file/bot{token}/{path:.+}', self.handle_file)
+        app.router.add_get('/owm/weather', self.handle_weather)
+        app.router.add_get('/owm/group', self.handle_weather_group)
+        return app
+
+    async def handle_method(self, request: web.Request):
+        method = request.match_info['method']
+        self.calls[method] += 1
+        params = await request.post()
+
+        if method == 'getUpdates':
+            result = await self._get_updates(float(params.get('timeout', 0)))
+        else:
+            await asyncio.sleep(self.telegram_latency)
+            result = self._result(method, params)
+        return web.json_response({'ok': True, 'result': result})
+
+    async def _get_updates(self, timeout: float) -> list:
+        try:
+            first = await asyncio.wait_for(self.updates.get(), timeout or 0.1)
+        except asyncio.TimeoutError:
+            return []
+        batch = [first]
+        while len(batch) < 100 and not self.updates.empty():
+            batch.append(self.updates.get_nowait())
+        return batch
+
+    def _message(self, params, **fields) -> dict:
+        return {
+            'message_id': next(self._ids),
+            'date': int(time.time()),
+            'chat': {'id': int(params.get('chat_id', 0)), 'type': 'private'},
+            **fields,
+        }
+
+    def _result(self, method: str, params):
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'Load test', 'username': 'load_test_bot'}
+        if method in ('sendMessage', 'editMessageText'):
+            return self._message(params, text=params.get('text', ''))
+        if method == 'sendVoice':
+            n = next(self._ids)
+            return self._message(params, voice={'file_id': f"voice-{n}", 'file_unique_id': f"v{n}", 'duration': 1})
+        if method == 'sendPhoto':
+            n = next(self._ids)
+            return self._message(params, photo=[
+                {'file_id': f"photo-{n}", 'file_unique_id': f"p{n}", 'width': 800, 'height': 600}
+            ])
+        if method == 'sendDocument':
+            n = next(self._ids)
+            return self._message(params, document={'file_id': f"document-{n}", 'file_unique_id': f"d{n}"})
+        if method == 'getFile':
+            file_id = params['file_id']
+            return {
+                'file_id': file_id,
+                'file_unique_id': file_id,
+                'file_size': self.PHOTO_SIZE,
+                'file_path': f"photos/{file_id}.jpg",
+            }
+        return True
+
+    async def handle_file(self, request: web.Request):
+        await asyncio.sleep(self.telegram_latency)
+        seed = hashlib.sha256(request.match_info['path'].encode()).digest()
+        return web.Response(body=seed * (self.PHOTO_SIZE // len(seed)), content_type='image/jpeg')
+
+    async def handle_weather(self, request: web.Request):
+        if await self.weather.call():
+            return web.json_response({'cod': 500, 'message': 'mock error'}, status=500)
+        return web.json_response(weather_payload(int(request.query['id'])))
+
+    async def handle_weather_group(self, request: web.Request):
+        if await self.weather.call():
+            return web.json_response({'cod': 500, 'message': 'mock error'}, status=500)
+        ids = [int(city_id) for city_id in request.query['id'].split(',')]
+        return web.json_response({'cnt': len(ids), 'list': [weather_payload(city_id) for city_id in ids]})
+
+
+class UpdateFactory:
+    """
+    Синтетические обновления Telegram
+    """
+
+    def __init__(self, users: int, unique_ratio: float, city_names: list):
+        self.users = users
+        self.unique_ratio = unique_ratio
+        self.city_names = city_names
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+
+    def _text(self) -> str:
+        text = random.choice(PHRASES)
+        if random.random() < self.unique_ratio:
+            text += f" {random.randrange(10 ** 6)}"
+        return text
+
+    def message(self, user_id: int, **fields) -> dict:
+        return {
+            'update_id': next(self._update_ids),
+            'message': {
+                'message_id': next(self._message_ids),
+                'date': int(time.time()),
+                'chat': {'id': user_id, 'type': 'private'},
+                'from': {'id': user_id, 'is_bot': False, 'first_name': f"user{user_id}"},
+                **fields,
+            },
+        }
+
+    def command(self, kind: str, user_id: int) -> dict:
+        if kind == 'weather':
+            city = random.choice(self.city_names)
+            return self.message(user_id, text=f"/weather {city}".strip())
+        if kind == 'translate':
+            language = random.choice(('', 'en ', 'de ', 'fr '))
+            return self.message(user_id, text=f"/translate {language}{self._text()}")
+        if kind == 'voice':
+            return self.message(user_id, text='/voice')
+        if kind == 'photo':
+            return self.message(user_id, text='/photo')
+        if kind == 'upload':
+            # Ограниченный набор фото, чтобы часть загрузок была дубликатами
+            n = random.randrange(max(1, self.users // 2))
+            return self.message(user_id, photo=[
+                {'file_id': f"upload-{n}", 'file_unique_id': f"u{n}", 'width': 1280, 'height': 960}
+            ])
+        raise ValueError(kind)
+
+    def voice_text(self, user_id: int) -> dict:
+        return self.message(user_id, text=self._text())
+
+
+def percentile(values: list, q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, int(round(q / 100 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def parse_mix(value: str) -> dict:
+    mix = {}
+    for part in value.split(','):
+        name, _, weight = part.partition('=')
+        if name not in COMMANDS:
+            raise argparse.ArgumentTypeError(f"неизвестная команда: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+def load_city_names(path: str, limit: int = 40) -> list:
+    names = ['']  # без аргумента - город по умолчанию
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            parts = line.rstrip('\n').split('\t')
+            if len(parts) >= 2 and not line.startswith('#'):
+                names.append(parts[1])
+            if len(names) > limit:
+                break
+    return names
+
+
+def configure_environment(args, workdir: str, base_url: str):
+    """
+    Настройки бота до импорта main: все файлы - во временной папке,
+    внешние API - на локальном сервере
+    """
+    photos_dir = os.path.join(workdir, 'test_photos')
+    os.makedirs(photos_dir)
+    for n in range(5):
+        with open(os.path.join(photos_dir, f"photo{n}.jpg"), 'wb') as f:
+            f.write(os.urandom(32 * 1024))
+
+    env = {
+        'BOT_TOKEN': BOT_TOKEN,
+        'WEATHER_API_KEY': 'load-test',
+        'WEATHER_API_BASE_URL': f"{base_url}/owm",
+        'CITIES_FILE': os.path.join(ROOT, 'data', 'cities.tsv'),
+        'SUBSCRIPTIONS_DB': os.path.join(workdir, 'subscriptions.sqlite3'),
+        'TTS_CACHE_DIR': os.path.join(workdir, 'tts'),
+        'TRANSLATION_CACHE_DB': os.path.join(workdir, 'translations.sqlite3'),
+        'STATE_BACKEND': args.state_backend,
+        'STATE_DB_PATH': os.path.join(workdir, 'states.sqlite3'),
+        'PHOTO_DIR': os.path.join(workdir, 'img'),
+        'TEST_PHOTOS_DIR': photos_dir,
+        'MEDIA_REGISTRY_PATH': os.path.join(workdir, 'media_registry.json'),
+        'JOURNAL_DIR': '' if args.no_journal else os.path.join(workdir, 'journal'),
+        'RUN_MODE': 'polling',
+        'FFMPEG_PATH': '',
+    }
+    if args.workers is not None:
+        env['UPDATE_WORKERS'] = str(args.workers)
+    if not args.keep_limits:
+        # Синтетических пользователей мало, лимиты исказили бы пропускную способность
+        for name in ('WEATHER', 'TRANSLATE', 'VOICE', 'PHOTO', 'PHOTO_UPLOAD'):
+            env[f"RATE_LIMIT_{name}"] = '1000000'
+        env['TELEGRAM_GLOBAL_RATE'] = '1000000'
+    os.environ.update(env)
+
+
+async def measure_loop_lag(samples: list, interval: float = 0.01):
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        samples.append(loop.time() - started - interval)
+
+
+async def run(args) -> dict:
+    random.seed(args.seed)
+    workdir = tempfile.mkdtemp(prefix='bot-load-test-')
+
+    weather_backend = Backend('weather', args.weather_latency, args.weather_errors)
+    translator_backend = Backend('translator', args.translator_latency, args.translator_errors)
+    tts_backend = Backend('tts', args.tts_latency, args.tts_errors)
+
+    server = MockServer(args.telegram_latency, weather_backend)
+    runner = web.AppRunner(server.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    base_url = f"http://{host}:{port}"
+
+    configure_environment(args, workdir, base_url)
+    # basicConfig в main.py не перенастраивает уже настроенное логирование
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    from aiogram.client.telegram import TelegramAPIServer
+    app = importlib.import_module('main').create_app()
+
+    app.bot.session.api = TelegramAPIServer.from_base(base_url)
+    app.batch_translator.translator_factory = lambda source, target: FakeTranslator(translator_backend, source, target)
+    app.speech_synthesizer.tts_factory = make_fake_gtts(tts_backend)
+
+    factory = UpdateFactory(args.users, args.unique, load_city_names(os.environ['CITIES_FILE']))
+    kinds = {}       # update_id -> команда
+    enqueued = {}    # update_id -> время постановки в очередь
+    latencies = defaultdict(list)
+    errors = Counter()
+    expected = args.updates
+    done = asyncio.Event()
+    processed = 0
+    loop = asyncio.get_running_loop()
+
+    def enqueue(update: dict, kind: str):
+        kinds[update['update_id']] = kind
+        enqueued[update['update_id']] = loop.time()
+        server.updates.put_nowait(update)
+
+    async def timing_middleware(handler, event, data):
+        nonlocal processed, expected
+        kind = kinds.pop(event.update_id, 'other')
+        try:
+            return await handler(event, data)
+        except Exception:
+            errors[kind] += 1
+            raise
+        finally:
+            latencies[kind].append(loop.time() - enqueued.pop(event.update_id))
+            if kind == 'voice':
+                # Текст для озвучки приходит после ответа на /voice
+                expected += 1
+                enqueue(factory.voice_text(event.message.from_user.id), 'voice_text')
+            processed += 1
+            if processed >= expected:
+                done.set()
+
+    app.dp.update.outer_middleware(timing_middleware)
+
+    weights = [args.mix.get(kind, 0) for kind in COMMANDS]
+
+    async def generate():
+        interval = 1 / args.rate if args.rate else 0
+        started = loop.time()
+        for n in range(args.updates):
+            kind = random.choices(COMMANDS, weights)[0]
+            enqueue(factory.command(kind, random.randrange(1, args.users + 1)), kind)
+            if interval:
+                delay = started + (n + 1) * interval - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+    lag_samples = []
+    await app.http_client.start()
+    await app.preload()
+    if app.update_journal is not None:
+        app.update_journal.open()
+    if app.update_runner is not None:
+        from update_runner import poll_updates
+        app.update_runner.start()
+        polling = asyncio.create_task(poll_updates(app.bot, app.update_runner, polling_timeout=1))
+    else:
+        polling = asyncio.create_task(app.dp.start_polling(app.bot, polling_timeout=1, handle_signals=False))
+    lag_monitor = asyncio.create_task(measure_loop_lag(lag_samples))
+    started = loop.time()
+    try:
+        await generate()
+        await asyncio.wait_for(done.wait(), args.timeout)
+    except asyncio.TimeoutError:
+        print(f"Не все обновления обработаны за {args.timeout} с: {processed}/{expected}")
+    finally:
+        elapsed = loop.time() - started
+        if app.update_runner is not None:
+            polling.cancel()
+            await asyncio.gather(polling, return_exceptions=True)
+            await app.update_runner.stop(timeout=0)
+        else:
+            await app.dp.stop_polling()
+            await polling
+        lag_monitor.cancel()
+        await app.close()
+        await runner.cleanup()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    return {
+        'updates': processed,
+        'seconds': round(elapsed, 3),
+        'updates_per_sec': round(processed / elapsed, 1) if elapsed else 0.0,
+        'commands': {
+            kind: {
+                'count': len(values),
+                'errors': errors[kind],
+                'p50_ms': round(percentile(values, 50) * 1000, 2),
+                'p95_ms': round(percentile(values, 95) * 1000, 2),
+                'p99_ms': round(percentile(values, 99) * 1000, 2),
+            }
+            for kind, values in sorted(latencies.items())
+        },
+        'loop_lag_ms': {
+            'p50': round(percentile(lag_samples, 50) * 1000, 2),
+            'p99': round(percentile(lag_samples, 99) * 1000, 2),
+            'max': round(max(lag_samples, default=0) * 1000, 2),
+        },
+        'telegram_calls': dict(server.calls.most_common()),
+        'backend_calls': {
+            backend.name: {'calls': backend.calls, 'errors': backend.errors}
+            for backend in (weather_backend, translator_backend, tts_backend)
+        },
+    }
+
+
+def print_report(result: dict):
+    print(f"Обновлений: {result['updates']} за {result['seconds']} с - "
+          f"{result['updates_per_sec']} обновлений/с")
+    print(f"{'команда':<12}{'кол-во':>8}{'ошибки':>8}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}")
+    for kind, values in result['commands'].items():
+        print(f"{kind:<12}{values['count']:>8}{values['errors']:>8}"
+              f"{values['p50_ms']:>10}{values['p95_ms']:>10}{values['p99_ms']:>10}")
+    lag = result['loop_lag_ms']
+    print(f"Лаг event loop: p50 {lag['p50']} мс, p99 {lag['p99']} мс, max {lag['max']} мс")
+    print("Запросы к Telegram API: " + ', '.join(f"{k}={v}" for k, v in result['telegram_calls'].items()))
+    print("Внешние сервисы: " + ', '.join(
+        f"{name}={values['calls']} (ошибок {values['errors']})" for name, values in result['backend_calls'].items()
+    ))
+
+
+def compare_with_baseline(result: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Возвращает список регрессий относительно сохраненного результата
+    """
+    regressions = []
+    if result['updates_per_sec'] < baseline['updates_per_sec'] * (1 - tolerance):
+        regressions.append(
+            f"пропускная способность: {result['updates_per_sec']} < {baseline['updates_per_sec']} обновлений/с"
+        )
+    for kind, values in result['commands'].items():
+        old = baseline['commands'].get(kind)
+        if old and values['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+            regressions.append(f"{kind} p95: {values['p95_ms']} > {old['p95_ms']} мс")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Нагрузочный тест бота на локальных заглушках')
+    parser.add_argument('--updates', type=int, default=2000, help='число обновлений (без текстов для /voice)')
+    parser.add_argument('--rate', type=float, default=200, help='обновлений в секунду (0 - все сразу)')
+    parser.add_argument('--users', type=int, default=500, help='число синтетических пользователей')
+    parser.add_argument('--mix', type=parse_mix, default='weather=40,translate=25,voice=15,photo=10,upload=10',
+                        help='доли команд: weather, translate, voice, photo, upload')
+    parser.add_argument('--unique', type=float, default=0.5, help='доля уникальных текстов (промахи кэшей)')
+    parser.add_argument('--telegram-latency', type=float, default=0.01, help='задержка Telegram API, с')
+    parser.add_argument('--weather-latency', type=float, default=0.1, help='задержка OpenWeatherMap, с')
+    parser.add_argument('--weather-errors', type=float, default=0.0, help='доля ошибок OpenWeatherMap')
+    parser.add_argument('--translator-latency', type=float, default=0.2, help='задержка переводчика, с')
+    parser.add_argument('--translator-errors', type=float, default=0.0, help='доля ошибок переводчика')
+    parser.add_argument('--tts-latency', type=float, default=0.3, help='задержка gTTS, с')
+    parser.add_argument('--tts-errors', type=float, default=0.0, help='доля ошибок gTTS')
+    parser.add_argument('--workers', type=int, help='UPDATE_WORKERS (0 - задача aiogram на каждое обновление)')
+    parser.add_argument('--state-backend', default='memory', choices=('memory', 'sqlite'))
+    parser.add_argument('--no-journal', action='store_true', help='без журнала обновлений (JOURNAL_DIR пусто)')
+    parser.add_argument('--keep-limits', action='store_true', help='не отключать лимиты запросов')
+    parser.add_argument('--timeout', type=float, default=300, help='максимальное время теста, с')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', help='сохранить результат в JSON')
+    parser.add_argument('--baseline', help='сравнить с сохраненным результатом JSON')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='допустимое ухудшение (доля)')
+    parser.add_argument('--verbose', action='store_true', help='логи бота уровня INFO')
+    args = parser.parse_args()
+    if isinstance(args.mix, str):
+        args.mix = parse_mix(args.mix)
+
+    result = asyncio.run(run(args))
+    print_report(result)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            regressions = compare_with_baseline(result, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"РЕГРЕССИЯ: {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""
+Воспроизведение журнала обновлений (JOURNAL_DIR) на настоящем dp из main.py
+с максимальной скоростью: все обновления журнала подаются сразу, внешние
+API заменены заглушками нагрузочного теста (сеть не нужна). Подходит для
+профилирования на реальной смеси команд из продакшена.
+
+Запуск:
+    python benchmarks/replay_journal.py cache/journal
+    python benchmarks/replay_journal.py cache/journal --limit 5000 --cprofile replay.prof
+    python benchmarks/replay_journal.py cache/journal --json replay.json
+"""
+
+import argparse
+import asyncio
+import cProfile
+import importlib
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from collections import Counter, defaultdict
+
+from aiohttp import web
+
+from load_test import (
+    Backend,
+    FakeTranslator,
+    MockServer,
+    configure_environment,
+    make_fake_gtts,
+    measure_loop_lag,
+    percentile,
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from journal import iter_records  # noqa: E402
+
+
+def load_updates(directory: str, limit: int = 0) -> list:
+    """
+    Обновления журнала в порядке получения (каждое один раз)
+    """
+    updates = []
+    seen = set()
+    for kind, update_id, _, raw in iter_records(directory):
+        if kind != 'update' or update_id in seen:
+            continue
+        seen.add(update_id)
+        updates.append(json.loads(raw))
+        if limit and len(updates) >= limit:
+            break
+    return updates
+
+
+def update_kind(update: dict) -> str:
+    """
+    Команда (/weather -> weather), фото или тип обновления для отчета
+    """
+    message = update.get('message') or {}
+    if message.get('photo'):
+        return 'upload'
+    text = message.get('text') or ''
+    if text.startswith('/'):
+        return text.split()[0][1:].split('@')[0]
+    if text:
+        return 'text'
+    return next((key for key in update if key != 'update_id'), 'other')
+
+
+async def run(args) -> dict:
+    updates = load_updates(args.journal_dir, args.limit)
+    if not updates:
+        raise SystemExit(f"В журнале {args.journal_dir} нет обновлений")
+
+    workdir = tempfile.mkdtemp(prefix='bot-replay-')
+    weather_backend = Backend('weather', args.weather_latency, 0.0)
+    translator_backend = Backend('translator', args.translator_latency, 0.0)
+    tts_backend = Backend('tts', args.tts_latency, 0.0)
+
+    server = MockServer(args.telegram_latency, weather_backend)
+    runner = web.AppRunner(server.app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    base_url = f"http://{host}:{port}"
+
+    # Воспроизведение не пишет журнал заново и не отбрасывает "повторы"
+    args.no_journal = True
+    args.keep_limits = False
+    configure_environment(args, workdir, base_url)
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    )
+    from aiogram.client.telegram import TelegramAPIServer
+    from aiogram.types import Update
+    app = importlib.import_module('main').create_app()
+
+    app.bot.session.api = TelegramAPIServer.from_base(base_url)
+    app.batch_translator.translator_factory = lambda source, target: FakeTranslator(translator_backend, source, target)
+    app.speech_synthesizer.tts_factory = make_fake_gtts(tts_backend)
+
+    loop = asyncio.get_running_loop()
+    kinds = {update['update_id']: update_kind(update) for update in updates}
+    started_at = {}
+    latencies = defaultdict(list)
+    errors = Counter()
+
+    async def timing_middleware(handler, event, data):
+        kind = kinds.get(event.update_id, 'other')
+        try:
+            return await handler(event, data)
+        except Exception:
+            errors[kind] += 1
+            raise
+        finally:
+            latencies[kind].append(loop.time() - started_at[event.update_id])
+
+    app.dp.update.outer_middleware(timing_middleware)
+    parsed = [Update.model_validate(update, context={'bot': app.bot}) for update in updates]
+
+    lag_samples = []
+    await app.http_client.start()
+    await app.preload()
+    lag_monitor = asyncio.create_task(measure_loop_lag(lag_samples))
+    profiler = cProfile.Profile() if args.cprofile else None
+    if profiler is not None:
+        profiler.enable()
+    started = loop.time()
+    try:
+        if app.update_runner is not None:
+            app.update_runner.start()
+            for update in parsed:
+                started_at[update.update_id] = loop.time()
+                await app.update_runner.submit(update)
+            await asyncio.wait_for(app.update_runner.join(), args.timeout)
+        else:
+            for update in parsed:
+                started_at[update.update_id] = loop.time()
+            await asyncio.wait_for(
+                asyncio.gather(*(app.dp.feed_update(app.bot, update) for update in parsed), return_exceptions=True),
+                args.timeout,
+            )
+    except asyncio.TimeoutError:
+        print(f"Не все обновления обработаны за {args.timeout} с")
+    finally:
+        elapsed = loop.time() - started
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+        if app.update_runner is not None:
+            await app.update_runner.stop(timeout=0)
+        lag_monitor.cancel()
+        await app.close()
+        await runner.cleanup()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    processed = sum(len(values) for values in latencies.values())
+    return {
+        'updates': processed,
+        'seconds': round(elapsed, 3),
+        'updates_per_sec': round(processed / elapsed, 1) if elapsed else 0.0,
+        'commands': {
+            kind: {
+                'count': len(values),
+                'errors': errors[kind],
+                'p50_ms': round(percentile(values, 50) * 1000, 2),
+                'p95_ms': round(percentile(values, 95) * 1000, 2),
+                'p99_ms': round(percentile(values, 99) * 1000, 2),
+            }
+            for kind, values in sorted(latencies.items())
+        },
+        'loop_lag_ms': {
+            'p50': round(percentile(lag_samples, 50) * 1000, 2),
+            'p99': round(percentile(lag_samples, 99) * 1000, 2),
+            'max': round(max(lag_samples, default=0) * 1000, 2),
+        },
+        'telegram_calls': dict(server.calls.most_common()),
+    }
+
+
+def print_report(result: dict):
+    print(f"Обновлений: {result['updates']} за {result['seconds']} с - "
+          f"{result['updates_per_sec']} обновлений/с")
+    print(f"{'команда':<12}{'кол-во':>8}{'ошибки':>8}{'p50 мс':>10}{'p95 мс':>10}{'p99 мс':>10}")
+    for kind, values in result['commands'].items():
+        print(f"{kind:<12}{values['count']:>8}{values['errors']:>8}"
+              f"{values['p50_ms']:>10}{values['p95_ms']:>10}{values['p99_ms']:>10}")
+    lag = result['loop_lag_ms']
+    print(f"Лаг event loop: p50 {lag['p50']} мс, p99 {lag['p99']} мс, max {lag['max']} мс")
+    print("Запросы к Telegram API: " + ', '.join(f"{k}={v}" for k, v in result['telegram_calls'].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Воспроизведение журнала обновлений на локальных заглушках')
+    parser.add_argument('journal_dir', help='папка журнала (JOURNAL_DIR)')
+    parser.add_argument('--limit', type=int, default=0, help='воспроизвести только первые N обновлений')
+    parser.add_argument('--telegram-latency', type=float, default=0.01, help='задержка Telegram API, с')
+    parser.add_argument('--weather-latency', type=float, default=0.1, help='задержка OpenWeatherMap, с')
+    parser.add_argument('--translator-latency', type=float, default=0.2, help='задержка переводчика, с')
+    parser.add_argument('--tts-latency', type=float, default=0.3, help='задержка gTTS, с')
+    parser.add_argument('--workers', type=int, help='UPDATE_WORKERS (0 - задача aiogram на каждое обновление)')
+    parser.add_argument('--state-backend', default='memory', choices=('memory', 'sqlite'))
+    parser.add_argument('--timeout', type=float, default=300, help='максимальное время воспроизведения, с')
+    parser.add_argument('--cprofile', help='сохранить профиль cProfile в файл (pstats / snakeviz)')
+    parser.add_argument('--json', help='сохранить результат в JSON')
+    parser.add_argument('--verbose', action='store_true', help='логи бота уровня INFO')
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print_report(result)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
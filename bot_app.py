@@ -0,0 +1,617 @@
+"""
+Компоненты бота: создаются при первом обращении, а не при импорте
+"""
+
+import asyncio
+import functools
+import logging
+from datetime import datetime, timedelta, timezone
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from aiogram.methods import TelegramMethod
+from aiogram.types import Update
+
+from config import (
+    BOT_TOKEN,
+    TELEGRAM_API_URL,
+    WEATHER_API_KEY,
+    WEATHER_API_BASE_URL,
+    WEATHER_ATTEMPTS,
+    WEATHER_ATTEMPT_TIMEOUT,
+    WEATHER_RETRY_BACKOFF,
+    WEATHER_DEADLINE,
+    WEATHER_BREAKER_FAILURES,
+    WEATHER_BREAKER_RESET,
+    WEATHER_FALLBACK_BASE_URL,
+    WEATHER_FALLBACK_API_KEY,
+    DEFAULT_CITY_ID,
+    CITIES_FILE,
+    WEATHER_REFRESH_INTERVAL,
+    WEATHER_REFRESH_TOP_N,
+    SUBSCRIPTIONS_DB,
+    SUBSCRIPTIONS_UTC_OFFSET,
+    SUBSCRIPTIONS_SEND_RATE,
+    WEATHER_CACHE_TTL,
+    WEATHER_CACHE_STALE_TTL,
+    WEATHER_CACHE_DB,
+    HTTP_POOL_SIZE,
+    HTTP_POOL_PER_HOST,
+    HTTP_DNS_CACHE_TTL,
+    HTTP_TIMEOUT,
+    HTTP_CONNECT_TIMEOUT,
+    EXECUTOR_MAX_WORKERS,
+    TRANSLATOR_CONCURRENCY,
+    TTS_CONCURRENCY,
+    TTS_CACHE_DIR,
+    TTS_CACHE_MAX_MB,
+    TTS_SEGMENT_CHARS,
+    FFMPEG_PATH,
+    TTS_OPUS_BITRATE,
+    TRANSLATION_CACHE_SIZE,
+    TRANSLATION_CACHE_DB,
+    TRANSLATE_BATCH_WINDOW,
+    TRANSLATE_BATCH_SIZE,
+    TRANSLATE_BATCH_CHARS,
+    STATE_BACKEND,
+    STATE_TTL,
+    STATE_MAX_SIZE,
+    STATE_DB_PATH,
+    PHOTO_DIR,
+    PHOTO_INDEX_DB,
+    PHOTO_PROCESS_WORKERS,
+    PHOTO_PROCESS_QUEUE,
+    PHOTO_MAX_SIDE,
+    PHOTO_JPEG_QUALITY,
+    PHOTO_MAX_BYTES,
+    PHOTO_THUMB_SIZE,
+    TEST_PHOTOS_DIR,
+    MEDIA_REGISTRY_PATH,
+    RATE_LIMITS,
+    RATE_LIMIT_MAX_WAIT,
+    TELEGRAM_GLOBAL_RATE,
+    UPDATE_WORKERS,
+    UPDATE_QUEUE_SIZE,
+    UPDATE_CHAT_QUEUE_SIZE,
+    JOURNAL_DIR,
+    JOURNAL_SEGMENT_MB,
+    JOURNAL_FSYNC_INTERVAL,
+    JOURNAL_KEEP_SEGMENTS,
+    LOOP_MONITOR_INTERVAL,
+    LOOP_STALL_THRESHOLD,
+    PROFILE_SAMPLE_RATE,
+    PROFILE_SECONDS,
+    DIAGNOSTICS_DIR,
+    BACKGROUND_JOBS,
+)
+from weather_cache import WeatherCache
+from weather_providers import OpenWeatherMapProvider, ResilientWeatherProvider, WeatherUnavailable
+from weather_refresh import PopularCitiesRefresher
+from cities import CityIndex
+from templates import render, static, TEMPLATES, WeatherRenderer
+from scheduler import SubscriptionStore, BatchedSender, SubscriptionScheduler
+from http_client import HttpClient
+from executor import BlockingExecutor
+from tts_cache import TTSCache
+from tts_pipeline import SpeechSynthesizer
+from translation_cache import TranslationCache
+from batch_translator import BatchingTranslator
+from update_runner import OrderedUpdateRunner
+from journal import UpdateJournal, JournalMiddleware, JournalRequestMiddleware
+from state_store import create_state_store
+from photo_storage import PhotoStore
+from photo_processing import PhotoProcessor
+from media_registry import MediaRegistry
+from throttling import RateLimiter, ThrottlingMiddleware, OutboundRateLimiter
+from metrics import registry as metrics_registry, track_backend, HandlerMetricsMiddleware
+from diagnostics import LoopMonitor
+from startup import component, is_created
+
+logger = logging.getLogger(__name__)
+
+
+class BotApp:
+    """
+    Контейнер компонентов бота.
+
+    Каждый компонент создается при первом обращении: реплика, которая не
+    получает фото или голосовых, не создает папок, баз и пулов для них, а
+    gTTS и deep-translator импортируются только при первом синтезе или
+    переводе. Хендлеры получают приложение аргументом app.
+    """
+
+    def __init__(self, profiler=None, token: str = BOT_TOKEN):
+        self.profiler = profiler
+        self.token = token
+
+    # --- Telegram ---
+
+    @component
+    def outbound_limiter(self):
+        return OutboundRateLimiter(rate=TELEGRAM_GLOBAL_RATE, capacity=TELEGRAM_GLOBAL_RATE)
+
+    @component
+    def bot(self):
+        bot = Bot(
+            token=self.token,
+            session=AiohttpSession(
+                api=TelegramAPIServer.from_base(TELEGRAM_API_URL) if TELEGRAM_API_URL else PRODUCTION,
+                limit=HTTP_POOL_SIZE,
+            ),
+        )
+        # Общий лимит исходящих запросов к Telegram API
+        bot.session.middleware(self.outbound_limiter)
+        if UPDATE_WORKERS <= 0 and self.update_journal is not None:
+            # Без OrderedUpdateRunner обновления записываются в журнал при получении
+            bot.session.middleware(JournalRequestMiddleware(self.update_journal))
+        return bot
+
+    @component
+    def rate_limiter(self):
+        return RateLimiter(RATE_LIMITS, max_wait=RATE_LIMIT_MAX_WAIT)
+
+    @component
+    def dp(self):
+        dp = Dispatcher(app=self)
+        # Журнал обновлений и результатов их обработки (для всех хендлеров)
+        if self.update_journal is not None:
+            dp.update.outer_middleware(JournalMiddleware(self.update_journal))
+        # Метрики времени работы хендлеров (включая ожидание в очереди лимитов)
+        dp.message.middleware(HandlerMetricsMiddleware())
+        # Лимиты запросов по пользователю и команде
+        dp.message.middleware(ThrottlingMiddleware(self.rate_limiter, TEMPLATES['rate_limited']))
+        return dp
+
+    @component
+    def update_runner(self):
+        """
+        Параллельная обработка обновлений с порядком внутри чата (None - средствами aiogram)
+        """
+        if UPDATE_WORKERS <= 0:
+            return None
+        return OrderedUpdateRunner(
+            self.dp,
+            self.bot,
+            workers=UPDATE_WORKERS,
+            max_pending=UPDATE_QUEUE_SIZE,
+            max_per_chat=UPDATE_CHAT_QUEUE_SIZE,
+            journal=self.update_journal,
+        )
+
+    @component
+    def update_journal(self):
+        """
+        Журнал входящих обновлений (None - выключен); сегменты читаются в start()
+        """
+        if not JOURNAL_DIR:
+            return None
+        return UpdateJournal(
+            JOURNAL_DIR,
+            segment_bytes=JOURNAL_SEGMENT_MB * 1024 * 1024,
+            fsync_interval=JOURNAL_FSYNC_INTERVAL,
+            keep_segments=JOURNAL_KEEP_SEGMENTS,
+        )
+
+    @component
+    def state_store(self):
+        return create_state_store(
+            STATE_BACKEND,
+            ttl=STATE_TTL,
+            max_size=STATE_MAX_SIZE,
+            db_path=STATE_DB_PATH,
+        )
+
+    # --- Общие ресурсы ---
+
+    @component
+    def loop_monitor(self):
+        """
+        Лаг event loop, стеки блокировок и профилирование по запросу
+        (мониторинг запускается в main.run())
+        """
+        return LoopMonitor(
+            interval=LOOP_MONITOR_INTERVAL or 0.1,
+            threshold=LOOP_STALL_THRESHOLD,
+            sample_rate=PROFILE_SAMPLE_RATE,
+            profile_seconds=PROFILE_SECONDS,
+            profile_dir=DIAGNOSTICS_DIR,
+        )
+
+    @component
+    def http_client(self):
+        """
+        Общий HTTP-клиент для исходящих запросов (сессия открывается в start())
+        """
+        return HttpClient(
+            pool_size=HTTP_POOL_SIZE,
+            per_host_limit=HTTP_POOL_PER_HOST,
+            dns_cache_ttl=HTTP_DNS_CACHE_TTL,
+            total_timeout=HTTP_TIMEOUT,
+            connect_timeout=HTTP_CONNECT_TIMEOUT,
+        )
+
+    @component
+    def blocking_executor(self):
+        """
+        Пул потоков для блокирующих вызовов переводчика и gTTS
+        """
+        return BlockingExecutor(
+            max_workers=EXECUTOR_MAX_WORKERS,
+            backend_limits={
+                'translator': TRANSLATOR_CONCURRENCY,
+                'tts': TTS_CONCURRENCY,
+            },
+        )
+
+    # --- Голосовые сообщения и перевод ---
+
+    @component
+    def tts_cache(self):
+        return TTSCache(TTS_CACHE_DIR, max_bytes=TTS_CACHE_MAX_MB * 1024 * 1024)
+
+    @component
+    def speech_synthesizer(self):
+        return SpeechSynthesizer(
+            self.blocking_executor,
+            segment_chars=TTS_SEGMENT_CHARS,
+            ffmpeg=FFMPEG_PATH,
+            opus_bitrate=TTS_OPUS_BITRATE,
+        )
+
+    @component
+    def translation_cache(self):
+        return TranslationCache(max_size=TRANSLATION_CACHE_SIZE, db_path=TRANSLATION_CACHE_DB or None)
+
+    @component
+    def batch_translator(self):
+        return BatchingTranslator(
+            self.blocking_executor,
+            window=TRANSLATE_BATCH_WINDOW,
+            max_batch=TRANSLATE_BATCH_SIZE,
+            max_chars=TRANSLATE_BATCH_CHARS,
+        )
+
+    # --- Фото ---
+
+    @component
+    def photo_store(self):
+        return PhotoStore(PHOTO_DIR, PHOTO_INDEX_DB)
+
+    @component
+    def photo_processor(self):
+        """
+        Постобработка сохраненных фото: EXIF, пережатие, миниатюры (в отдельных процессах)
+        """
+        return PhotoProcessor(
+            max_workers=PHOTO_PROCESS_WORKERS,
+            queue_size=PHOTO_PROCESS_QUEUE,
+            on_processed=lambda digest, result: self.photo_store.store_processed(digest, result),
+            max_side=PHOTO_MAX_SIDE,
+            quality=PHOTO_JPEG_QUALITY,
+            max_bytes=PHOTO_MAX_BYTES,
+            thumb_size=PHOTO_THUMB_SIZE,
+        )
+
+    @component
+    def media_registry(self):
+        """
+        Реестр тестовых фото для /photo (папка сканируется при создании)
+        """
+        return MediaRegistry(TEST_PHOTOS_DIR, MEDIA_REGISTRY_PATH)
+
+    # --- Погода ---
+
+    @component
+    def weather_cache(self):
+        return WeatherCache(
+            ttl=WEATHER_CACHE_TTL,
+            stale_ttl=WEATHER_CACHE_STALE_TTL,
+            db_path=WEATHER_CACHE_DB or None,
+        )
+
+    @component
+    def weather_provider(self):
+        """
+        OpenWeatherMap и, если задан, резервный источник - с таймаутами,
+        повторами и circuit breaker
+        """
+        sources = [OpenWeatherMapProvider(self.http_client, WEATHER_API_BASE_URL, WEATHER_API_KEY)]
+        if WEATHER_FALLBACK_BASE_URL:
+            sources.append(
+                OpenWeatherMapProvider(self.http_client, WEATHER_FALLBACK_BASE_URL, WEATHER_FALLBACK_API_KEY, name='fallback')
+            )
+        return ResilientWeatherProvider(
+            sources,
+            attempts=WEATHER_ATTEMPTS,
+            attempt_timeout=WEATHER_ATTEMPT_TIMEOUT,
+            backoff=WEATHER_RETRY_BACKOFF,
+            deadline=WEATHER_DEADLINE,
+            failure_threshold=WEATHER_BREAKER_FAILURES,
+            reset_timeout=WEATHER_BREAKER_RESET,
+        )
+
+    @component
+    def weather_renderer(self):
+        """
+        Тексты прогнозов рендерятся один раз на каждое обновление данных в кэше
+        """
+        return WeatherRenderer()
+
+    @component
+    def city_index(self):
+        """
+        Индекс городов для /weather <город> (загружается в preload(),
+        чтобы чтение файла не блокировало event loop в первом хендлере)
+        """
+        return CityIndex.load(CITIES_FILE)
+
+    @component
+    def weather_refresher(self):
+        """
+        Фоновое обновление погоды: город по умолчанию, города подписок и
+        популярные города. Интервал меньше TTL кэша, поэтому для этих
+        городов /weather не ждет API
+        """
+        return PopularCitiesRefresher(
+            self.weather_cache,
+            self.get_weather_group,
+            interval=WEATHER_REFRESH_INTERVAL,
+            top_n=WEATHER_REFRESH_TOP_N,
+            pinned=lambda: [DEFAULT_CITY_ID, *self.subscription_store.city_ids()],
+        )
+
+    @component
+    def subscription_store(self):
+        return SubscriptionStore(SUBSCRIPTIONS_DB)
+
+    @component
+    def subscription_scheduler(self):
+        """
+        Рассылка прогнозов по подписке
+        """
+        return SubscriptionScheduler(
+            self.subscription_store,
+            BatchedSender(self.bot, max_rate=SUBSCRIPTIONS_SEND_RATE, on_forbidden=self.subscription_store.remove),
+            self.get_weather_message,
+            tz=timezone(timedelta(hours=SUBSCRIPTIONS_UTC_OFFSET)),
+        )
+
+    async def get_weather_data(self, city_id: int = DEFAULT_CITY_ID):
+        """
+        Получает данные о погоде из OpenWeatherMap API (или резервного источника)
+        """
+        try:
+            with track_backend('weather_api'):
+                return await self.weather_provider.fetch(city_id)
+        except WeatherUnavailable as e:
+            logger.error(f"Ошибка при получении данных о погоде: {e}")
+            return None
+
+    async def get_weather_group(self, city_ids: list):
+        """
+        Получает погоду сразу для нескольких городов (до 20) одним запросом
+        """
+        try:
+            with track_backend('weather_api_group'):
+                return await self.weather_provider.fetch_group(city_ids)
+        except WeatherUnavailable as e:
+            logger.error(f"Ошибка при пакетном получении данных о погоде: {e}")
+            return []
+
+    def format_weather_message(self, weather_data):
+        """
+        Форматирует данные о погоде в читаемое сообщение
+        """
+        try:
+            return self.weather_renderer.render(weather_data)
+        except Exception as e:
+            logger.error(f"Ошибка при форматировании данных о погоде: {e}")
+            return static('weather_error')
+
+    async def get_weather_message(self, city_id: int):
+        """
+        Возвращает готовый текст прогноза для города или None.
+
+        Если источники погоды недоступны, отдаются последние полученные данные
+        с пометкой, на какое время они актуальны
+        """
+        weather_data = await self.weather_cache.get(city_id, functools.partial(self.get_weather_data, city_id))
+        if weather_data:
+            return self.format_weather_message(weather_data)
+
+        last_good = self.weather_cache.peek(city_id)
+        if not last_good:
+            return None
+        observed_at = datetime.fromtimestamp(last_good['dt']) if last_good.get('dt') else None
+        return self.format_weather_message(last_good) + render(
+            'weather_stale',
+            time=observed_at.strftime("%H:%M %d.%m.%Y") if observed_at else '-'
+        )
+
+    # --- Жизненный цикл ---
+
+    def warm_up(self):
+        """
+        Создает все компоненты сразу (для профилирования запуска)
+        """
+        for name, value in vars(type(self)).items():
+            if isinstance(value, component):
+                getattr(self, name)
+
+    async def preload(self):
+        """
+        Создает в пуле потоков компоненты, которые долго загружаются с диска
+        """
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, getattr, self, 'city_index')
+
+    async def start(self):
+        """
+        Открывает HTTP-сессию, загружает индекс городов и запускает фоновые задачи
+        """
+        await self.http_client.start()
+        await self.preload()
+
+        # Обновления, не обработанные до остановки или падения, обрабатываются первыми
+        if self.update_journal is not None:
+            await self.replay_journal()
+
+        # Пул постобработки фото: сами процессы создаются при первом фото
+        if PHOTO_PROCESS_WORKERS > 0:
+            self.photo_processor.start()
+
+        # Фоновое обновление погоды и рассылка прогнозов по подписке
+        if BACKGROUND_JOBS:
+            self.weather_refresher.start()
+            self.subscription_scheduler.start()
+
+    async def replay_journal(self):
+        """
+        Открывает журнал и ставит необработанные обновления в очередь
+        (без воркеров - обрабатывает их по порядку сразу)
+        """
+        unfinished = self.update_journal.open()
+        if not unfinished:
+            return
+        logger.info(f"Повторная обработка обновлений из журнала: {len(unfinished)}")
+        if self.update_runner is not None:
+            self.update_runner.start()
+        for data in unfinished:
+            update = Update.model_validate(data, context={'bot': self.bot})
+            if self.update_runner is not None:
+                await self.update_runner.submit(update)
+                continue
+            try:
+                result = await self.dp.feed_update(self.bot, update)
+                if isinstance(result, TelegramMethod):
+                    await self.dp.silent_call_request(bot=self.bot, result=result)
+            except Exception as e:
+                logger.error(f"Ошибка повторной обработки обновления {update.update_id}: {e}")
+
+    async def close(self):
+        """
+        Останавливает и закрывает только созданные компоненты
+        """
+        # Коллектор из create_app() держит ссылку на приложение
+        metrics_registry.remove_collector(self.collect_metrics)
+        if is_created(self, 'subscription_scheduler'):
+            await self.subscription_scheduler.stop()
+        if is_created(self, 'weather_refresher'):
+            await self.weather_refresher.stop()
+        if is_created(self, 'photo_processor'):
+            await self.photo_processor.stop()
+        if is_created(self, 'loop_monitor'):
+            await self.loop_monitor.stop()
+        if is_created(self, 'update_journal') and self.update_journal is not None:
+            await self.update_journal.close()
+        if is_created(self, 'http_client'):
+            await self.http_client.close()
+        if is_created(self, 'bot'):
+            await self.bot.session.close()
+        if is_created(self, 'blocking_executor'):
+            self.blocking_executor.shutdown()
+        for name in ('translation_cache', 'weather_cache', 'photo_store', 'subscription_store'):
+            if is_created(self, name):
+                getattr(self, name).close()
+        if is_created(self, 'state_store'):
+            await self.state_store.close()
+
+    def collect_metrics(self):
+        """
+        Публикует счетчики кэшей, пула потоков и лимитов в /metrics
+        (только для уже созданных компонентов)
+        """
+        cache_samples = []
+        if is_created(self, 'weather_cache'):
+            cache_samples.append(('weather', self.weather_cache.hits + self.weather_cache.stale_hits, self.weather_cache.misses))
+        if is_created(self, 'translation_cache'):
+            cache_samples.append(('translation', self.translation_cache.hits, self.translation_cache.misses))
+        if is_created(self, 'tts_cache'):
+            cache_samples.append(('tts', self.tts_cache.hits, self.tts_cache.misses))
+        limiter_stats = self.rate_limiter.stats()
+        outbound_stats = self.outbound_limiter.stats()
+        samples = [
+            ('bot_cache_hits_total', 'counter', 'Попадания в кэш',
+             [({'cache': name}, hits) for name, hits, _ in cache_samples]),
+            ('bot_cache_misses_total', 'counter', 'Промахи кэша',
+             [({'cache': name}, misses) for name, _, misses in cache_samples]),
+            ('bot_rate_limit_queued_total', 'counter', 'Запросы, ожидавшие в очереди лимита',
+             [({'command': name}, count) for name, count in limiter_stats['queued'].items()]),
+            ('bot_rate_limit_rejected_total', 'counter', 'Запросы, отклоненные лимитом',
+             [({'command': name}, count) for name, count in limiter_stats['rejected'].items()]),
+            ('bot_outbound_queued_total', 'counter', 'Исходящие запросы, ожидавшие общего лимита',
+             [({}, outbound_stats['queued'])]),
+        ]
+        if is_created(self, 'blocking_executor'):
+            executor_stats = self.blocking_executor.stats()
+            samples += [
+                ('bot_executor_queued', 'gauge', 'Вызовы, ожидающие места в пуле потоков',
+                 [({'backend': name}, values['queued']) for name, values in executor_stats.items()]),
+                ('bot_executor_active', 'gauge', 'Вызовы, выполняющиеся в пуле потоков',
+                 [({'backend': name}, values['active']) for name, values in executor_stats.items()]),
+            ]
+        if is_created(self, 'weather_provider'):
+            samples.append(
+                ('bot_weather_circuit_open', 'gauge', 'Circuit breaker источника погоды открыт',
+                 [({'provider': name}, int(values['open'])) for name, values in self.weather_provider.stats().items()])
+            )
+        if is_created(self, 'update_runner') and self.update_runner is not None:
+            runner_stats = self.update_runner.stats()
+            samples += [
+                ('bot_update_queue_pending', 'gauge', 'Обновления в очереди обработки',
+                 [({}, runner_stats['pending'])]),
+                ('bot_update_workers_active', 'gauge', 'Воркеры, обрабатывающие обновление',
+                 [({}, runner_stats['active'])]),
+                ('bot_updates_dropped_total', 'counter', 'Обновления, отброшенные из-за переполнения очереди чата',
+                 [({}, runner_stats['dropped'])]),
+            ]
+        if is_created(self, 'loop_monitor'):
+            loop_stats = self.loop_monitor.stats()
+            samples += [
+                ('bot_event_loop_stalls_total', 'counter', 'Блокировки event loop дольше LOOP_STALL_THRESHOLD',
+                 [({}, loop_stats['stalls'])]),
+                ('bot_event_loop_lag_max_seconds', 'gauge', 'Максимальный лаг event loop за последние замеры',
+                 [({}, loop_stats['lag_max'])]),
+            ]
+        if is_created(self, 'update_journal') and self.update_journal is not None:
+            journal_stats = self.update_journal.stats()
+            samples += [
+                ('bot_journal_records_total', 'counter', 'Записи журнала обновлений',
+                 [({'kind': kind}, count) for kind, count in journal_stats['records'].items()]),
+                ('bot_journal_fsyncs_total', 'counter', 'Групповые fsync журнала обновлений',
+                 [({}, journal_stats['fsyncs'])]),
+                ('bot_journal_pending', 'gauge', 'Обновления в журнале без результата обработки',
+                 [({}, journal_stats['pending'])]),
+                ('bot_journal_replayed_total', 'counter', 'Обновления, повторно обработанные из журнала при запуске',
+                 [({}, journal_stats['replayed'])]),
+                ('bot_journal_duplicates_total', 'counter', 'Повторно доставленные обновления, пропущенные журналом',
+                 [({}, journal_stats['duplicates'])]),
+                ('bot_journal_errors_total', 'counter', 'Ошибки записи журнала обновлений',
+                 [({}, journal_stats['errors'])]),
+            ]
+        if is_created(self, 'batch_translator'):
+            translator_stats = self.batch_translator.stats()
+            samples += [
+                ('bot_translate_requests_total', 'counter', 'Запросы на перевод (без попаданий в кэш)',
+                 [({}, translator_stats['requests'])]),
+                ('bot_translate_coalesced_total', 'counter', 'Запросы, объединенные с таким же выполняющимся переводом',
+                 [({}, translator_stats['coalesced'])]),
+                ('bot_translate_upstream_calls_total', 'counter', 'Запросы к сервису перевода',
+                 [({}, translator_stats['upstream_calls'])]),
+            ]
+        if PHOTO_PROCESS_WORKERS > 0 and is_created(self, 'photo_processor'):
+            photo_stats = self.photo_processor.stats()
+            samples += [
+                ('bot_photo_process_queued', 'gauge', 'Фото в очереди постобработки',
+                 [({}, photo_stats['queued'])]),
+                ('bot_photo_processed_total', 'counter', 'Фото по результату постобработки',
+                 [({'result': name}, photo_stats[name]) for name in ('processed', 'failed', 'dropped')]),
+                ('bot_photo_stage_seconds_total', 'counter', 'Суммарное время этапов постобработки фото',
+                 [({'stage': stage}, seconds) for stage, seconds in photo_stats['stage_seconds'].items()]),
+                ('bot_photo_bytes_total', 'counter', 'Размер фото до и после постобработки',
+                 [({'state': 'original'}, photo_stats['bytes_in']), ({'state': 'processed'}, photo_stats['bytes_out'])]),
+                ('bot_photo_bytes_saved_total', 'counter', 'Байт сэкономлено постобработкой фото',
+                 [({}, photo_stats['bytes_saved'])]),
+            ]
+        return samples
@@ -0,0 +1,88 @@
+"""
+Индекс городов для /weather <город>: загрузка списка и поиск ID по названию
+"""
+
+import bisect
+import difflib
+import logging
+import time
+from array import array
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_city_name(name: str) -> str:
+    """
+    Приводит название к ключу поиска: регистр, ё/е, дефисы и пробелы
+    """
+    return ' '.join(name.casefold().replace('ё', 'е').replace('-', ' ').split())
+
+
+class CityIndex:
+    """
+    Отсортированный список ключей названий и параллельный массив ID.
+
+    Для каждой записи хранится только нормализованный ключ (str) и ID
+    в array('l'), поэтому даже список на 200 тыс. записей занимает немного
+    памяти. Точное совпадение и поиск по префиксу - бинарный поиск,
+    нечеткий поиск - difflib по соседним ключам.
+    """
+
+    # Сколько соседних ключей просматривается при нечетком поиске
+    FUZZY_WINDOW = 500
+
+    def __init__(self, keys: list, ids: array):
+        self._keys = keys
+        self._ids = ids
+
+    @classmethod
+    def load(cls, path: str) -> 'CityIndex':
+        """
+        Загружает TSV-файл "id<TAB>название<TAB>страна" (строки с # - комментарии)
+        """
+        started_at = time.perf_counter()
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
+
+        rows = []
+        for line in lines:
+            if not line or line.startswith('#'):
+                continue
+            parts = line.split('\t', 2)
+            if len(parts) < 2:
+                continue
+            rows.append((normalize_city_name(parts[1]), int(parts[0])))
+        rows.sort()
+
+        keys = [key for key, _ in rows]
+        ids = array('l', (city_id for _, city_id in rows))
+
+        logger.info(
+            f"Загружено городов: {len(keys)} из {path} "
+            f"за {(time.perf_counter() - started_at) * 1000:.0f} мс"
+        )
+        return cls(keys, ids)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def resolve(self, query: str):
+        """
+        Возвращает ID города для запроса или None.
+        Порядок: точное совпадение, префикс, нечеткое совпадение
+        """
+        key = normalize_city_name(query)
+        if not key or not self._keys:
+            return None
+
+        position = bisect.bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position].startswith(key):
+            # Точное совпадение или самый короткий ключ с таким префиксом
+            return self._ids[position]
+
+        low = max(0, position - self.FUZZY_WINDOW // 2)
+        candidates = self._keys[low:low + self.FUZZY_WINDOW]
+        matches = difflib.get_close_matches(key, candidates, n=1, cutoff=0.75)
+        if not matches:
+            return None
+        return self._ids[low + candidates.index(matches[0])]
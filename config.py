@@ -17,6 +17,9 @@ except:
 # Токен Telegram-бота (получить у @BotFather)
 BOT_TOKEN = os.getenv('BOT_TOKEN', 'YOUR_BOT_TOKEN_HERE')
 
+# Адрес Bot API (пусто - api.telegram.org; например, локальный telegram-bot-api)
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', '')
+
 # API ключ для OpenWeatherMap (получить на https://openweathermap.org/api)
 WEATHER_API_KEY = os.getenv('WEATHER_API_KEY', 'YOUR_WEATHER_API_KEY_HERE')
 
@@ -24,7 +27,191 @@ WEATHER_API_KEY = os.getenv('WEATHER_API_KEY', 'YOUR_WEATHER_API_KEY_HERE')
 MOSCOW_CITY_ID = 524901
 
 # URL для API OpenWeatherMap
-WEATHER_API_URL = f"http://api.openweathermap.org/data/2.5/weather?id={MOSCOW_CITY_ID}&appid={WEATHER_API_KEY}&units=metric&lang=ru"
+WEATHER_API_BASE_URL = os.getenv('WEATHER_API_BASE_URL', 'http://api.openweathermap.org/data/2.5')
+
+# Устойчивость запросов погоды: попытки и таймаут одной попытки (с),
+# базовая пауза между попытками (с, со случайным джиттером), общий
+# дедлайн запроса (с) и circuit breaker (сбоев подряд до открытия,
+# секунд до пробного запроса)
+WEATHER_ATTEMPTS = int(os.getenv('WEATHER_ATTEMPTS', '2'))
+WEATHER_ATTEMPT_TIMEOUT = float(os.getenv('WEATHER_ATTEMPT_TIMEOUT', '3'))
+WEATHER_RETRY_BACKOFF = float(os.getenv('WEATHER_RETRY_BACKOFF', '0.3'))
+WEATHER_DEADLINE = float(os.getenv('WEATHER_DEADLINE', '8'))
+WEATHER_BREAKER_FAILURES = int(os.getenv('WEATHER_BREAKER_FAILURES', '5'))
+WEATHER_BREAKER_RESET = float(os.getenv('WEATHER_BREAKER_RESET', '30'))
+
+# Резервный источник погоды с API, совместимым с OpenWeatherMap
+# (пусто - не используется)
+WEATHER_FALLBACK_BASE_URL = os.getenv('WEATHER_FALLBACK_BASE_URL', '')
+WEATHER_FALLBACK_API_KEY = os.getenv('WEATHER_FALLBACK_API_KEY', WEATHER_API_KEY)
+
+# Город для /weather без аргументов и список городов для /weather <город>
+DEFAULT_CITY_ID = int(os.getenv('DEFAULT_CITY_ID', str(MOSCOW_CITY_ID)))
+CITIES_FILE = os.getenv('CITIES_FILE', os.path.join('data', 'cities.tsv'))
+
+# Фоновое обновление погоды для самых запрашиваемых городов (пачками через /group)
+WEATHER_REFRESH_INTERVAL = int(os.getenv('WEATHER_REFRESH_INTERVAL', '240'))
+WEATHER_REFRESH_TOP_N = int(os.getenv('WEATHER_REFRESH_TOP_N', '20'))
+
+# Подписки на ежедневный прогноз (/subscribe HH:MM): база, часовой пояс
+# времени подписки (смещение от UTC в часах) и скорость рассылки в секунду
+SUBSCRIPTIONS_DB = os.getenv('SUBSCRIPTIONS_DB', os.path.join('cache', 'subscriptions.sqlite3'))
+SUBSCRIPTIONS_UTC_OFFSET = float(os.getenv('SUBSCRIPTIONS_UTC_OFFSET', '3'))
+# Подпись часового пояса подписок в сообщениях: МСК, UTC, UTC+5, UTC-3:30
+_offset_minutes = round(SUBSCRIPTIONS_UTC_OFFSET * 60)
+_hours, _minutes = divmod(abs(_offset_minutes), 60)
+if _offset_minutes == 180:
+    SUBSCRIPTIONS_TZ_LABEL = 'МСК'
+elif _offset_minutes == 0:
+    SUBSCRIPTIONS_TZ_LABEL = 'UTC'
+else:
+    SUBSCRIPTIONS_TZ_LABEL = f"UTC{'-' if _offset_minutes < 0 else '+'}{_hours}" + (f":{_minutes:02d}" if _minutes else '')
+SUBSCRIPTIONS_SEND_RATE = float(os.getenv('SUBSCRIPTIONS_SEND_RATE', '25'))
+
+# Кэш погоды: сколько секунд данные считаются свежими и сколько еще
+# секунд устаревшие данные можно отдавать, обновляя их в фоне
+WEATHER_CACHE_TTL = int(os.getenv('WEATHER_CACHE_TTL', '300'))
+WEATHER_CACHE_STALE_TTL = int(os.getenv('WEATHER_CACHE_STALE_TTL', '600'))
+# Общая для нескольких процессов база кэша погоды (пусто - только в памяти)
+WEATHER_CACHE_DB = os.getenv('WEATHER_CACHE_DB', '')
+
+# Пул HTTP-соединений для исходящих запросов
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', '100'))
+HTTP_POOL_PER_HOST = int(os.getenv('HTTP_POOL_PER_HOST', '20'))
+HTTP_DNS_CACHE_TTL = int(os.getenv('HTTP_DNS_CACHE_TTL', '300'))
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '15'))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '5'))
+
+# Пул потоков для блокирующих бэкендов и лимиты одновременных вызовов
+EXECUTOR_MAX_WORKERS = int(os.getenv('EXECUTOR_MAX_WORKERS', '8'))
+TRANSLATOR_CONCURRENCY = int(os.getenv('TRANSLATOR_CONCURRENCY', '4'))
+TTS_CONCURRENCY = int(os.getenv('TTS_CONCURRENCY', '4'))
+
+# Кэш синтезированных голосовых сообщений
+TTS_CACHE_DIR = os.getenv('TTS_CACHE_DIR', os.path.join('cache', 'tts'))
+TTS_CACHE_MAX_MB = int(os.getenv('TTS_CACHE_MAX_MB', '200'))
+
+# Синтез речи: максимальная длина фрагмента, синтезируемого параллельно,
+# путь к ffmpeg для кодирования в OGG/Opus (пустая строка - отправлять MP3)
+# и битрейт Opus
+TTS_SEGMENT_CHARS = int(os.getenv('TTS_SEGMENT_CHARS', '200'))
+FFMPEG_PATH = os.getenv('FFMPEG_PATH', 'ffmpeg')
+TTS_OPUS_BITRATE = os.getenv('TTS_OPUS_BITRATE', '32k')
+
+# Кэш переводов: размер в памяти и файл SQLite (пустая строка - без сохранения на диск)
+TRANSLATION_CACHE_SIZE = int(os.getenv('TRANSLATION_CACHE_SIZE', '10000'))
+TRANSLATION_CACHE_DB = os.getenv('TRANSLATION_CACHE_DB', os.path.join('cache', 'translations.sqlite3'))
+
+# Языки /translate: код -> (название для «Перевод на ...», подпись перевода)
+TRANSLATE_LANGUAGES = {
+    'en': ('английский', '🇺🇸 English'),
+    'de': ('немецкий', '🇩🇪 Deutsch'),
+    'fr': ('французский', '🇫🇷 Français'),
+}
+TRANSLATE_DEFAULT_LANGUAGE = 'en'
+
+# Пакетный перевод: сколько секунд собирать запросы, максимум текстов
+# и символов в одном запросе к переводчику
+TRANSLATE_BATCH_WINDOW = float(os.getenv('TRANSLATE_BATCH_WINDOW', '0.01'))
+TRANSLATE_BATCH_SIZE = int(os.getenv('TRANSLATE_BATCH_SIZE', '20'))
+TRANSLATE_BATCH_CHARS = int(os.getenv('TRANSLATE_BATCH_CHARS', '4500'))
+
+# Режим получения обновлений: polling (по умолчанию) или webhook
+RUN_MODE = os.getenv('RUN_MODE', 'polling')
+
+# Настройки webhook-сервера. WEBHOOK_BASE_URL - публичный адрес для регистрации
+# webhook в Telegram; если он пуст, сервер только принимает POST-запросы
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_PATH = os.getenv('WEBHOOK_PATH', '/webhook')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+WEBHOOK_BASE_URL = os.getenv('WEBHOOK_BASE_URL', '')
+
+# Хранилище состояний пользователей: memory или sqlite (общее для нескольких процессов)
+STATE_BACKEND = os.getenv('STATE_BACKEND', 'memory')
+STATE_TTL = int(os.getenv('STATE_TTL', '3600'))
+STATE_MAX_SIZE = int(os.getenv('STATE_MAX_SIZE', '100000'))
+STATE_DB_PATH = os.getenv('STATE_DB_PATH', os.path.join('cache', 'states.sqlite3'))
+
+# Хранилище фото пользователей и его индекс (SQLite)
+PHOTO_DIR = os.getenv('PHOTO_DIR', 'img')
+PHOTO_INDEX_DB = os.getenv('PHOTO_INDEX_DB', os.path.join(PHOTO_DIR, 'index.sqlite3'))
+
+# Постобработка фото в пуле процессов (PHOTO_PROCESS_WORKERS=0 - выключена):
+# размер очереди, максимальная сторона, качество JPEG, целевой размер файла
+# (0 - без ограничения) и сторона миниатюры
+PHOTO_PROCESS_WORKERS = int(os.getenv('PHOTO_PROCESS_WORKERS', '2'))
+PHOTO_PROCESS_QUEUE = int(os.getenv('PHOTO_PROCESS_QUEUE', '100'))
+PHOTO_MAX_SIDE = int(os.getenv('PHOTO_MAX_SIDE', '2560'))
+PHOTO_JPEG_QUALITY = int(os.getenv('PHOTO_JPEG_QUALITY', '82'))
+PHOTO_MAX_BYTES = int(os.getenv('PHOTO_MAX_BYTES', '0'))
+PHOTO_THUMB_SIZE = int(os.getenv('PHOTO_THUMB_SIZE', '320'))
+
+# Папка тестовых фото для /photo и файл с сохраненными file_id
+TEST_PHOTOS_DIR = os.getenv('TEST_PHOTOS_DIR', 'test_photos')
+MEDIA_REGISTRY_PATH = os.getenv('MEDIA_REGISTRY_PATH', os.path.join('cache', 'media_registry.json'))
+
+# Лимиты запросов на пользователя: команда -> (запросов в секунду, запас)
+RATE_LIMITS = {
+    'weather': (float(os.getenv('RATE_LIMIT_WEATHER', '0.2')), 3),
+    'translate': (float(os.getenv('RATE_LIMIT_TRANSLATE', '0.2')), 3),
+    'voice': (float(os.getenv('RATE_LIMIT_VOICE', '0.1')), 2),
+    'photo': (float(os.getenv('RATE_LIMIT_PHOTO', '0.2')), 3),
+    'photo_upload': (float(os.getenv('RATE_LIMIT_PHOTO_UPLOAD', '0.5')), 5),
+}
+# Сколько секунд запрос сверх лимита может ждать в очереди, прежде чем будет отклонен
+RATE_LIMIT_MAX_WAIT = float(os.getenv('RATE_LIMIT_MAX_WAIT', '2'))
+# Общий лимит исходящих запросов к Telegram API в секунду
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', '30'))
+
+# HTTP-эндпоинт /metrics в формате Prometheus (METRICS_PORT=0 - выключен)
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT', '9108'))
+
+# Параллельная обработка обновлений: число воркеров (0 - обработка
+# средствами aiogram, задача на каждое обновление, без порядка по чатам),
+# лимит очереди и лимит очереди одного чата
+UPDATE_WORKERS = int(os.getenv('UPDATE_WORKERS', '64'))
+UPDATE_QUEUE_SIZE = int(os.getenv('UPDATE_QUEUE_SIZE', '1000'))
+UPDATE_CHAT_QUEUE_SIZE = int(os.getenv('UPDATE_CHAT_QUEUE_SIZE', '100'))
+
+# Журнал входящих обновлений для повторной обработки после падения (пусто -
+# выключен): размер сегмента, интервал группового fsync и сколько полностью
+# обработанных сегментов хранить (для воспроизведения нагрузки)
+JOURNAL_DIR = os.getenv('JOURNAL_DIR', os.path.join('cache', 'journal'))
+JOURNAL_SEGMENT_MB = int(os.getenv('JOURNAL_SEGMENT_MB', '16'))
+JOURNAL_FSYNC_INTERVAL = float(os.getenv('JOURNAL_FSYNC_INTERVAL', '0.005'))
+JOURNAL_KEEP_SEGMENTS = int(os.getenv('JOURNAL_KEEP_SEGMENTS', '4'))
+
+# Многопроцессный режим (supervisor.py): число процессов-воркеров, их
+# локальные порты, проверка здоровья (интервал, число неудачных проверок
+# до перезапуска, время на запуск процесса)
+WORKER_PROCESSES = int(os.getenv('WORKER_PROCESSES', str(os.cpu_count() or 1)))
+WORKER_BASE_PORT = int(os.getenv('WORKER_BASE_PORT', '8100'))
+WORKER_HEALTH_INTERVAL = float(os.getenv('WORKER_HEALTH_INTERVAL', '5'))
+WORKER_HEALTH_FAILURES = int(os.getenv('WORKER_HEALTH_FAILURES', '3'))
+WORKER_START_TIMEOUT = float(os.getenv('WORKER_START_TIMEOUT', '60'))
+
+# Фоновые задачи (обновление погоды, рассылка по подпискам); в
+# многопроцессном режиме выполняются только в первом воркере
+BACKGROUND_JOBS = os.getenv('BACKGROUND_JOBS', '1') == '1'
+
+# Диагностика event loop: интервал замера лага (0 - выключена), через сколько
+# секунд блокировки записывать стек, частота семплов и длительность профиля
+# по запросу (/profile, SIGUSR1) и папка для профилей
+LOOP_MONITOR_INTERVAL = float(os.getenv('LOOP_MONITOR_INTERVAL', '0.1'))
+LOOP_STALL_THRESHOLD = float(os.getenv('LOOP_STALL_THRESHOLD', '0.25'))
+PROFILE_SAMPLE_RATE = int(os.getenv('PROFILE_SAMPLE_RATE', '100'))
+PROFILE_SECONDS = float(os.getenv('PROFILE_SECONDS', '10'))
+DIAGNOSTICS_DIR = os.getenv('DIAGNOSTICS_DIR', os.path.join('cache', 'diagnostics'))
+
+# Telegram ID администраторов через запятую: им доступны /diag и /profile
+ADMIN_IDS = {int(user_id) for user_id in os.getenv('ADMIN_IDS', '').replace(',', ' ').split()}
+
+# Индикация прогресса: через сколько секунд показывать чат-действие
+# ("печатает...") и через сколько - сообщение о загрузке
+REPLY_ACTION_AFTER = float(os.getenv('REPLY_ACTION_AFTER', '0.3'))
+REPLY_LOADING_AFTER = float(os.getenv('REPLY_LOADING_AFTER', '2'))
 
 # Настройки бота
 BOT_NAME = "Погодный Бот"
@@ -35,22 +222,50 @@ MESSAGES = {
     'start': """
 🌤️ Добро пожаловать в {bot_name}!
 
-Я помогу вам узнать текущую погоду в Москве.
+Я помогу вам:
+• Узнать погоду в Москве и других городах
+• Сохранить ваши фото
+• Отправить голосовые сообщения
+• Перевести текст на английский, немецкий или французский
 
 Доступные команды:
 /start - Начать работу с ботом
 /help - Показать справку
-/weather - Получить прогноз погоды в Москве
+/weather [город] - Получить прогноз погоды (по умолчанию в Москве)
+/subscribe ЧЧ:ММ [город] - Ежедневный прогноз в указанное время
+/unsubscribe - Отменить ежедневный прогноз
+/voice - Создать голосовое сообщение
+/translate [en|de|fr] <текст> - Перевести текст (по умолчанию на английский)
+/photo - Отправить случайное тестовое фото
+
+Также вы можете:
+📸 Отправить фото - я сохраню его
     """,
     
-    'help': """
+    'help': f"""
 📋 Справка по командам:
 
 /start - Начать работу с ботом
 /help - Показать эту справку
-/weather - Получить текущий прогноз погоды в Москве
+/weather [город] - Получить текущий прогноз погоды (по умолчанию в Москве)
+/subscribe ЧЧ:ММ [город] - Ежедневный прогноз в указанное время ({SUBSCRIPTIONS_TZ_LABEL})
+/unsubscribe - Отменить ежедневный прогноз
+/voice - Создать голосовое сообщение
+/translate [en|de|fr] <текст> - Перевести текст (по умолчанию на английский)
+/photo - Отправить случайное тестовое фото
+
+📸 Функции:
+• Отправьте фото - бот сохранит его в папку img/
+• Используйте /voice для создания голосовых сообщений
+• Используйте /translate для перевода текста
 
-Просто отправьте команду /weather, и я покажу вам актуальную информацию о погоде в столице России!
+Примеры:
+/weather Казань
+/subscribe 08:30 Казань
+/voice (затем напишите текст)
+/translate Привет, как дела?
+/translate de Доброе утро
+/photo
     """,
     
     'weather_error': """
@@ -59,7 +274,7 @@ MESSAGES = {
     """,
     
     'weather_format': """
-🌤️ Погода в Москве:
+🌤️ Погода: {city}
 
 🌡️ Температура: {temp}°C
 🌡️ Ощущается как: {feels_like}°C
@@ -72,6 +287,32 @@ MESSAGES = {
 🕐 Обновлено: {time}
     """,
     
+    'weather_stale': """
+⚠️ Сервис погоды временно недоступен, показаны последние данные на {time}
+    """,
+    
+    'city_not_found': """
+🔍 Город «{query}» не найден. Попробуйте написать название иначе, например: /weather Казань
+    """,
+    
+    'subscribe_usage': """
+❌ Укажите время в формате ЧЧ:ММ и, при желании, город.
+Пример: /subscribe 08:30 Казань
+    """,
+    
+    'subscribed': f"""
+✅ Подписка оформлена! Каждый день в {{time}} ({SUBSCRIPTIONS_TZ_LABEL}) я пришлю прогноз погоды.
+Отменить подписку: /unsubscribe
+    """,
+    
+    'unsubscribed': """
+✅ Подписка на ежедневный прогноз отменена.
+    """,
+    
+    'not_subscribed': """
+ℹ️ У вас нет подписки на ежедневный прогноз.
+    """,
+    
     'photo_saved': """
 📸 Фото сохранено!
 
@@ -88,16 +329,24 @@ MESSAGES = {
     """,
     
     'translation': """
-🌍 Перевод на английский:
+🌍 Перевод на {language}:
 
 🇷🇺 Русский: {original_text}
-🇺🇸 English: {translated_text}
+{label}: {translated_text}
     """,
     
     'translation_error': """
 ❌ Ошибка перевода. Попробуйте еще раз.
     """,
     
+    'photo_duplicate': """
+♻️ Такое фото уже было сохранено раньше, повторно оно не записывалось.
+    """,
+    
+    'rate_limited': """
+⏳ Слишком много запросов. Попробуйте еще раз через {seconds} сек.
+    """,
+    
     'photo_error': """
 ❌ Ошибка при сохранении фото.
     """,
@@ -0,0 +1,244 @@
+"""
+Диагностика event loop в работающем боте: постоянный замер лага, стек кода,
+заблокировавшего loop, и семплирующий профилировщик по запросу
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+from collections import Counter, deque
+from datetime import datetime
+
+from metrics import LOOP_LAG_SECONDS
+
+logger = logging.getLogger(__name__)
+
+MAX_PROFILE_SECONDS = 120
+
+
+def frame_name(code) -> str:
+    """
+    Имя кадра для collapsed stacks: функция (папка/файл:строка определения)
+    """
+    path = os.path.join(*code.co_filename.replace('\\', '/').split('/')[-2:])
+    return f"{code.co_name} ({path}:{code.co_firstlineno})"
+
+
+def collapse_stack(frame) -> str:
+    """
+    Стек потока от корня к текущей функции через ';' (формат flamegraph.pl)
+    """
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame.f_code))
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def sample_stacks(duration: float, rate: int = 100, stop: threading.Event = None) -> Counter:
+    """
+    Снимает стеки всех потоков rate раз в секунду в течение duration секунд.
+    Возвращает Counter: "поток;кадр;...;кадр" -> число семплов
+    """
+    samples = Counter()
+    interval = 1 / rate
+    own = threading.get_ident()
+    deadline = time.monotonic() + duration
+    stop = stop or threading.Event()
+    while time.monotonic() < deadline and not stop.is_set():
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            samples[f"{names.get(ident, ident)};{collapse_stack(frame)}"] += 1
+        stop.wait(interval)
+    return samples
+
+
+def top_functions(samples: Counter, limit: int = 10, thread: str = None) -> list:
+    """
+    Функции с наибольшим числом собственных семплов (верхний кадр стека)
+    """
+    own = Counter()
+    for stack, count in samples.items():
+        if thread is None or stack.startswith(thread + ';'):
+            own[stack.rsplit(';', 1)[-1]] += count
+    return own.most_common(limit)
+
+
+class LoopMonitor:
+    """
+    Следит за event loop с низкими накладными расходами.
+
+    Задача в loop просыпается каждые interval секунд и записывает, насколько
+    позже запланированного это произошло (лаг - в гистограмму
+    bot_event_loop_lag_seconds). Отдельный поток раз в threshold / 2 секунд
+    проверяет, когда задача просыпалась последний раз: если loop не отвечает
+    дольше threshold, поток снимает стек потока loop - это и есть код,
+    который его блокирует, - и пишет его в лог. Когда loop оживает,
+    к записи добавляется полная длительность блокировки.
+
+    Стек снимается, пока блокировка продолжается, поэтому C-код, который
+    держит GIL все это время, будет виден только после его завершения.
+
+    profile() и сигнал SIGUSR1 запускают семплирующий профилировщик всех
+    потоков; результат в формате collapsed stacks (для flamegraph.pl,
+    speedscope) сохраняется в папку profile_dir.
+    """
+
+    def __init__(
+        self,
+        interval: float = 0.1,
+        threshold: float = 0.25,
+        sample_rate: int = 100,
+        profile_seconds: float = 10,
+        profile_dir: str = os.path.join('cache', 'diagnostics'),
+        max_stalls: int = 20,
+        window: int = 600,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.sample_rate = sample_rate
+        self.profile_seconds = profile_seconds
+        self.profile_dir = profile_dir
+        self.stalls = deque(maxlen=max_stalls)  # последние блокировки: время, длительность, стек
+        self.stall_count = 0
+        self._lags = deque(maxlen=window)
+        self._heartbeat = time.monotonic()
+        self._reported = None  # heartbeat, для которого стек уже снят
+        self._loop_thread = None
+        self._task = None
+        self._watchdog = None
+        self._stopped = threading.Event()
+        self._profiling = None
+        self._profile_stop = threading.Event()
+        self._profile_tasks = set()
+
+    def start(self):
+        """
+        Запускает замер лага и поток-сторож (в работающем event loop)
+        """
+        if self._task is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._stopped.clear()
+        self._task = asyncio.create_task(self._tick())
+        self._watchdog = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._watchdog.start()
+        if hasattr(signal, 'SIGUSR1'):
+            try:
+                loop.add_signal_handler(signal.SIGUSR1, self._on_signal)
+            except (NotImplementedError, RuntimeError):
+                pass
+        logger.info(f"Мониторинг event loop запущен: порог блокировки {self.threshold} с")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._stopped.set()
+        self._profile_stop.set()
+        self._task.cancel()
+        await asyncio.gather(self._task, *self._profile_tasks, return_exceptions=True)
+        self._task = None
+        self._watchdog.join(timeout=1)
+        if hasattr(signal, 'SIGUSR1'):
+            try:
+                asyncio.get_running_loop().remove_signal_handler(signal.SIGUSR1)
+            except (NotImplementedError, RuntimeError):
+                pass
+
+    async def _tick(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            expected = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - expected)
+            previous = self._heartbeat
+            self._heartbeat = time.monotonic()
+            self._lags.append(lag)
+            LOOP_LAG_SECONDS.observe(lag)
+            if lag < self.threshold:
+                continue
+            if self._reported == previous and self.stalls:
+                # Стек уже снят сторожем - дописываем полную длительность
+                self.stalls[-1]['duration'] = lag
+            else:
+                # Блокировка оказалась короче интервала проверки сторожа
+                self.stall_count += 1
+                self.stalls.append({'at': time.time() - lag, 'duration': lag, 'stack': None})
+            logger.warning(f"Event loop был заблокирован на {lag:.3f} с")
+
+    def _watch(self):
+        check_interval = max(self.threshold / 2, 0.01)
+        while not self._stopped.wait(check_interval):
+            heartbeat = self._heartbeat
+            # Задача просыпается раз в interval, блокировкой считается задержка сверх этого
+            blocked = time.monotonic() - heartbeat - self.interval
+            if blocked < self.threshold or self._reported == heartbeat:
+                continue
+            self._reported = heartbeat
+            frame = sys._current_frames().get(self._loop_thread)
+            stack = ''.join(traceback.format_stack(frame)) if frame is not None else None
+            self.stall_count += 1
+            self.stalls.append({'at': time.time() - blocked, 'duration': blocked, 'stack': stack})
+            logger.warning(f"Event loop не отвечает {blocked:.3f} с, стек потока loop:\n{stack}")
+
+    def _on_signal(self):
+        task = asyncio.create_task(self.profile())
+        self._profile_tasks.add(task)
+        task.add_done_callback(self._profile_tasks.discard)
+
+    @property
+    def profiling(self) -> bool:
+        return self._profiling is not None
+
+    async def profile(self, seconds: float = None):
+        """
+        Семплирует стеки всех потоков seconds секунд (в отдельном потоке)
+        и сохраняет collapsed stacks в файл. Возвращает (путь, семплы) или
+        None, если профилирование уже идет. Если семплов нет (профилирование
+        прервано остановкой), файл не создается и путь равен None
+        """
+        if seconds is None:
+            seconds = self.profile_seconds
+        if not 0 < seconds < float('inf'):
+            raise ValueError(f"Длительность профилирования должна быть положительной: {seconds}")
+        if self._profiling is not None:
+            logger.warning("Профилирование уже выполняется")
+            return None
+        seconds = min(seconds, MAX_PROFILE_SECONDS)
+        self._profile_stop.clear()
+        logger.info(f"Профилирование {seconds} с, {self.sample_rate} семплов в секунду")
+        loop = asyncio.get_running_loop()
+        self._profiling = loop.run_in_executor(None, sample_stacks, seconds, self.sample_rate, self._profile_stop)
+        try:
+            samples = await self._profiling
+        finally:
+            self._profiling = None
+        if not samples:
+            logger.warning("Профиль пуст: ни одного семпла")
+            return None, samples
+
+        os.makedirs(self.profile_dir, exist_ok=True)
+        path = os.path.join(self.profile_dir, f"profile-{datetime.now():%Y%m%d-%H%M%S}.folded")
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+        logger.info(f"Профиль сохранен: {path} ({sum(samples.values())} семплов)")
+        return path, samples
+
+    def stats(self) -> dict:
+        lags = sorted(self._lags)
+        return {
+            'lag_p50': lags[len(lags) // 2] if lags else 0.0,
+            'lag_p99': lags[min(len(lags) - 1, int(len(lags) * 0.99))] if lags else 0.0,
+            'lag_max': lags[-1] if lags else 0.0,
+            'stalls': self.stall_count,
+        }
@@ -0,0 +1,79 @@
+"""
+Ограниченный пул потоков для блокирующих бэкендов (переводчик, gTTS)
+"""
+
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class BlockingExecutor:
+    """
+    Выполняет блокирующие вызовы в пуле потоков, не останавливая event loop.
+
+    Для каждого бэкенда действует свой лимит одновременных вызовов:
+    лишние вызовы ждут своей очереди, и глубина этой очереди видна в stats().
+    """
+
+    def __init__(self, max_workers: int = 8, backend_limits: dict = None, default_limit: int = 4):
+        self.max_workers = max_workers
+        self.backend_limits = dict(backend_limits or {})
+        self.default_limit = default_limit
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='blocking')
+        self._semaphores = {}
+        self._stats = {}
+
+    def _backend(self, name: str):
+        if name not in self._semaphores:
+            limit = self.backend_limits.get(name, self.default_limit)
+            self._semaphores[name] = asyncio.Semaphore(limit)
+            self._stats[name] = {
+                'limit': limit,
+                'queued': 0,
+                'max_queued': 0,
+                'active': 0,
+                'completed': 0,
+                'failed': 0,
+            }
+        return self._semaphores[name], self._stats[name]
+
+    async def run(self, backend: str, func, *args, **kwargs):
+        """
+        Выполняет func(*args, **kwargs) в пуле с учетом лимита бэкенда
+        """
+        semaphore, stats = self._backend(backend)
+
+        stats['queued'] += 1
+        stats['max_queued'] = max(stats['max_queued'], stats['queued'])
+        try:
+            await semaphore.acquire()
+        finally:
+            stats['queued'] -= 1
+
+        stats['active'] += 1
+        try:
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(self._pool, functools.partial(func, *args, **kwargs))
+            stats['completed'] += 1
+            return result
+        except Exception:
+            stats['failed'] += 1
+            raise
+        finally:
+            stats['active'] -= 1
+            semaphore.release()
+
+    def stats(self) -> dict:
+        """
+        Возвращает копию счетчиков по каждому бэкенду
+        """
+        return {name: dict(values) for name, values in self._stats.items()}
+
+    def shutdown(self):
+        """
+        Останавливает пул потоков, не дожидаясь зависших вызовов
+        """
+        self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,65 @@
+"""
+Общий долгоживущий HTTP-клиент с пулом соединений для исходящих запросов
+"""
+
+import logging
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+class HttpClient:
+    """
+    Обертка над одной aiohttp.ClientSession на все время работы бота.
+
+    Соединения переиспользуются (keep-alive), DNS-ответы кэшируются,
+    поэтому повторные запросы не платят за установку TCP и резолвинг.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 100,
+        per_host_limit: int = 20,
+        dns_cache_ttl: int = 300,
+        total_timeout: float = 15,
+        connect_timeout: float = 5,
+    ):
+        self.pool_size = pool_size
+        self.per_host_limit = per_host_limit
+        self.dns_cache_ttl = dns_cache_ttl
+        self.timeout = aiohttp.ClientTimeout(total=total_timeout, connect=connect_timeout)
+        self._session = None
+
+    async def start(self):
+        """
+        Создает сессию (вызывается в main() при запуске бота)
+        """
+        session = self.session
+        logger.info(
+            f"HTTP-клиент запущен: пул {self.pool_size}, "
+            f"на хост {self.per_host_limit}, DNS TTL {self.dns_cache_ttl} с"
+        )
+        return session
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """
+        Возвращает общую сессию, создавая ее при первом обращении
+        """
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.pool_size,
+                limit_per_host=self.per_host_limit,
+                ttl_dns_cache=self.dns_cache_ttl,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self._session
+
+    async def close(self):
+        """
+        Закрывает сессию и все соединения пула
+        """
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
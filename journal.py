@@ -0,0 +1,399 @@
+"""
+Журнал входящих обновлений: обновления записываются на диск до обработки,
+после обработки записывается результат. Необработанные к моменту падения
+обновления обрабатываются повторно после перезапуска (at-least-once)
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import struct
+import time
+import zlib
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.dispatcher.event.bases import UNHANDLED
+from aiogram.methods import GetUpdates
+from aiogram.types import Update
+
+logger = logging.getLogger(__name__)
+
+# Запись: длина данных, crc32 (вид + данные), вид записи; затем данные
+RECORD_HEADER = struct.Struct('<IIB')
+# Данные записи обновления: время получения, дальше JSON обновления
+UPDATE_PREFIX = struct.Struct('<d')
+# Данные записи результата: update_id, результат, время обработки
+OUTCOME_RECORD = struct.Struct('<qBf')
+
+KIND_UPDATE = 1
+KIND_OUTCOME = 2
+
+# Результаты обработки
+OK = 0
+FAILED = 1
+DROPPED = 2
+OUTCOME_NAMES = {OK: 'ok', FAILED: 'failed', DROPPED: 'dropped'}
+
+PENDING = 'pending'
+DONE = 'done'
+
+SEGMENT_NAME = re.compile(r'^(\d{8})\.log$')
+
+
+def segment_path(directory: str, seq: int) -> str:
+    return os.path.join(directory, f"{seq:08d}.log")
+
+
+def list_segments(directory: str) -> list:
+    """
+    Номера сегментов журнала в папке по возрастанию
+    """
+    if not os.path.isdir(directory):
+        return []
+    return sorted(
+        int(match.group(1)) for match in map(SEGMENT_NAME.match, os.listdir(directory)) if match
+    )
+
+
+def read_segment(path: str):
+    """
+    Читает записи сегмента: (вид, данные). Недописанный или поврежденный
+    хвост (процесс упал во время записи) пропускается
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    offset = 0
+    while offset + RECORD_HEADER.size <= len(data):
+        length, crc, kind = RECORD_HEADER.unpack_from(data, offset)
+        start = offset + RECORD_HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(bytes([kind]) + payload) != crc:
+            logger.warning(f"Журнал {path}: поврежденная запись на смещении {offset}, остаток сегмента пропущен")
+            return
+        yield kind, payload
+        offset = start + length
+    if offset < len(data):
+        logger.warning(f"Журнал {path}: недописанная запись на смещении {offset} пропущена")
+
+
+def segment_records(path: str):
+    """
+    Записи сегмента: ('update', update_id, время получения, JSON)
+    и ('outcome', update_id, результат, время обработки)
+    """
+    for kind, payload in read_segment(path):
+        if kind == KIND_UPDATE:
+            (received_at,) = UPDATE_PREFIX.unpack_from(payload)
+            raw = payload[UPDATE_PREFIX.size:]
+            yield 'update', json.loads(raw)['update_id'], received_at, raw
+        elif kind == KIND_OUTCOME:
+            update_id, outcome, duration = OUTCOME_RECORD.unpack(payload)
+            yield 'outcome', update_id, outcome, duration
+
+
+def iter_records(directory: str):
+    """
+    Все записи журнала по порядку (см. segment_records)
+    """
+    for seq in list_segments(directory):
+        yield from segment_records(segment_path(directory, seq))
+
+
+def encode_record(kind: int, payload: bytes) -> bytes:
+    return RECORD_HEADER.pack(len(payload), zlib.crc32(bytes([kind]) + payload), kind) + payload
+
+
+class UpdateJournal:
+    """
+    Журнал обновлений из сегментов-файлов, в которые только дописываются записи.
+
+    record() дописывает обновления и ждет, пока они окажутся на диске:
+    fsync выполняется не на каждую запись, а раз в fsync_interval секунд
+    для всех записей, накопившихся за это время (в пуле потоков, не
+    блокируя event loop). Результаты обработки (finish()) на диск не ждут:
+    если результат не успел записаться, обновление будет обработано
+    повторно, что допустимо при at-least-once.
+
+    Когда сегмент превышает segment_bytes, начинается новый. Старые
+    сегменты удаляются по порядку, когда все обновления в них обработаны
+    и завершенных сегментов больше keep_segments (оставшиеся можно
+    воспроизвести для профилирования).
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 16 * 1024 * 1024, fsync_interval: float = 0.005, keep_segments: int = 4):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.keep_segments = keep_segments
+        self._file = None
+        self._seq = 0
+        self._segments = {}  # номер сегмента -> update_id записанных в нем обновлений
+        self._ids = {}  # update_id -> номер сегмента с обновлением
+        self._pending = set()  # update_id без записанного результата
+        self._commit_future = None
+        self._commit_lock = None
+        self._tasks = set()
+        self.records = {'update': 0, 'outcome': 0}
+        self.fsyncs = 0
+        self.replayed = 0
+        self.duplicates = 0
+        self.errors = 0
+
+    def open(self) -> list:
+        """
+        Читает существующие сегменты и начинает новый.
+        Возвращает необработанные обновления (словари) в порядке получения
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self._commit_lock = asyncio.Lock()
+        unfinished = {}
+        for seq in list_segments(self.directory):
+            ids = self._segments[seq] = set()
+            for kind, update_id, _, raw in segment_records(segment_path(self.directory, seq)):
+                if kind == 'outcome':
+                    unfinished.pop(update_id, None)
+                    self._pending.discard(update_id)
+                elif update_id not in self._ids:
+                    unfinished[update_id] = raw
+                    self._pending.add(update_id)
+                    self._ids[update_id] = seq
+                    ids.add(update_id)
+        self._open_segment()
+        self._compact()
+        self.replayed = len(unfinished)
+        if unfinished:
+            logger.info(f"В журнале {self.directory} необработанных обновлений: {len(unfinished)}")
+        return [json.loads(raw) for raw in unfinished.values()]
+
+    def status(self, update_id: int):
+        """
+        PENDING - обновление записано и еще не обработано, DONE - обработано,
+        None - не записано (или его сегмент уже удален)
+        """
+        if update_id in self._pending:
+            return PENDING
+        if update_id in self._ids:
+            return DONE
+        return None
+
+    async def record(self, updates: list) -> list:
+        """
+        Записывает обновления, которых еще нет в журнале, и ждет fsync.
+        Возвращает новые обновления, которые нужно обработать; уже известные
+        (повторная доставка Telegram или обновление из журнала, которое
+        сейчас обрабатывается) пропускаются
+        """
+        new = []
+        received_at = time.time()
+        for update in updates:
+            if self.status(update.update_id) is not None:
+                self.duplicates += 1
+                continue
+            new.append(update)
+            raw = update.model_dump_json(exclude_unset=True, by_alias=True).encode()
+            if not self._write(KIND_UPDATE, UPDATE_PREFIX.pack(received_at) + raw):
+                continue
+            self._ids[update.update_id] = self._seq
+            self._segments[self._seq].add(update.update_id)
+            self._pending.add(update.update_id)
+            self.records['update'] += 1
+        if new:
+            await self._schedule_commit()
+        return new
+
+    def finish(self, update_id: int, outcome: int = OK, duration: float = 0.0):
+        """
+        Записывает результат обработки обновления (без ожидания fsync)
+        """
+        if update_id not in self._pending or self._file is None:
+            return
+        self._pending.discard(update_id)
+        if self._write(KIND_OUTCOME, OUTCOME_RECORD.pack(update_id, outcome, duration)):
+            self.records['outcome'] += 1
+            self._schedule_commit()
+
+    def _write(self, kind: int, payload: bytes) -> bool:
+        try:
+            self._file.write(encode_record(kind, payload))
+            return True
+        except OSError as e:
+            self.errors += 1
+            logger.error(f"Ошибка записи журнала {self.directory}: {e}")
+            return False
+
+    def _schedule_commit(self) -> asyncio.Future:
+        """
+        Future, который завершится после fsync всех уже сделанных записей.
+        Записи, сделанные до начала fsync, попадают в один общий коммит
+        """
+        if self._commit_future is None:
+            self._commit_future = asyncio.get_running_loop().create_future()
+            task = asyncio.create_task(self._commit(self._commit_future))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return self._commit_future
+
+    async def _commit(self, future: asyncio.Future):
+        """
+        Результат future - True, если записи на диске. Ошибка записи не
+        останавливает бота: обновления обрабатываются, но без гарантии
+        повторной обработки после падения
+        """
+        durable = False
+        try:
+            if self.fsync_interval > 0:
+                await asyncio.sleep(self.fsync_interval)
+            async with self._commit_lock:
+                # Записи после этой точки ждут следующего коммита
+                if self._commit_future is future:
+                    self._commit_future = None
+                self._file.flush()
+                await asyncio.get_running_loop().run_in_executor(None, os.fsync, self._file.fileno())
+                self.fsyncs += 1
+                durable = True
+                if self._file.tell() >= self.segment_bytes:
+                    self._rotate()
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Ошибка записи журнала {self.directory}: {e}")
+        finally:
+            if self._commit_future is future:
+                self._commit_future = None
+            if not future.done():
+                future.set_result(durable)
+
+    def _open_segment(self):
+        self._seq = (list_segments(self.directory) or [0])[-1] + 1
+        self._segments[self._seq] = set()
+        # Новый сегмент при каждом запуске: хвост старого мог остаться недописанным
+        self._file = open(segment_path(self.directory, self._seq), 'ab', buffering=1024 * 1024)
+        self._fsync_directory()
+
+    def _rotate(self):
+        self._file.close()
+        self._open_segment()
+        self._compact()
+
+    def _compact(self):
+        """
+        Удаляет самые старые сегменты, в которых все обновления обработаны,
+        если завершенных сегментов больше keep_segments
+        """
+        for seq in sorted(self._segments):
+            closed = len(self._segments) - 1
+            if seq == self._seq or closed <= self.keep_segments:
+                return
+            ids = self._segments[seq]
+            if not ids.isdisjoint(self._pending):
+                # Сегменты удаляются только по порядку: в более новых могут быть
+                # результаты обновлений из этого
+                return
+            try:
+                os.remove(segment_path(self.directory, seq))
+            except OSError as e:
+                logger.error(f"Не удалось удалить сегмент журнала {seq}: {e}")
+                return
+            for update_id in ids:
+                self._ids.pop(update_id, None)
+            del self._segments[seq]
+
+    def _fsync_directory(self):
+        # Новый файл сегмента не потеряется при сбое питания (на Windows не поддерживается)
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    async def close(self):
+        """
+        Дописывает накопленные записи на диск и закрывает сегмент
+        """
+        if self._file is None:
+            return
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        async with self._commit_lock:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def stats(self) -> dict:
+        return {
+            'pending': len(self._pending),
+            'segments': len(self._segments),
+            'records': dict(self.records),
+            'fsyncs': self.fsyncs,
+            'replayed': self.replayed,
+            'duplicates': self.duplicates,
+            'errors': self.errors,
+        }
+
+
+class JournalRequestMiddleware(BaseRequestMiddleware):
+    """
+    Middleware сессии бота для обработки средствами aiogram (start_polling):
+    полученные getUpdates обновления записываются в журнал до того, как
+    aiogram подтвердит их Telegram следующим getUpdates со сдвинутым offset.
+
+    Обновления возвращаются aiogram все, включая уже записанные:
+    повторы пропускает JournalMiddleware. С OrderedUpdateRunner не нужен -
+    poll_updates записывает обновления сам
+    """
+
+    def __init__(self, journal: UpdateJournal):
+        self.journal = journal
+
+    async def __call__(self, make_request, bot: Bot, method):
+        result = await make_request(bot, method)
+        if isinstance(method, GetUpdates) and result:
+            await self.journal.record(result)
+        return result
+
+
+class JournalMiddleware(BaseMiddleware):
+    """
+    Outer-middleware для dp.update: записывает в журнал обновления, которые
+    не были записаны при получении (обработка средствами aiogram), и
+    результат обработки каждого обновления. Уже обработанные и
+    обрабатываемые сейчас обновления (повторная доставка) пропускаются
+    """
+
+    def __init__(self, journal: UpdateJournal):
+        self.journal = journal
+        self._in_flight = set()
+
+    async def __call__(self, handler, event: Update, data: dict):
+        update_id = event.update_id
+        status = self.journal.status(update_id)
+        if status == DONE or update_id in self._in_flight:
+            self.journal.duplicates += 1
+            logger.info(f"Обновление {update_id} уже обработано, повтор пропущен")
+            return UNHANDLED
+        if status is None:
+            await self.journal.record([event])
+
+        self._in_flight.add(update_id)
+        started = time.perf_counter()
+        outcome = FAILED
+        try:
+            result = await handler(event, data)
+            outcome = OK
+            return result
+        except asyncio.CancelledError:
+            # Обработка прервана остановкой - обновление будет повторено после перезапуска
+            outcome = None
+            raise
+        finally:
+            self._in_flight.discard(update_id)
+            if outcome is not None:
+                self.journal.finish(update_id, outcome, time.perf_counter() - started)
@@ -1,22 +1,50 @@
+import argparse
 import asyncio
-import aiohttp
+import importlib
 import logging
 import os
-import io
-import random
-from datetime import datetime
-from aiogram import Bot, Dispatcher, types
-from aiogram.filters import Command
-from aiogram.types import Message, PhotoSize, FSInputFile
-from deep_translator import GoogleTranslator
-from gtts import gTTS
+import shutil
 import tempfile
+import time
+from datetime import datetime
+from aiogram import Router
+from aiogram.enums import ChatAction
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.filters import Command, CommandObject
+from aiogram.types import Message, FSInputFile, BufferedInputFile
 from config import (
     BOT_TOKEN, 
-    WEATHER_API_URL, 
-    MESSAGES, 
-    BOT_NAME
+    DEFAULT_CITY_ID,
+    TRANSLATE_LANGUAGES,
+    TRANSLATE_DEFAULT_LANGUAGE,
+    RUN_MODE,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_BASE_URL,
+    TEST_PHOTOS_DIR,
+    CITIES_FILE,
+    METRICS_HOST,
+    METRICS_PORT,
+    REPLY_ACTION_AFTER,
+    REPLY_LOADING_AFTER,
+    LOOP_MONITOR_INTERVAL,
+    ADMIN_IDS,
 )
+from bot_app import BotApp
+from replies import Progress
+from templates import render, static
+from scheduler import parse_time
+from webhook import run_webhook
+from update_runner import run_polling
+from metrics import (
+    registry as metrics_registry,
+    track_handler,
+    start_metrics_server,
+)
+from startup import StartupProfiler, measure_imports, format_report
+from diagnostics import top_functions
 
 # Настройка логирования
 logging.basicConfig(
@@ -25,72 +53,28 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Инициализация бота и диспетчера
-bot = Bot(token=BOT_TOKEN)
-dp = Dispatcher()
-
-# Инициализация переводчика
-translator = GoogleTranslator(source='ru', target='en')
+# Хендлеры регистрируются в роутере; бот, диспетчер и остальные
+# компоненты создаются в create_app() и передаются хендлерам аргументом app
+router = Router()
 
-# Создаем папку для изображений если её нет
-if not os.path.exists('img'):
-    os.makedirs('img')
+# Токен правильного формата для --profile-startup без .env
+PROFILE_TOKEN = '123456:profile-startup'
 
-# Словарь для отслеживания состояний пользователей
-user_states = {}
 
-
-async def get_weather_data():
+def make_progress(message: Message, loading_text: str, action: str = ChatAction.TYPING) -> Progress:
     """
-    Получает данные о погоде из OpenWeatherMap API
+    Индикатор прогресса с задержками из конфигурации
     """
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(WEATHER_API_URL) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return data
-                else:
-                    logger.error(f"Ошибка API: {response.status}")
-                    return None
-    except Exception as e:
-        logger.error(f"Ошибка при получении данных о погоде: {e}")
-        return None
-
-
-def format_weather_message(weather_data):
-    """
-    Форматирует данные о погоде в читаемое сообщение
-    """
-    try:
-        # Основные данные
-        temp = round(weather_data['main']['temp'])
-        feels_like = round(weather_data['main']['feels_like'])
-        description = weather_data['weather'][0]['description'].title()
-        wind_speed = weather_data['wind']['speed']
-        humidity = weather_data['main']['humidity']
-        pressure = round(weather_data['main']['pressure'] * 0.750062)  # Конвертация в мм рт.ст.
-        visibility = round(weather_data['visibility'] / 1000)  # Конвертация в км
-        
-        # Время обновления
-        current_time = datetime.now().strftime("%H:%M %d.%m.%Y")
-        
-        return MESSAGES['weather_format'].format(
-            temp=temp,
-            feels_like=feels_like,
-            description=description,
-            wind_speed=wind_speed,
-            humidity=humidity,
-            pressure=pressure,
-            visibility=visibility,
-            time=current_time
-        )
-    except Exception as e:
-        logger.error(f"Ошибка при форматировании данных о погоде: {e}")
-        return MESSAGES['weather_error']
+    return Progress(
+        message,
+        loading_text,
+        action=action,
+        action_after=REPLY_ACTION_AFTER,
+        loading_after=REPLY_LOADING_AFTER,
+    )
 
 
-async def save_photo(message: Message):
+async def save_photo(app: BotApp, message: Message):
     """
     Сохраняет фото, отправленное пользователем
     """
@@ -98,71 +82,106 @@ async def save_photo(message: Message):
         # Получаем фото с наилучшим качеством
         photo = message.photo[-1]  # Берем фото с максимальным разрешением
         
-        # Скачиваем файл
-        file = await bot.get_file(photo.file_id)
-        file_path = file.file_path
+        # Скачиваем файл с подсчетом хэша и сохраняем без дубликатов
+        stored = await app.photo_store.ingest(app.bot, photo.file_id, photo.file_unique_id)
         
-        # Создаем уникальное имя файла
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"photo_{timestamp}_{photo.file_id[:8]}.jpg"
-        save_path = os.path.join('img', filename)
-        
-        # Скачиваем и сохраняем файл
-        await bot.download_file(file_path, save_path)
-        
-        # Получаем размер файла
-        file_size = os.path.getsize(save_path)
+        # Обработка идет в фоне, ответ пользователю ее не ждет
+        if not stored['duplicate']:
+            app.photo_processor.submit(stored['sha256'], stored['save_path'], app.photo_store.thumb_path_for(stored['sha256']))
         
         return {
             'success': True,
-            'filename': filename,
-            'file_size': file_size,
-            'save_path': save_path
+            'filename': stored['filename'],
+            'file_size': stored['file_size'],
+            'save_path': stored['save_path'],
+            'duplicate': stored['duplicate']
         }
     except Exception as e:
         logger.error(f"Ошибка при сохранении фото: {e}")
         return {'success': False, 'error': str(e)}
 
 
-async def create_voice_message(text: str):
+async def create_voice_message(app: BotApp, text: str, lang: str = 'ru', slow: bool = False):
     """
-    Создает голосовое сообщение из текста
+    Создает голосовое сообщение из текста или берет готовое из кэша
     """
     try:
-        # Создаем временный файл для аудио в формате ogg
-        temp_path = tempfile.mktemp(suffix='.ogg')
+        cache_key = app.tts_cache.make_key(text, lang, slow, app.speech_synthesizer.audio_format)
         
-        # Создаем TTS объект и сохраняем в файл
-        tts = gTTS(text=text, lang='ru', slow=False)
-        tts.save(temp_path)
+        # Уже отправляли такую фразу или она есть на диске - синтез не нужен
+        file_id, file_path = app.tts_cache.lookup(cache_key)
+        if file_id or file_path:
+            return {
+                'success': True,
+                'cache_key': cache_key,
+                'file_id': file_id,
+                'file_path': file_path
+            }
         
-        # Проверяем, что файл создался
-        if not os.path.exists(temp_path):
-            return {'success': False, 'error': 'Файл не был создан'}
+        # Синтезируем речь в памяти (фрагменты текста - параллельно)
+        audio, audio_format = await app.speech_synthesizer.synthesize(text, lang=lang, slow=slow)
+        if not audio:
+            return {'success': False, 'error': 'Пустой ответ синтеза речи'}
+        if audio_format != app.speech_synthesizer.audio_format:
+            # ffmpeg не справился - MP3 кэшируется под своим ключом, OGG попробуем в следующий раз
+            cache_key = app.tts_cache.make_key(text, lang, slow, audio_format)
         
-        # Получаем размер файла
-        file_size = os.path.getsize(temp_path)
-        
-        if file_size == 0:
-            return {'success': False, 'error': 'Файл пустой'}
+        # Сохраняем в кэш; отправляется аудио из памяти, без повторного чтения файла
+        try:
+            app.tts_cache.store(cache_key, audio)
+        except OSError as e:
+            logger.error(f"Не удалось сохранить голосовое сообщение в кэш: {e}")
         
         return {
             'success': True,
-            'file_path': temp_path,
-            'file_size': file_size
+            'cache_key': cache_key,
+            'file_id': None,
+            'file_path': None,
+            'audio': audio,
+            'filename': f"voice.{audio_format}",
+            'file_size': len(audio)
         }
     except Exception as e:
         logger.error(f"Ошибка при создании голосового сообщения: {e}")
         return {'success': False, 'error': str(e)}
 
 
-def translate_text(text: str):
+async def send_voice_message(app: BotApp, message: Message, voice_result: dict, caption: str):
     """
-    Переводит текст с русского на английский
+    Отправляет голосовое сообщение по file_id или файлом и запоминает file_id
+    """
+    cache_key = voice_result['cache_key']
+    
+    if voice_result['file_id']:
+        try:
+            return await message.answer_voice(voice=voice_result['file_id'], caption=caption)
+        except TelegramBadRequest as e:
+            # file_id больше не принимается - забываем его и загружаем файл заново
+            logger.warning(f"Не удалось отправить голосовое сообщение по file_id: {e}")
+            app.tts_cache.forget_file_id(cache_key)
+            if not voice_result['file_path']:
+                raise
+    
+    if voice_result.get('audio'):
+        voice = BufferedInputFile(voice_result['audio'], filename=voice_result['filename'])
+    else:
+        voice = FSInputFile(voice_result['file_path'])
+    sent = await message.answer_voice(voice=voice, caption=caption)
+    if sent.voice:
+        app.tts_cache.set_file_id(cache_key, sent.voice.file_id)
+    return sent
+
+
+async def translate_text(app: BotApp, text: str, target: str = TRANSLATE_DEFAULT_LANGUAGE):
+    """
+    Переводит текст с русского на язык target
     """
     try:
-        # Переводим текст
-        translated = translator.translate(text)
+        # Переводим текст (пакетом вместе с другими одновременными запросами)
+        translated = await app.batch_translator.translate(text, source='ru', target=target)
+        
+        # Запоминаем перевод
+        app.translation_cache.set('ru', target, text, translated)
         return {
             'success': True,
             'original_text': text,
@@ -173,31 +192,36 @@ def translate_text(text: str):
         return {'success': False, 'error': str(e)}
 
 
-async def send_random_photo(message: Message):
+async def send_random_photo(app: BotApp, message: Message):
     """
     Отправляет случайное тестовое фото
     """
     try:
-        # Список доступных тестовых фото
-        test_photos = [
-            'test_photos/photo1.jpg',
-            'test_photos/photo2.jpg', 
-            'test_photos/photo3.jpg'
-        ]
-        
         # Выбираем случайное фото
-        random_photo = random.choice(test_photos)
+        random_photo = app.media_registry.pick_random()
+        
+        if random_photo is None:
+            return False, f"В папке {TEST_PHOTOS_DIR} нет тестовых фото"
         
-        # Проверяем, что файл существует
-        if not os.path.exists(random_photo):
-            return False, f"Файл {random_photo} не найден"
+        caption = f"📸 Случайное тестовое фото: {os.path.basename(random_photo)}"
+        
+        # Фото уже загружалось - отправляем по file_id без повторной загрузки
+        file_id = app.media_registry.get_file_id(random_photo)
+        if file_id:
+            try:
+                await message.answer_photo(photo=file_id, caption=caption)
+                return True, f"Отправлено фото: {os.path.basename(random_photo)}"
+            except TelegramBadRequest as e:
+                logger.warning(f"Не удалось отправить фото по file_id: {e}")
+                app.media_registry.forget_file_id(random_photo)
         
-        # Отправляем фото
-        photo = FSInputFile(random_photo)
-        await message.answer_photo(
-            photo=photo,
-            caption=f"📸 Случайное тестовое фото: {os.path.basename(random_photo)}"
+        # Отправляем фото файлом и запоминаем file_id
+        sent = await message.answer_photo(
+            photo=FSInputFile(random_photo),
+            caption=caption
         )
+        if sent.photo:
+            app.media_registry.set_file_id(random_photo, sent.photo[-1].file_id)
         
         return True, f"Отправлено фото: {os.path.basename(random_photo)}"
         
@@ -206,87 +230,88 @@ async def send_random_photo(message: Message):
         return False, str(e)
 
 
-@dp.message(Command("start"))
+@router.message(Command("start"))
 async def cmd_start(message: Message):
     """
     Обработчик команды /start
     """
-    start_message = f"""
-🌤️ Добро пожаловать в {BOT_NAME}!
-
-Я помогу вам:
-• Узнать погоду в Москве
-• Сохранить ваши фото
-• Отправить голосовые сообщения
-• Перевести текст на английский
-
-Доступные команды:
-/start - Начать работу с ботом
-/help - Показать справку
-/weather - Получить прогноз погоды в Москве
-/voice - Создать голосовое сообщение
-/translate <текст> - Перевести текст на английский
-/photo - Отправить случайное тестовое фото
-
-Также вы можете:
-📸 Отправить фото - я сохраню его
-    """
-    await message.answer(start_message)
+    await message.answer(static('start'))
 
 
-@dp.message(Command("help"))
+@router.message(Command("help"))
 async def cmd_help(message: Message):
     """
     Обработчик команды /help
     """
-    help_message = """
-📋 Справка по командам:
+    await message.answer(static('help'))
 
-/start - Начать работу с ботом
-/help - Показать эту справку
-/weather - Получить текущий прогноз погоды в Москве
-/voice - Создать голосовое сообщение
-/translate <текст> - Перевести текст на английский
-/photo - Отправить случайное тестовое фото
 
-📸 Функции:
-• Отправьте фото - бот сохранит его в папку img/
-• Используйте /voice для создания голосовых сообщений
-• Используйте /translate для перевода текста
-
-Примеры:
-/voice (затем напишите текст)
-/translate Привет, как дела?
-/photo
+@router.message(Command("weather"), flags={'rate_limit': 'weather'})
+async def cmd_weather(message: Message, command: CommandObject, app: BotApp):
+    """
+    Обработчик команды /weather [город]
     """
-    await message.answer(help_message)
+    # Определяем город: по умолчанию - Москва
+    city_id = DEFAULT_CITY_ID
+    if command.args:
+        city_id = app.city_index.resolve(command.args)
+        if city_id is None:
+            await message.answer(render('city_not_found', query=command.args.strip()))
+            return
+    
+    app.weather_refresher.record(city_id)
+    
+    # Получаем прогноз (из кэша или из API); сообщение о загрузке
+    # отправляется, только если данные не готовы сразу
+    progress = make_progress(message, "🌤️ Получаю данные о погоде...")
+    weather_message = await progress.run(app.get_weather_message(city_id))
+    
+    if weather_message:
+        await progress.answer(weather_message)
+    else:
+        await progress.answer(static('weather_error'))
 
 
-@dp.message(Command("weather"))
-async def cmd_weather(message: Message):
+@router.message(Command("subscribe"))
+async def cmd_subscribe(message: Message, command: CommandObject, app: BotApp):
     """
-    Обработчик команды /weather
+    Обработчик команды /subscribe HH:MM [город]
     """
-    # Отправляем сообщение о загрузке
-    loading_msg = await message.answer("🌤️ Получаю данные о погоде...")
+    parts = (command.args or '').split(maxsplit=1)
+    minute = parse_time(parts[0]) if parts else None
+    if minute is None:
+        await message.answer(static('subscribe_usage'))
+        return
     
-    # Получаем данные о погоде
-    weather_data = await get_weather_data()
+    city_id = DEFAULT_CITY_ID
+    if len(parts) > 1:
+        city_id = app.city_index.resolve(parts[1])
+        if city_id is None:
+            await message.answer(render('city_not_found', query=parts[1].strip()))
+            return
     
-    if weather_data:
-        weather_message = format_weather_message(weather_data)
-        await loading_msg.edit_text(weather_message)
+    app.subscription_store.add(message.chat.id, city_id, minute)
+    await message.answer(render('subscribed', time=f"{minute // 60:02d}:{minute % 60:02d}"))
+
+
+@router.message(Command("unsubscribe"))
+async def cmd_unsubscribe(message: Message, app: BotApp):
+    """
+    Обработчик команды /unsubscribe
+    """
+    if app.subscription_store.remove(message.chat.id):
+        await message.answer(static('unsubscribed'))
     else:
-        await loading_msg.edit_text(MESSAGES['weather_error'])
+        await message.answer(static('not_subscribed'))
 
 
-@dp.message(Command("voice"))
-async def cmd_voice(message: Message):
+@router.message(Command("voice"))
+async def cmd_voice(message: Message, app: BotApp):
     """
     Обработчик команды /voice - запрашивает текст для голосового сообщения
     """
     user_id = message.from_user.id
-    user_states[user_id] = 'waiting_for_voice_text'
+    await app.state_store.set(user_id, 'waiting_for_voice_text')
     
     await message.answer(
         "🎤 Напишите текст, который нужно озвучить:\n"
@@ -294,78 +319,200 @@ async def cmd_voice(message: Message):
     )
 
 
-@dp.message(Command("translate"))
-async def cmd_translate(message: Message):
+@router.message(Command("translate"), flags={'rate_limit': 'translate'})
+async def cmd_translate(message: Message, app: BotApp):
     """
     Обработчик команды /translate
     """
-    # Получаем текст после команды
+    # Получаем текст после команды и, если указан, язык перевода
     text = message.text.replace('/translate', '').strip()
+    target = TRANSLATE_DEFAULT_LANGUAGE
+    first_word, _, rest = text.partition(' ')
+    if first_word.lower() in TRANSLATE_LANGUAGES:
+        target = first_word.lower()
+        text = rest.strip()
+    language, label = TRANSLATE_LANGUAGES[target]
     
     if not text:
-        await message.answer("❌ Укажите текст для перевода.\nПример: /translate Привет, как дела?")
+        await message.answer("❌ Укажите текст для перевода.\nПример: /translate Привет, как дела?\nДругой язык: /translate de Привет")
         return
     
-    # Отправляем сообщение о переводе
-    loading_msg = await message.answer("🌍 Перевожу на английский...")
+    # Перевод уже есть в кэше - отвечаем сразу, без сообщения о загрузке
+    cached = app.translation_cache.get('ru', target, text)
+    if cached is not None:
+        await message.answer(
+            render(
+                'translation',
+                language=language,
+                label=label,
+                original_text=text,
+                translated_text=cached
+            )
+        )
+        return
     
-    # Переводим текст
-    translation_result = translate_text(text)
+    # Переводим текст (сообщение о переводе - только если перевод долгий)
+    progress = make_progress(message, f"🌍 Перевожу на {language}...")
+    translation_result = await progress.run(translate_text(app, text, target))
     
     if translation_result['success']:
-        await loading_msg.edit_text(
-            MESSAGES['translation'].format(
+        await progress.answer(
+            render(
+                'translation',
+                language=language,
+                label=label,
                 original_text=translation_result['original_text'],
                 translated_text=translation_result['translated_text']
             )
         )
     else:
-        await loading_msg.edit_text(MESSAGES['translation_error'])
+        await progress.answer(static('translation_error'))
 
 
-@dp.message(Command("photo"))
-async def cmd_photo(message: Message):
+@router.message(Command("photo"), flags={'rate_limit': 'photo'})
+async def cmd_photo(message: Message, app: BotApp):
     """
     Обработчик команды /photo - отправляет случайное тестовое фото
     """
-    # Отправляем сообщение о загрузке
-    loading_msg = await message.answer("📸 Отправляю случайное фото...")
-    
     # Отправляем случайное фото
-    success, result = await send_random_photo(message)
+    progress = make_progress(message, "📸 Отправляю случайное фото...", ChatAction.UPLOAD_PHOTO)
+    success, result = await progress.run(send_random_photo(app, message))
     
     if success:
-        await loading_msg.edit_text(f"✅ {result}")
+        # Подпись фото уже говорит, что отправлено; статус - только вместо сообщения о загрузке
+        await progress.finish(f"✅ {result}")
     else:
-        await loading_msg.edit_text(f"❌ Ошибка: {result}")
+        await progress.answer(f"❌ Ошибка: {result}")
 
 
-@dp.message(lambda message: message.photo is not None)
-async def handle_photo(message: Message):
+def is_admin(message: Message) -> bool:
+    """
+    Фильтр команд для администраторов (ADMIN_IDS); остальным команда не видна
+    """
+    return message.from_user is not None and message.from_user.id in ADMIN_IDS
+
+
+@router.message(Command("diag"), is_admin)
+async def cmd_diag(message: Message, app: BotApp):
+    """
+    Обработчик команды /diag - лаг event loop и последняя блокировка
+    """
+    stats = app.loop_monitor.stats()
+    lines = [
+        "🩺 Event loop",
+        f"Лаг: p50 {stats['lag_p50'] * 1000:.1f} мс, p99 {stats['lag_p99'] * 1000:.1f} мс, max {stats['lag_max'] * 1000:.1f} мс",
+        f"Блокировок дольше {app.loop_monitor.threshold} с: {stats['stalls']}",
+    ]
+    if app.loop_monitor.stalls:
+        stall = app.loop_monitor.stalls[-1]
+        at = datetime.fromtimestamp(stall['at']).strftime("%H:%M:%S %d.%m.%Y")
+        lines.append(f"\nПоследняя: {at}, {stall['duration']:.3f} с")
+        if stall['stack']:
+            # Ближайшие к месту блокировки кадры стека
+            lines.append(''.join(stall['stack'].splitlines(keepends=True)[-12:]))
+    await message.answer('\n'.join(lines)[:4000])
+
+
+@router.message(Command("profile"), is_admin)
+async def cmd_profile(message: Message, command: CommandObject, app: BotApp):
+    """
+    Обработчик команды /profile [секунд] - семплирующий профиль всех потоков
+    """
+    try:
+        seconds = float(command.args) if command.args else None
+    except ValueError:
+        seconds = 0
+    if seconds is not None and not 0 < seconds < float('inf'):
+        await message.answer("❌ Использование: /profile [секунд], число секунд больше нуля")
+        return
+    if app.loop_monitor.profiling:
+        await message.answer("⏳ Профилирование уже выполняется")
+        return
+
+    await message.answer(f"⏱ Профилирую {seconds or app.loop_monitor.profile_seconds:g} с...")
+    result = await app.loop_monitor.profile(seconds)
+    if result is None:
+        await message.answer("⏳ Профилирование уже выполняется")
+        return
+    path, samples = result
+    if path is None:
+        await message.answer("❌ Профиль пуст: не удалось снять ни одного семпла")
+        return
+    top = top_functions(samples, thread='MainThread')
+    summary = '\n'.join(f"{count:>6} {name}" for name, count in top)
+    await message.answer_document(
+        FSInputFile(path),
+        caption=f"Семплов: {sum(samples.values())}. Формат collapsed stacks (flamegraph.pl, speedscope)",
+    )
+    await message.answer(f"🔥 Чаще всего в потоке event loop:\n{summary}"[:4000])
+
+
+@router.message(lambda message: message.photo is not None, flags={'rate_limit': 'photo_upload'})
+async def handle_photo(message: Message, app: BotApp):
     """
     Обработчик фото
     """
-    # Отправляем сообщение о сохранении
-    loading_msg = await message.answer("📸 Сохраняю фото...")
-    
-    # Сохраняем фото
-    save_result = await save_photo(message)
+    # Сохраняем фото (сообщение о сохранении - только если это долго)
+    progress = make_progress(message, "📸 Сохраняю фото...")
+    save_result = await progress.run(save_photo(app, message))
     
     if save_result['success']:
         current_time = datetime.now().strftime("%H:%M %d.%m.%Y")
-        await loading_msg.edit_text(
-            MESSAGES['photo_saved'].format(
-                filename=save_result['filename'],
-                file_size=save_result['file_size'],
-                time=current_time
-            ),
+        text = render(
+            'photo_saved',
+            filename=save_result['filename'],
+            file_size=save_result['file_size'],
+            time=current_time
+        )
+        if save_result['duplicate']:
+            text += static('photo_duplicate')
+        await progress.answer(text)
+    else:
+        await progress.answer(static('photo_error'))
+
+
+async def handle_voice_text(app: BotApp, message: Message, text: str):
+    """
+    Создает и отправляет голосовое сообщение из текста пользователя
+    """
+    async def synthesize_and_send():
+        # Создаем голосовое сообщение
+        voice_result = await create_voice_message(app, text)
+        if not voice_result['success']:
+            return False
+        
+        # Отправляем голосовое сообщение
+        await send_voice_message(
+            app,
+            message,
+            voice_result,
+            caption=f"🎤 Голосовое сообщение: {text}"
+        )
+        return True
+    
+    progress = make_progress(message, "🎤 Создаю голосовое сообщение...", ChatAction.UPLOAD_VOICE)
+    try:
+        sent = await progress.run(synthesize_and_send())
+    except Exception as e:
+        logger.error(f"Ошибка при отправке голосового сообщения: {e}")
+        sent = False
+    
+    if sent:
+        # Подтверждение - вместо сообщения о загрузке, если оно было
+        current_time = datetime.now().strftime("%H:%M %d.%m.%Y")
+        await progress.finish(
+            render(
+                'voice_sent',
+                text=text,
+                duration=len(text) // 10 + 1  # Примерная длительность
+            ) + f"\n🕐 Время: {current_time}"
         )
     else:
-        await loading_msg.edit_text(MESSAGES['photo_error'])
+        await progress.answer(static('voice_error'))
 
 
-@dp.message()
-async def handle_other_messages(message: Message):
+@router.message()
+async def handle_other_messages(message: Message, app: BotApp):
     """
     Обработчик всех остальных сообщений
     """
@@ -380,46 +527,18 @@ async def handle_other_messages(message: Message):
         return
     
     # Проверяем состояние пользователя
-    if user_id in user_states and user_states[user_id] == 'waiting_for_voice_text':
+    if await app.state_store.get(user_id) == 'waiting_for_voice_text':
         # Пользователь ждет создания голосового сообщения
-        user_states[user_id] = None  # Сбрасываем состояние
-        
-        # Отправляем сообщение о создании
-        loading_msg = await message.answer("🎤 Создаю голосовое сообщение...")
-        
-        # Создаем голосовое сообщение
-        voice_result = await create_voice_message(text)
+        allowed, retry_after = await app.rate_limiter.acquire(user_id, 'voice')
+        if not allowed:
+            # Состояние не сбрасываем, чтобы можно было повторить позже
+            await message.answer(render('rate_limited', seconds=int(retry_after) + 1))
+            return
         
-        if voice_result['success']:
-            try:
-                # Отправляем голосовое сообщение
-                voice_file = FSInputFile(voice_result['file_path'])
-                await message.answer_voice(
-                    voice=voice_file,
-                    caption=f"🎤 Голосовое сообщение: {text}"
-                )
-                
-                # Отправляем подтверждение
-                current_time = datetime.now().strftime("%H:%M %d.%m.%Y")
-                await loading_msg.edit_text(
-                    MESSAGES['voice_sent'].format(
-                        text=text,
-                        duration=len(text) // 10 + 1  # Примерная длительность
-                    ) + f"\n🕐 Время: {current_time}"
-                )
-                
-            except Exception as e:
-                logger.error(f"Ошибка при отправке голосового сообщения: {e}")
-                await loading_msg.edit_text(MESSAGES['voice_error'])
-            finally:
-                # Удаляем временный файл
-                try:
-                    os.unlink(voice_result['file_path'])
-                except:
-                    pass
-        else:
-            await loading_msg.edit_text(MESSAGES['voice_error'])
+        await app.state_store.delete(user_id)  # Сбрасываем состояние
         
+        with track_handler('voice'):
+            await handle_voice_text(app, message, text)
         return
     
     # Для обычного текста просто отвечаем подсказкой
@@ -430,9 +549,19 @@ async def handle_other_messages(message: Message):
     )
 
 
-async def main():
+def create_app(profiler: StartupProfiler = None, token: str = BOT_TOKEN) -> BotApp:
     """
-    Основная функция для запуска бота
+    Создает приложение: компоненты создаются при первом обращении к ним
+    """
+    app = BotApp(profiler, token)
+    app.dp.include_router(router)
+    metrics_registry.add_collector(app.collect_metrics)
+    return app
+
+
+async def run(app: BotApp):
+    """
+    Запускает бота и работает до остановки
     """
     logger.info("Запуск бота...")
     
@@ -441,19 +570,113 @@ async def main():
         logger.error("Не установлен BOT_TOKEN! Создайте .env файл с токеном бота.")
         return
     
+    metrics_runner = None
     try:
+        # Мониторинг лага и блокировок event loop (профиль по SIGUSR1 или /profile)
+        if LOOP_MONITOR_INTERVAL > 0:
+            app.loop_monitor.start()
+        
+        # Поднимаем общий пул HTTP-соединений и фоновые задачи
+        await app.start()
+        
+        # Запускаем эндпоинт /metrics
+        if METRICS_PORT:
+            metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+        
         # Запускаем бота
-        await dp.start_polling(bot)
+        if RUN_MODE == 'webhook':
+            await run_webhook(
+                app.dp,
+                app.bot,
+                host=WEBHOOK_HOST,
+                port=WEBHOOK_PORT,
+                path=WEBHOOK_PATH,
+                secret_token=WEBHOOK_SECRET,
+                base_url=WEBHOOK_BASE_URL,
+                runner=app.update_runner,
+                journal=app.update_journal,
+            )
+        elif app.update_runner is not None:
+            await run_polling(app.dp, app.bot, app.update_runner)
+        else:
+            await app.dp.start_polling(app.bot)
     except Exception as e:
         logger.error(f"Ошибка при запуске бота: {e}")
     finally:
-        await bot.session.close()
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await app.close()
 
 
-if __name__ == "__main__":
+def profile_startup():
+    """
+    Печатает время импорта модулей (в отдельном процессе) и создания
+    каждого компонента приложения
+    """
+    # Импорт main.py в отдельном процессе - из папки бота, откуда бы ни запускали профилирование
+    env = os.environ.copy()
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [os.path.dirname(os.path.abspath(__file__)), env.get('PYTHONPATH')]))
+    process_time, imports = measure_imports('main', env)
+    print(format_report("Импорт модулей main.py (python -X importtime):", imports))
+    print(f"Запуск процесса с импортом main: {process_time * 1000:.1f} мс\n")
+    
+    # Без настоящего токена Bot не создается; запросы к Telegram при профилировании не выполняются
+    token = BOT_TOKEN
+    if token == 'YOUR_BOT_TOKEN_HERE':
+        print("BOT_TOKEN не установлен, для профилирования используется тестовый токен\n")
+        token = PROFILE_TOKEN
+    # Базы, кэши и папки с относительными путями создаются во временном
+    # каталоге, а не в папке запуска; входные данные копируются туда же
+    workdir = tempfile.mkdtemp(prefix='startup-profile-')
+    for path in (CITIES_FILE, TEST_PHOTOS_DIR):
+        if os.path.isabs(path) or not os.path.exists(path):
+            continue
+        target = os.path.join(workdir, path)
+        if os.path.isdir(path):
+            shutil.copytree(path, target)
+        else:
+            os.makedirs(os.path.dirname(target) or workdir, exist_ok=True)
+            shutil.copy2(path, target)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        profiler = StartupProfiler()
+        started = time.perf_counter()
+        app = create_app(profiler, token)
+        app.warm_up()
+        elapsed = time.perf_counter() - started
+        print(format_report("Создание компонентов:", profiler.components, elapsed))
+        asyncio.run(app.close())
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    
+    # Бэкенды, которые импортируются только при первом использовании
+    lazy_imports = []
+    for module in ('gtts', 'deep_translator', 'PIL.Image'):
+        started = time.perf_counter()
+        importlib.import_module(module)
+        lazy_imports.append((module, time.perf_counter() - started))
+    print("\n" + format_report("Отложенные импорты (при первом синтезе, переводе, обработке фото):", lazy_imports))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Telegram-бот с прогнозом погоды')
+    parser.add_argument('--profile-startup', action='store_true',
+                        help='показать время импорта и создания компонентов и выйти')
+    args = parser.parse_args()
+    
+    if args.profile_startup:
+        profile_startup()
+        return
+    
     try:
-        asyncio.run(main())
+        asyncio.run(run(create_app()))
     except KeyboardInterrupt:
         logger.info("Бот остановлен пользователем")
     except Exception as e:
         logger.error(f"Критическая ошибка: {e}")
+
+
+if __name__ == "__main__":
+    main()
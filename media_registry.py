@@ -0,0 +1,109 @@
+"""
+Реестр тестовых медиафайлов с кэшем Telegram file_id
+"""
+
+import json
+import logging
+import os
+import random
+
+logger = logging.getLogger(__name__)
+
+
+class MediaRegistry:
+    """
+    Список файлов из папки и их file_id после первой отправки.
+
+    Папка сканируется при создании реестра и повторно только если
+    изменилось ее mtime. file_id сохраняется в JSON и привязан к размеру
+    и mtime файла, так что измененный файл будет загружен заново.
+    """
+
+    def __init__(self, directory: str, cache_path: str, extensions=('.jpg', '.jpeg', '.png')):
+        self.directory = directory
+        self.cache_path = cache_path
+        self.extensions = tuple(extensions)
+        self._files = []      # пути к файлам
+        self._signatures = {}  # путь -> [size, mtime_ns]
+        self._dir_mtime = None
+        self._file_ids = {}   # путь -> {'file_id': str, 'signature': [size, mtime_ns]}
+
+        self._load_cache()
+        self.scan()
+
+    def scan(self):
+        """
+        Перечитывает список файлов в папке
+        """
+        try:
+            self._dir_mtime = os.stat(self.directory).st_mtime_ns
+            entries = sorted(os.scandir(self.directory), key=lambda entry: entry.name)
+        except FileNotFoundError:
+            self._dir_mtime = None
+            self._files = []
+            self._signatures = {}
+            return
+
+        files = []
+        signatures = {}
+        for entry in entries:
+            if entry.is_file() and entry.name.lower().endswith(self.extensions):
+                stat = entry.stat()
+                files.append(entry.path)
+                signatures[entry.path] = [stat.st_size, stat.st_mtime_ns]
+        self._files = files
+        self._signatures = signatures
+        logger.info(f"Найдено тестовых фото: {len(files)} в {self.directory}")
+
+    def files(self) -> list:
+        """
+        Возвращает актуальный список файлов, пересканируя папку при изменении
+        """
+        try:
+            dir_mtime = os.stat(self.directory).st_mtime_ns
+        except FileNotFoundError:
+            dir_mtime = None
+        if dir_mtime != self._dir_mtime:
+            self.scan()
+        return self._files
+
+    def pick_random(self):
+        files = self.files()
+        return random.choice(files) if files else None
+
+    def get_file_id(self, path: str):
+        cached = self._file_ids.get(path)
+        if cached is None or cached['signature'] != self._signatures.get(path):
+            return None
+        return cached['file_id']
+
+    def set_file_id(self, path: str, file_id: str):
+        self._file_ids[path] = {'file_id': file_id, 'signature': self._signatures.get(path)}
+        self._save_cache()
+
+    def forget_file_id(self, path: str):
+        if self._file_ids.pop(path, None) is not None:
+            self._save_cache()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                self._file_ids = json.load(f)
+        except FileNotFoundError:
+            self._file_ids = {}
+        except Exception as e:
+            logger.error(f"Не удалось прочитать кэш file_id тестовых фото: {e}")
+            self._file_ids = {}
+
+    def _save_cache(self):
+        cache_dir = os.path.dirname(self.cache_path)
+        # Временный файл у каждого процесса свой
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._file_ids, f)
+            os.replace(tmp_path, self.cache_path)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить кэш file_id тестовых фото: {e}")
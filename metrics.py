@@ -0,0 +1,241 @@
+"""
+Метрики бота в формате Prometheus: время работы хендлеров и бэкендов,
+число выполняющихся запросов, попадания в кэши
+"""
+
+import bisect
+import logging
+import time
+
+from aiohttp import web
+from aiogram import BaseMiddleware
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: dict) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _format_value(value) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name: str, documentation: str, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def _header(self) -> list:
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.type}']
+
+    def render(self) -> list:
+        lines = self._header()
+        for labelvalues, value in self._values.items():
+            labels = dict(zip(self.labelnames, labelvalues))
+            lines.append(f'{self.name}{_format_labels(labels)} {_format_value(value)}')
+        return lines
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, *labelvalues, amount: float = 1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+
+class Gauge(_Metric):
+    type = 'gauge'
+
+    def inc(self, *labelvalues, amount: float = 1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def dec(self, *labelvalues, amount: float = 1):
+        self._values[labelvalues] = self._values.get(labelvalues, 0) - amount
+
+    def set(self, value: float, *labelvalues):
+        self._values[labelvalues] = value
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, *labelvalues):
+        state = self._values.get(labelvalues)
+        if state is None:
+            # [счетчики по бакетам (+ бакет +Inf), сумма, количество]
+            state = self._values[labelvalues] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def render(self) -> list:
+        lines = self._header()
+        for labelvalues, (counts, total, count) in self._values.items():
+            labels = dict(zip(self.labelnames, labelvalues))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                bucket_labels = _format_labels({**labels, 'le': _format_value(float(bound))})
+                lines.append(f'{self.name}_bucket{bucket_labels} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(total)}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {count}')
+        return lines
+
+
+class Registry:
+    """
+    Набор метрик и коллекторов. Коллектор - функция, возвращающая список
+    (имя, тип, описание, [(метки, значение), ...]); так публикуются
+    счетчики, которые уже ведут кэши и пулы
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name: str, documentation: str, labelnames=()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames=()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        if collector not in self._collectors:
+            self._collectors.append(collector)
+
+    def remove_collector(self, collector):
+        if collector in self._collectors:
+            self._collectors.remove(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collector in self._collectors:
+            try:
+                families = collector()
+            except Exception as e:
+                logger.error(f"Ошибка коллектора метрик: {e}")
+                continue
+            for name, metric_type, documentation, samples in families:
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {metric_type}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+
+registry = Registry()
+
+HANDLER_SECONDS = registry.histogram(
+    'bot_handler_duration_seconds', 'Время обработки сообщения хендлером', ['handler'])
+HANDLER_IN_FLIGHT = registry.gauge(
+    'bot_handler_in_flight', 'Число сообщений, обрабатываемых сейчас', ['handler'])
+HANDLER_ERRORS = registry.counter(
+    'bot_handler_errors_total', 'Необработанные исключения в хендлерах', ['handler'])
+BACKEND_SECONDS = registry.histogram(
+    'bot_backend_duration_seconds', 'Время вызова внешнего бэкенда', ['backend'])
+BACKEND_IN_FLIGHT = registry.gauge(
+    'bot_backend_in_flight', 'Число выполняющихся вызовов бэкенда', ['backend'])
+BACKEND_ERRORS = registry.counter(
+    'bot_backend_errors_total', 'Вызовы бэкенда, завершившиеся исключением', ['backend'])
+LOOP_LAG_SECONDS = registry.histogram(
+    'bot_event_loop_lag_seconds', 'Задержка event loop относительно запланированного времени',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+
+
+class _Tracker:
+    """
+    Контекстный менеджер: время в гистограмму, счетчик in-flight и ошибок
+    """
+
+    __slots__ = ('name', 'histogram', 'in_flight', 'errors', 'started_at')
+
+    def __init__(self, name: str, histogram: Histogram, in_flight: Gauge, errors: Counter):
+        self.name = name
+        self.histogram = histogram
+        self.in_flight = in_flight
+        self.errors = errors
+
+    def __enter__(self):
+        self.in_flight.inc(self.name)
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.started_at, self.name)
+        self.in_flight.dec(self.name)
+        if exc_type is not None:
+            self.errors.inc(self.name)
+        return False
+
+
+def track_handler(name: str) -> _Tracker:
+    """
+    with track_handler('voice'): ... - замер участка обработки сообщения
+    """
+    return _Tracker(name, HANDLER_SECONDS, HANDLER_IN_FLIGHT, HANDLER_ERRORS)
+
+
+def track_backend(name: str) -> _Tracker:
+    """
+    with track_backend('weather_api'): ... - замер вызова внешнего бэкенда
+    """
+    return _Tracker(name, BACKEND_SECONDS, BACKEND_IN_FLIGHT, BACKEND_ERRORS)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """
+    Замеряет время каждого хендлера; имя метки - имя функции хендлера
+    """
+
+    async def __call__(self, handler, event, data: dict):
+        handler_object = data.get('handler')
+        name = getattr(getattr(handler_object, 'callback', None), '__name__', 'unknown')
+        with track_handler(name):
+            return await handler(event, data)
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """
+    Запускает HTTP-сервер с эндпоинтом /metrics
+    """
+    async def handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(
+            text=registry.render(),
+            headers={'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'},
+        )
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle_metrics)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logger.info(f"Метрики доступны на http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,253 @@
+"""
+Постобработка сохраненных фото в пуле процессов: удаление EXIF,
+пережатие и миниатюры
+"""
+
+import asyncio
+import functools
+import hashlib
+import io
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('decode', 'orient', 'resize', 'encode', 'thumbnail')
+
+
+def process_photo(
+    path: str,
+    thumb_path: str,
+    max_side: int = 2560,
+    quality: int = 82,
+    max_bytes: int = 0,
+    min_quality: int = 50,
+    thumb_size: int = 320,
+) -> dict:
+    """
+    Обрабатывает один файл (выполняется в отдельном процессе).
+
+    Поворачивает изображение по EXIF Orientation, уменьшает до max_side по
+    большей стороне и пережимает в JPEG с качеством quality без EXIF.
+    Если задан max_bytes, качество снижается шагами по 10 (не ниже
+    min_quality), пока файл не уложится в лимит. Результат нужен, если он
+    меньше оригинала или в оригинале были метаданные EXIF: тогда он
+    записывается во временный файл output_path рядом с оригиналом, а его
+    sha256 возвращается в результате. Оригинал не изменяется - имя файла
+    в хранилище это хэш содержимого, и новый файл переносит под новым
+    именем PhotoStore.store_processed(). Миниатюра со стороной не больше
+    thumb_size сохраняется в thumb_path.
+    """
+    # Pillow нужен только процессам пула
+    from PIL import Image, ImageOps
+
+    timings = {}
+    original_size = os.path.getsize(path)
+
+    started = time.perf_counter()
+    with Image.open(path) as source:
+        source.load()
+        has_exif = bool(source.getexif())
+        icc_profile = source.info.get('icc_profile')
+        image = source.copy()
+    timings['decode'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    timings['orient'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    if max_side and max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+    timings['resize'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    current_quality = quality
+    while True:
+        buffer = io.BytesIO()
+        # exif не передается - метаданные в новый файл не попадают
+        image.save(buffer, 'JPEG', quality=current_quality, optimize=True, progressive=True, icc_profile=icc_profile)
+        if not max_bytes or buffer.tell() <= max_bytes or current_quality <= min_quality:
+            break
+        current_quality = max(min_quality, current_quality - 10)
+
+    replaced = buffer.tell() < original_size or has_exif
+    output_path = None
+    digest = None
+    if replaced:
+        output_path = f"{path}.{os.getpid()}.processed.tmp"
+        with open(output_path, 'wb') as f:
+            f.write(buffer.getbuffer())
+        digest = hashlib.sha256(buffer.getbuffer()).hexdigest()
+    size = buffer.tell() if replaced else original_size
+    timings['encode'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    image.thumbnail((thumb_size, thumb_size), Image.LANCZOS)
+    os.makedirs(os.path.dirname(thumb_path) or '.', exist_ok=True)
+    temp_path = f"{thumb_path}.{os.getpid()}.tmp"
+    image.save(temp_path, 'JPEG', quality=75, optimize=True)
+    os.replace(temp_path, thumb_path)
+    timings['thumbnail'] = time.perf_counter() - started
+
+    return {
+        'original_size': original_size,
+        'size': size,
+        'thumb_size': os.path.getsize(thumb_path),
+        'quality': current_quality,
+        'replaced': replaced,
+        'output_path': output_path,
+        'sha256': digest,
+        'timings': timings,
+    }
+
+
+def _create_pool(max_workers: int):
+    """
+    Пул процессов через forkserver (где его нет - spawn). fork не
+    используется: к первому фото в боте уже работают потоки (пул
+    блокирующих вызовов, fsync журнала, сторож event loop), и дочерний
+    процесс, созданный fork, может зависнуть на захваченной в момент fork
+    блокировке. Импорт main.py в дочернем процессе побочных эффектов не
+    имеет - компоненты создаются только в create_app(). Если процессы
+    создать нельзя, используется пул потоков - Pillow отпускает GIL при
+    кодировании и декодировании.
+    """
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    try:
+        return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context(method))
+    except (OSError, NotImplementedError, ImportError) as e:
+        logger.warning(f"Пул процессов для фото недоступен ({e}), используется пул потоков")
+        return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='photo')
+
+
+class PhotoProcessor:
+    """
+    Очередь постобработки фото.
+
+    submit() только ставит файл в очередь и сразу возвращает управление,
+    поэтому сохранение фото не ждет обработки. Очередь ограничена
+    queue_size: при переполнении фото остается необработанным (оригинал
+    уже сохранен). Одновременно обрабатывается не больше max_workers фото,
+    каждое - в отдельном процессе. После обработки вызывается
+    on_processed(key, result).
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 2,
+        queue_size: int = 100,
+        on_processed=None,
+        **options,
+    ):
+        self.max_workers = max_workers
+        self.on_processed = on_processed
+        self.options = options
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._pool = None
+        self._tasks = []
+        self.active = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.thumb_bytes = 0
+        self.stage_seconds = dict.fromkeys(STAGES, 0.0)
+
+    def start(self):
+        if not self._tasks:
+            self._pool = _create_pool(self.max_workers)
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.max_workers)]
+
+    def submit(self, key, path: str, thumb_path: str) -> bool:
+        """
+        Ставит фото в очередь обработки. Возвращает False, если очередь
+        переполнена или обработка не запущена
+        """
+        if not self._tasks:
+            return False
+        try:
+            self._queue.put_nowait((key, path, thumb_path))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning(f"Очередь обработки фото переполнена, {os.path.basename(path)} пропущено")
+            return False
+        return True
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            key, path, thumb_path = await self._queue.get()
+            self.active += 1
+            pool = self._pool
+            try:
+                result = await loop.run_in_executor(
+                    pool, functools.partial(process_photo, path, thumb_path, **self.options)
+                )
+            except BrokenProcessPool as e:
+                self.failed += 1
+                if self._pool is pool:
+                    logger.error(f"Пул обработки фото остановлен аварийно ({e}), создаю новый")
+                    pool.shutdown(wait=False, cancel_futures=True)
+                    self._pool = _create_pool(self.max_workers)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ошибка обработки фото {path}: {e}")
+            else:
+                self._record(result)
+                if self.on_processed is not None:
+                    try:
+                        self.on_processed(key, result)
+                    except Exception as e:
+                        logger.error(f"Ошибка сохранения результата обработки фото {path}: {e}")
+            finally:
+                self.active -= 1
+                self._queue.task_done()
+
+    def _record(self, result: dict):
+        self.processed += 1
+        self.bytes_in += result['original_size']
+        self.bytes_out += result['size']
+        self.thumb_bytes += result['thumb_size']
+        for stage, seconds in result['timings'].items():
+            self.stage_seconds[stage] += seconds
+
+    async def stop(self, timeout: float = 30):
+        """
+        Дожидается обработки очереди (не дольше timeout) и останавливает пул
+        """
+        if not self._tasks:
+            return
+        if self._queue.qsize() or self.active:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Не обработано фото при остановке: {self._queue.qsize() + self.active}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self._pool = None
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.max_workers,
+            'queued': self._queue.qsize(),
+            'active': self.active,
+            'processed': self.processed,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'bytes_in': self.bytes_in,
+            'bytes_out': self.bytes_out,
+            'bytes_saved': self.bytes_in - self.bytes_out,
+            'thumb_bytes': self.thumb_bytes,
+            'stage_seconds': dict(self.stage_seconds),
+        }
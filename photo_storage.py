@@ -0,0 +1,174 @@
+"""
+Хранилище фото с адресацией по содержимому и дедупликацией
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+
+from aiogram import Bot
+
+from metrics import track_backend
+
+logger = logging.getLogger(__name__)
+
+
+class HashingWriter:
+    """
+    Файловый объект для bot.download_file: пишет чанки на диск
+    и одновременно считает sha256, не перечитывая файл
+    """
+
+    def __init__(self, file):
+        self._file = file
+        self.hasher = hashlib.sha256()
+        self.size = 0
+
+    def write(self, chunk: bytes):
+        self.hasher.update(chunk)
+        self.size += len(chunk)
+        return self._file.write(chunk)
+
+    def flush(self):
+        self._file.flush()
+
+    def seek(self, offset: int, whence: int = 0):
+        return self._file.seek(offset, whence)
+
+
+class PhotoStore:
+    """
+    Сохраняет фото в root/ab/cd/<sha256><suffix>.
+
+    Индекс в SQLite связывает Telegram file_unique_id с хэшем содержимого:
+    уже известное фото не скачивается повторно, а одинаковое содержимое
+    под разными file_unique_id хранится на диске один раз.
+    """
+
+    def __init__(self, root: str, index_path: str, shard_depth: int = 2):
+        self.root = root
+        self.shard_depth = shard_depth
+        self._tmp_dir = os.path.join(root, 'tmp')
+        os.makedirs(self._tmp_dir, exist_ok=True)
+
+        index_dir = os.path.dirname(index_path)
+        if index_dir:
+            os.makedirs(index_dir, exist_ok=True)
+        self._db = sqlite3.connect(index_path, timeout=5, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(
+            'CREATE TABLE IF NOT EXISTS photos ('
+            'sha256 TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL, created_at REAL NOT NULL);'
+            'CREATE TABLE IF NOT EXISTS photo_files ('
+            'file_unique_id TEXT PRIMARY KEY, file_id TEXT NOT NULL, sha256 TEXT NOT NULL, created_at REAL NOT NULL);'
+        )
+        self._db.commit()
+
+    def path_for(self, digest: str, suffix: str) -> str:
+        shards = [digest[i * 2:i * 2 + 2] for i in range(self.shard_depth)]
+        return os.path.join(self.root, *shards, digest + suffix)
+
+    def thumb_path_for(self, digest: str) -> str:
+        return self.path_for(digest, '.thumb.jpg')
+
+    def store_processed(self, digest: str, result: dict):
+        """
+        Сохраняет результат постобработки фото digest (см. process_photo).
+        Новое содержимое переносится в файл с именем по его хэшу, запись
+        индекса (ключ - хэш скачанного файла, по нему ищутся дубликаты)
+        указывает на новый файл, а оригинал удаляется
+        """
+        output_path = result.get('output_path')
+        if not output_path:
+            return
+        try:
+            row = self._db.execute('SELECT path FROM photos WHERE sha256 = ?', (digest,)).fetchone()
+            if row is None:
+                return
+            old_path = row[0]
+            new_path = self.path_for(result['sha256'], os.path.splitext(old_path)[1])
+            os.makedirs(os.path.dirname(new_path), exist_ok=True)
+            os.replace(output_path, new_path)
+            self._db.execute(
+                'UPDATE photos SET path = ?, size = ? WHERE sha256 = ?', (new_path, result['size'], digest)
+            )
+            self._db.commit()
+            if old_path != new_path and os.path.exists(old_path):
+                os.unlink(old_path)
+        finally:
+            if os.path.exists(output_path):
+                os.unlink(output_path)
+
+    def find_by_unique_id(self, file_unique_id: str):
+        """
+        Возвращает запись о сохраненном фото по file_unique_id или None
+        """
+        row = self._db.execute(
+            'SELECT p.sha256, p.path, p.size FROM photo_files f '
+            'JOIN photos p ON p.sha256 = f.sha256 WHERE f.file_unique_id = ?',
+            (file_unique_id,)
+        ).fetchone()
+        if row is None or not os.path.exists(row[1]):
+            return None
+        return {'sha256': row[0], 'save_path': row[1], 'file_size': row[2]}
+
+    async def ingest(self, bot: Bot, file_id: str, file_unique_id: str, suffix: str = '.jpg') -> dict:
+        """
+        Скачивает фото потоково с подсчетом хэша и сохраняет без дубликатов
+        """
+        known = self.find_by_unique_id(file_unique_id)
+        if known is not None:
+            return self._result(known, duplicate=True)
+
+        file = await bot.get_file(file_id)
+
+        fd, temp_path = tempfile.mkstemp(dir=self._tmp_dir, suffix='.part')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                writer = HashingWriter(f)
+                with track_backend('telegram_download'):
+                    await bot.download_file(file.file_path, writer, seek=False)
+            digest = writer.hasher.hexdigest()
+
+            row = self._db.execute(
+                'SELECT path, size FROM photos WHERE sha256 = ?', (digest,)
+            ).fetchone()
+            if row is not None and os.path.exists(row[0]):
+                stored = {'sha256': digest, 'save_path': row[0], 'file_size': row[1]}
+                duplicate = True
+            else:
+                save_path = self.path_for(digest, suffix)
+                os.makedirs(os.path.dirname(save_path), exist_ok=True)
+                os.replace(temp_path, save_path)
+                self._db.execute(
+                    'INSERT OR REPLACE INTO photos VALUES (?, ?, ?, ?)',
+                    (digest, save_path, writer.size, time.time())
+                )
+                stored = {'sha256': digest, 'save_path': save_path, 'file_size': writer.size}
+                duplicate = False
+        finally:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+        self._db.execute(
+            'INSERT OR REPLACE INTO photo_files VALUES (?, ?, ?, ?)',
+            (file_unique_id, file_id, digest, time.time())
+        )
+        self._db.commit()
+        return self._result(stored, duplicate=duplicate)
+
+    def close(self):
+        self._db.close()
+
+    @staticmethod
+    def _result(stored: dict, duplicate: bool) -> dict:
+        return {
+            'filename': os.path.basename(stored['save_path']),
+            'save_path': stored['save_path'],
+            'file_size': stored['file_size'],
+            'sha256': stored['sha256'],
+            'duplicate': duplicate,
+        }
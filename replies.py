@@ -0,0 +1,85 @@
+"""
+Ответы с индикацией прогресса только для долгих операций
+"""
+
+import asyncio
+import logging
+
+from aiogram.enums import ChatAction
+from aiogram.types import Message
+from aiogram.utils.chat_action import ChatActionSender
+
+logger = logging.getLogger(__name__)
+
+
+class Progress:
+    """
+    Выполняет операцию и показывает прогресс, только если она долгая.
+
+    - готово за action_after секунд - никакой индикации, сразу ответ;
+    - дольше - чат-действие ("печатает...", "записывает голосовое...");
+    - дольше loading_after секунд - сообщение о загрузке, которое
+      потом редактируется в итоговый ответ.
+
+    Быстрый ответ (например, из кэша) стоит одного запроса к Telegram API
+    вместо двух (сообщение о загрузке + edit_text).
+    """
+
+    def __init__(
+        self,
+        message: Message,
+        loading_text: str,
+        action: str = ChatAction.TYPING,
+        action_after: float = 0.3,
+        loading_after: float = 2.0,
+    ):
+        self.message = message
+        self.loading_text = loading_text
+        self.action = action
+        self.action_after = action_after
+        self.loading_after = loading_after
+        self.loading_msg = None
+
+    async def run(self, awaitable):
+        """
+        Ожидает awaitable, показывая прогресс по мере необходимости
+        """
+        task = asyncio.ensure_future(awaitable)
+        try:
+            done, _ = await asyncio.wait({task}, timeout=self.action_after)
+            if done:
+                return task.result()
+
+            async with ChatActionSender(
+                bot=self.message.bot,
+                chat_id=self.message.chat.id,
+                action=self.action,
+            ):
+                done, _ = await asyncio.wait({task}, timeout=max(0, self.loading_after - self.action_after))
+                if not done:
+                    try:
+                        self.loading_msg = await self.message.answer(self.loading_text)
+                    except Exception as e:
+                        logger.error(f"Не удалось отправить сообщение о загрузке: {e}")
+                return await task
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+
+    async def answer(self, text: str):
+        """
+        Отправляет итоговый ответ: редактирует сообщение о загрузке,
+        если оно было, иначе отправляет новое сообщение
+        """
+        if self.loading_msg is not None:
+            return await self.loading_msg.edit_text(text)
+        return await self.message.answer(text)
+
+    async def finish(self, text: str):
+        """
+        Итоговый статус после уже отправленного результата (фото, голосового):
+        показывается только вместо сообщения о загрузке, если оно было
+        """
+        if self.loading_msg is not None:
+            return await self.loading_msg.edit_text(text)
+        return None
@@ -0,0 +1,187 @@
+"""
+Ежедневные прогнозы по подписке (/subscribe HH:MM) и их пакетная рассылка
+"""
+
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramForbiddenError, TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+
+class SubscriptionStore:
+    """
+    Подписки в SQLite: одна подписка на чат (город и минута суток)
+    """
+
+    def __init__(self, db_path: str):
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._db = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.executescript(
+            'CREATE TABLE IF NOT EXISTS subscriptions ('
+            'chat_id INTEGER PRIMARY KEY, city_id INTEGER NOT NULL, '
+            'minute INTEGER NOT NULL, created_at REAL NOT NULL);'
+            'CREATE INDEX IF NOT EXISTS subscriptions_minute ON subscriptions (minute);'
+        )
+        self._db.commit()
+
+    def add(self, chat_id: int, city_id: int, minute: int):
+        self._db.execute(
+            'INSERT OR REPLACE INTO subscriptions VALUES (?, ?, ?, ?)',
+            (chat_id, city_id, minute, time.time())
+        )
+        self._db.commit()
+
+    def remove(self, chat_id: int) -> bool:
+        cursor = self._db.execute('DELETE FROM subscriptions WHERE chat_id = ?', (chat_id,))
+        self._db.commit()
+        return cursor.rowcount > 0
+
+    def due(self, minute: int) -> list:
+        """
+        Возвращает [(chat_id, city_id), ...] для подписок на эту минуту суток
+        """
+        return self._db.execute(
+            'SELECT chat_id, city_id FROM subscriptions WHERE minute = ?', (minute,)
+        ).fetchall()
+
+    def city_ids(self) -> list:
+        return [row[0] for row in self._db.execute('SELECT DISTINCT city_id FROM subscriptions')]
+
+    def close(self):
+        self._db.close()
+
+
+class BatchedSender:
+    """
+    Рассылает пачку сообщений равномерно в пределах window секунд,
+    но не быстрее max_rate сообщений в секунду
+    """
+
+    def __init__(self, bot: Bot, max_rate: float = 25, window: float = 55, on_forbidden=None):
+        self.bot = bot
+        self.max_rate = max_rate
+        self.window = window
+        self.on_forbidden = on_forbidden
+        self.sent = 0
+        self.failed = 0
+
+    async def send(self, messages: list):
+        """
+        messages - список (chat_id, text)
+        """
+        if not messages:
+            return
+        spacing = max(1 / self.max_rate, self.window / len(messages))
+        tasks = []
+        for index, (chat_id, text) in enumerate(messages):
+            if index:
+                await asyncio.sleep(spacing)
+            tasks.append(asyncio.create_task(self._send_one(chat_id, text)))
+        await asyncio.gather(*tasks)
+
+    async def _send_one(self, chat_id: int, text: str):
+        try:
+            await self.bot.send_message(chat_id, text)
+            self.sent += 1
+        except TelegramRetryAfter as e:
+            await asyncio.sleep(e.retry_after)
+            await self._send_one(chat_id, text)
+        except TelegramForbiddenError:
+            # Пользователь заблокировал бота - подписка больше не нужна
+            self.failed += 1
+            if self.on_forbidden is not None:
+                self.on_forbidden(chat_id)
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Ошибка отправки прогноза по подписке в чат {chat_id}: {e}")
+
+
+class SubscriptionScheduler:
+    """
+    Каждую минуту выбирает подписки на текущее время и рассылает прогнозы.
+
+    Погода берется через get_weather_message(city_id) - из кэша, который
+    заранее обновляет фоновый refresher, поэтому рассылка не ждет API.
+    """
+
+    def __init__(self, store: SubscriptionStore, sender: BatchedSender, get_weather_message, tz):
+        self.store = store
+        self.sender = sender
+        self.get_weather_message = get_weather_message
+        self.tz = tz
+        self._task = None
+        self._deliveries = set()
+        self._last_sent = None  # последняя разосланная минута (datetime)
+
+    async def deliver(self, minute: int):
+        due = self.store.due(minute)
+        if not due:
+            return
+
+        texts = {}
+        for city_id in {city_id for _, city_id in due}:
+            texts[city_id] = await self.get_weather_message(city_id)
+
+        messages = [(chat_id, texts[city_id]) for chat_id, city_id in due if texts[city_id]]
+        logger.info(f"Рассылка прогнозов: {len(messages)} подписок на {minute // 60:02d}:{minute % 60:02d}")
+        await self.sender.send(messages)
+
+    async def run(self):
+        while True:
+            now = datetime.now(self.tz)
+            next_minute = (now + timedelta(minutes=1)).replace(second=0, microsecond=0)
+            if self._last_sent is not None and next_minute <= self._last_sent:
+                # sleep идет по монотонным часам: если системные часы отстали
+                # (подстройка NTP, перевод назад), задача просыпается в hh:mm:59
+                # и снова получает уже разосланную минуту
+                next_minute = self._last_sent + timedelta(minutes=1)
+            await asyncio.sleep(max(0.0, (next_minute - now).total_seconds()))
+            self._last_sent = next_minute
+
+            minute = next_minute.hour * 60 + next_minute.minute
+            # Рассылка может занять почти минуту и не должна задерживать следующую
+            task = asyncio.create_task(self._deliver_safely(minute))
+            self._deliveries.add(task)
+            task.add_done_callback(self._deliveries.discard)
+
+    async def _deliver_safely(self, minute: int):
+        try:
+            await self.deliver(minute)
+        except Exception as e:
+            logger.error(f"Ошибка рассылки прогнозов: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        tasks = [task for task in [self._task, *self._deliveries] if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._task = None
+        self._deliveries.clear()
+
+
+def parse_time(value: str):
+    """
+    Разбирает "HH:MM" в минуту суток или возвращает None
+    """
+    try:
+        hours, minutes = value.split(':')
+        hours, minutes = int(hours), int(minutes)
+    except ValueError:
+        return None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return hours * 60 + minutes
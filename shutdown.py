@@ -0,0 +1,33 @@
+"""
+Остановка по SIGINT/SIGTERM для режимов, работающих до сигнала
+"""
+
+import asyncio
+import signal
+from contextlib import contextmanager
+
+STOP_SIGNALS = (signal.SIGINT, signal.SIGTERM)
+
+
+@contextmanager
+def stop_signals():
+    """
+    Событие, которое устанавливается по SIGINT/SIGTERM, пока открыт контекст
+    (в работающем event loop). На выходе обработчики сигналов снимаются
+    """
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in STOP_SIGNALS:
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except (NotImplementedError, RuntimeError):
+            # Windows не поддерживает add_signal_handler
+            pass
+    try:
+        yield stop_event
+    finally:
+        for sig in STOP_SIGNALS:
+            try:
+                loop.remove_signal_handler(sig)
+            except (NotImplementedError, RuntimeError):
+                pass
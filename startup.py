@@ -0,0 +1,109 @@
+"""
+Отложенная инициализация компонентов и профилирование запуска
+"""
+
+import os
+import re
+import subprocess
+import sys
+import time
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s+)(\S+)$')
+
+
+class component:
+    """
+    Декоратор метода-фабрики компонента приложения: компонент создается
+    при первом обращении и дальше берется из атрибута экземпляра.
+    Время создания записывается в профилировщик приложения, если он задан
+    """
+
+    def __init__(self, factory):
+        self.factory = factory
+        self.name = factory.__name__
+        self.__doc__ = factory.__doc__
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        started = time.perf_counter()
+        value = self.factory(instance)
+        # Атрибут экземпляра перекрывает дескриптор: фабрика больше не вызывается
+        instance.__dict__[self.name] = value
+        if instance.profiler is not None:
+            instance.profiler.record(self.name, time.perf_counter() - started)
+        return value
+
+
+def is_created(instance, name: str) -> bool:
+    """
+    Создан ли уже компонент name (без его создания)
+    """
+    return name in instance.__dict__
+
+
+class StartupProfiler:
+    """
+    Время создания компонентов. Вложенные компоненты (созданные внутри
+    фабрики другого) учитываются и отдельно, и во времени внешнего
+    """
+
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.components = []  # (имя, секунды) в порядке создания
+
+    def record(self, name: str, seconds: float):
+        self.components.append((name, seconds))
+
+
+def measure_imports(module: str, env: dict = None) -> tuple:
+    """
+    Импортирует module в отдельном процессе с -X importtime.
+
+    Возвращает (общее время процесса, [(модуль, секунды), ...]) для модулей,
+    импортируемых модулем напрямую (с учетом их зависимостей, которые
+    до этого еще не были импортированы)
+    """
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+        capture_output=True,
+        text=True,
+        env=env if env is not None else os.environ.copy(),
+    )
+    elapsed = time.perf_counter() - started
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} завершился с ошибкой:\n{result.stderr[-2000:]}")
+
+    # Строка модуля выводится после строк его импортов; прямые импорты
+    # имеют отступ на уровень (2 пробела) больше
+    pending = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        level = (len(indent) - 1) // 2
+        if level > 0:
+            pending.append((name, level, int(cumulative) / 1e6))
+        elif name == module:
+            return elapsed, [(child, seconds) for child, child_level, seconds in pending if child_level == 1]
+        else:
+            pending = []
+    return elapsed, []
+
+
+def format_report(title: str, rows: list, total: float = None) -> str:
+    """
+    Таблица «название - миллисекунды», отсортированная по убыванию времени
+    """
+    lines = [title]
+    width = max((len(name) for name, _ in rows), default=10)
+    for name, seconds in sorted(rows, key=lambda row: row[1], reverse=True):
+        lines.append(f"  {name:<{width}}  {seconds * 1000:9.1f} мс")
+    if total is not None:
+        lines.append(f"  {'всего':<{width}}  {total * 1000:9.1f} мс")
+    return '\n'.join(lines)
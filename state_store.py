@@ -0,0 +1,138 @@
+"""
+Хранилища состояний пользователей (например, ожидание текста для /voice)
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class StateStore:
+    """
+    Базовый интерфейс хранилища состояний.
+
+    Методы асинхронные, чтобы за тем же интерфейсом могли работать
+    и сетевые хранилища.
+    """
+
+    async def get(self, user_id: int):
+        raise NotImplementedError
+
+    async def set(self, user_id: int, state: str):
+        raise NotImplementedError
+
+    async def delete(self, user_id: int):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MemoryStateStore(StateStore):
+    """
+    Состояния в памяти процесса с TTL и ограничением числа записей.
+
+    Записи упорядочены по времени последней установки, поэтому и
+    просроченные, и самые старые записи всегда находятся в начале.
+    """
+
+    def __init__(self, ttl: float = 3600, max_size: int = 100000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._states = OrderedDict()  # user_id -> (state, expires_at)
+
+    async def get(self, user_id: int):
+        entry = self._states.get(user_id)
+        if entry is None:
+            return None
+        state, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._states[user_id]
+            return None
+        return state
+
+    async def set(self, user_id: int, state: str):
+        now = time.monotonic()
+        self._states[user_id] = (state, now + self.ttl)
+        self._states.move_to_end(user_id)
+
+        # Удаляем просроченные записи и самые старые сверх лимита
+        while self._states:
+            oldest_id, (_, expires_at) = next(iter(self._states.items()))
+            if expires_at > now and len(self._states) <= self.max_size:
+                break
+            del self._states[oldest_id]
+
+    async def delete(self, user_id: int):
+        self._states.pop(user_id, None)
+
+    def __len__(self):
+        return len(self._states)
+
+
+class SqliteStateStore(StateStore):
+    """
+    Состояния в SQLite: переживают перезапуск и доступны нескольким
+    процессам на одной машине.
+    """
+
+    # Как часто (в вызовах set) удалять просроченные записи
+    PURGE_EVERY = 1000
+
+    def __init__(self, db_path: str, ttl: float = 3600):
+        self.db_path = db_path
+        self.ttl = ttl
+        self._writes = 0
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        # Короткие локальные запросы выполняются прямо в event loop
+        self._db = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS user_states ('
+            'user_id INTEGER PRIMARY KEY, state TEXT NOT NULL, expires_at REAL NOT NULL)'
+        )
+        self._db.commit()
+
+    async def get(self, user_id: int):
+        row = self._db.execute(
+            'SELECT state FROM user_states WHERE user_id = ? AND expires_at > ?',
+            (user_id, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    async def set(self, user_id: int, state: str):
+        now = time.time()
+        self._db.execute(
+            'INSERT OR REPLACE INTO user_states VALUES (?, ?, ?)',
+            (user_id, state, now + self.ttl)
+        )
+        self._writes += 1
+        if self._writes % self.PURGE_EVERY == 0:
+            self._db.execute('DELETE FROM user_states WHERE expires_at <= ?', (now,))
+        self._db.commit()
+
+    async def delete(self, user_id: int):
+        self._db.execute('DELETE FROM user_states WHERE user_id = ?', (user_id,))
+        self._db.commit()
+
+    async def close(self):
+        self._db.close()
+
+
+def create_state_store(backend: str, ttl: float, max_size: int, db_path: str) -> StateStore:
+    """
+    Создает хранилище по имени бэкенда из конфигурации
+    """
+    if backend == 'sqlite':
+        logger.info(f"Состояния пользователей хранятся в SQLite: {db_path}")
+        return SqliteStateStore(db_path, ttl=ttl)
+    if backend != 'memory':
+        logger.warning(f"Неизвестный STATE_BACKEND={backend}, используется memory")
+    return MemoryStateStore(ttl=ttl, max_size=max_size)
@@ -0,0 +1,397 @@
+"""
+Многопроцессный режим: супервизор запускает несколько процессов бота и
+распределяет между ними обновления по chat_id
+
+Запуск: python supervisor.py
+"""
+
+import asyncio
+import hmac
+import json
+import logging
+import os
+import secrets
+import sys
+import time
+
+import aiohttp
+from aiohttp import web
+
+from config import (
+    BOT_TOKEN,
+    RUN_MODE,
+    WEBHOOK_HOST,
+    WEBHOOK_PORT,
+    WEBHOOK_PATH,
+    WEBHOOK_SECRET,
+    WEBHOOK_BASE_URL,
+    WEATHER_CACHE_DB,
+    UPDATE_QUEUE_SIZE,
+    TELEGRAM_GLOBAL_RATE,
+    TELEGRAM_API_URL,
+    METRICS_HOST,
+    METRICS_PORT,
+    BACKGROUND_JOBS,
+    JOURNAL_DIR,
+    WORKER_PROCESSES,
+    WORKER_BASE_PORT,
+    WORKER_HEALTH_INTERVAL,
+    WORKER_HEALTH_FAILURES,
+    WORKER_START_TIMEOUT,
+)
+from http_client import HttpClient
+from metrics import registry as metrics_registry, start_metrics_server
+from shutdown import stop_signals
+
+# Настройка логирования
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+MAIN_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'main.py')
+TELEGRAM_API_BASE = TELEGRAM_API_URL.rstrip('/') or 'https://api.telegram.org'
+WORKER_UPDATE_PATH = '/update'
+POLLING_TIMEOUT = 30
+# Процесс, упавший быстрее, чем за столько секунд, перезапускается с задержкой
+CRASH_LOOP_UPTIME = 10
+# Передача обновления воркеру: ограничено только подключение. Ответ может
+# задерживаться сколько угодно (очередь воркера переполнена), а повтор после
+# таймаута доставил бы уже принятое обновление второй раз
+FORWARD_TIMEOUT = aiohttp.ClientTimeout(total=None, connect=5, sock_connect=5)
+
+
+def shard_key(update: dict) -> int:
+    """
+    Ключ распределения обновления: чат, иначе пользователь, иначе update_id
+    """
+    for event in update.values():
+        if not isinstance(event, dict):
+            continue
+        chat = event.get('chat') or (event.get('message') or {}).get('chat')
+        if chat:
+            return chat['id']
+        user = event.get('from') or event.get('user')
+        if user:
+            return user['id']
+    return update.get('update_id', 0)
+
+
+class WorkerProcess:
+    """
+    Процесс бота (main.py в режиме webhook на локальном порту) и очередь
+    обновлений для него. Обновления передаются по одному и по порядку,
+    поэтому порядок внутри чата сохраняется.
+    """
+
+    def __init__(self, index: int, port: int, env: dict, secret: str, queue_size: int):
+        self.index = index
+        self.port = port
+        self.env = env
+        self.secret = secret
+        self.url = f"http://127.0.0.1:{port}"
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.process = None
+        self.started_at = 0.0
+        self.ready = False
+        self.failures = 0
+        self.crash_streak = 0
+        self.restarts = 0
+        self.forwarded = 0
+        self.rejected = 0
+
+    async def start(self):
+        self.process = await asyncio.create_subprocess_exec(sys.executable, MAIN_SCRIPT, env=self.env)
+        self.started_at = time.monotonic()
+        self.ready = False
+        self.failures = 0
+        logger.info(f"Воркер {self.index} запущен: pid {self.process.pid}, порт {self.port}")
+
+    async def stop(self, timeout: float = 30):
+        """
+        SIGTERM (процесс дорабатывает принятые обновления), затем SIGKILL
+        """
+        if self.process is None or self.process.returncode is not None:
+            return
+        self.process.terminate()
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Воркер {self.index} не остановился за {timeout} с, завершаем принудительно")
+            self.process.kill()
+            await self.process.wait()
+
+    async def restart(self, reason: str):
+        logger.warning(f"Перезапуск воркера {self.index}: {reason}")
+        self.restarts += 1
+        await self.stop(timeout=10)
+
+        # Процесс падает сразу после запуска - перезапускаем все реже
+        if time.monotonic() - self.started_at < CRASH_LOOP_UPTIME:
+            self.crash_streak += 1
+            await asyncio.sleep(min(30, 2 ** self.crash_streak))
+        else:
+            self.crash_streak = 0
+        await self.start()
+
+    async def is_healthy(self, session: aiohttp.ClientSession) -> bool:
+        try:
+            async with session.get(f"{self.url}/health", timeout=aiohttp.ClientTimeout(total=2)) as response:
+                return response.status == 200
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            return False
+
+    async def supervise(self, session: aiohttp.ClientSession, interval: float, max_failures: int, start_timeout: float):
+        """
+        Перезапускает процесс, если он завершился или перестал отвечать на /health
+        """
+        while True:
+            exited = asyncio.ensure_future(self.process.wait())
+            done, _ = await asyncio.wait({exited}, timeout=interval)
+            if done:
+                await self.restart(f"процесс завершился с кодом {self.process.returncode}")
+                continue
+            exited.cancel()
+
+            if await self.is_healthy(session):
+                if not self.ready:
+                    logger.info(f"Воркер {self.index} готов")
+                self.ready = True
+                self.failures = 0
+                continue
+            if not self.ready and time.monotonic() - self.started_at < start_timeout:
+                continue  # процесс еще запускается
+            self.failures += 1
+            if self.failures >= max_failures:
+                await self.restart(f"нет ответа на проверку здоровья ({self.failures} раз подряд)")
+
+    async def forward(self, session: aiohttp.ClientSession):
+        """
+        Передает обновления из очереди процессу. Пока процесс недоступен
+        (например, перезапускается), обновление ждет и не теряется. Ответ
+        процесса ждется без ограничения времени: он задерживается, пока
+        очередь воркера переполнена (см. FORWARD_TIMEOUT)
+        """
+        headers = {'Content-Type': 'application/json', 'X-Telegram-Bot-Api-Secret-Token': self.secret}
+        while True:
+            body = await self.queue.get()
+            try:
+                while True:
+                    try:
+                        async with session.post(
+                            f"{self.url}{WORKER_UPDATE_PATH}", data=body, headers=headers, timeout=FORWARD_TIMEOUT
+                        ) as response:
+                            if response.status == 200:
+                                self.forwarded += 1
+                            else:
+                                # Процесс доступен, но не принял обновление - повтор не поможет
+                                self.rejected += 1
+                                logger.error(f"Воркер {self.index} отклонил обновление: HTTP {response.status}")
+                            break
+                    except (aiohttp.ClientError, asyncio.TimeoutError):
+                        await asyncio.sleep(0.5)
+            finally:
+                self.queue.task_done()
+
+    def stats(self) -> dict:
+        return {
+            'pid': self.process.pid if self.process else None,
+            'ready': self.ready,
+            'queued': self.queue.qsize(),
+            'forwarded': self.forwarded,
+            'rejected': self.rejected,
+            'restarts': self.restarts,
+        }
+
+
+class Supervisor:
+    """
+    Запускает processes процессов бота и принимает обновления сам - long
+    polling или webhook (по RUN_MODE). Обновления одного чата всегда
+    попадают в один и тот же процесс.
+
+    Состояния пользователей хранятся в SQLite, кэш погоды - в общей базе
+    SQLite, кэши переводов и голосовых сообщений - в общих файлах, поэтому
+    процессы не дублируют работу друг друга и переживают перезапуск.
+    Фоновые задачи (обновление погоды, рассылка подписок) выполняются
+    только в первом процессе, общий лимит запросов к Telegram API делится
+    между процессами поровну.
+    """
+
+    def __init__(self, processes: int, base_port: int):
+        self.processes = processes
+        self.base_port = base_port
+        # Секрет для запросов супервизора к воркерам
+        self.secret = secrets.token_urlsafe(16)
+        self.workers = [
+            WorkerProcess(index, base_port + index, self._worker_env(index), self.secret, UPDATE_QUEUE_SIZE)
+            for index in range(processes)
+        ]
+        self.http_client = HttpClient()
+        self.received = 0
+
+    def _worker_env(self, index: int) -> dict:
+        env = dict(os.environ)
+        env.update({
+            'RUN_MODE': 'webhook',
+            'WEBHOOK_HOST': '127.0.0.1',
+            'WEBHOOK_PORT': str(self.base_port + index),
+            'WEBHOOK_PATH': WORKER_UPDATE_PATH,
+            'WEBHOOK_SECRET': self.secret,
+            'WEBHOOK_BASE_URL': '',
+            'STATE_BACKEND': 'sqlite',
+            'WEATHER_CACHE_DB': WEATHER_CACHE_DB or os.path.join('cache', 'weather.sqlite3'),
+            'TELEGRAM_GLOBAL_RATE': str(TELEGRAM_GLOBAL_RATE / self.processes),
+            'METRICS_PORT': str(METRICS_PORT + 1 + index if METRICS_PORT else 0),
+            'BACKGROUND_JOBS': '1' if BACKGROUND_JOBS and index == 0 else '0',
+            # У каждого процесса свой журнал; после перезапуска процесс получает те же чаты
+            'JOURNAL_DIR': os.path.join(JOURNAL_DIR, f"worker-{index}") if JOURNAL_DIR else '',
+        })
+        return env
+
+    async def dispatch(self, update: dict, body: bytes = None):
+        """
+        Ставит обновление в очередь его процесса; ждет, если очередь заполнена
+        """
+        self.received += 1
+        worker = self.workers[shard_key(update) % self.processes]
+        await worker.queue.put(body if body is not None else json.dumps(update).encode())
+
+    async def _call_api(self, method: str, request_timeout: float = None, **params):
+        url = f"{TELEGRAM_API_BASE}/bot{BOT_TOKEN}/{method}"
+        params = {name: value for name, value in params.items() if value is not None}
+        client_timeout = aiohttp.ClientTimeout(total=request_timeout) if request_timeout else None
+        async with self.http_client.session.post(url, json=params, timeout=client_timeout) as response:
+            data = await response.json()
+        if not data.get('ok'):
+            raise RuntimeError(f"{method}: {data.get('description')}")
+        return data['result']
+
+    async def poll(self):
+        """
+        Long polling; следующий getUpdates - только после того, как все
+        полученные обновления приняты в очереди процессов
+        """
+        offset = None
+        delay = 1.0
+        while True:
+            try:
+                updates = await self._call_api(
+                    'getUpdates', request_timeout=POLLING_TIMEOUT + 10, offset=offset, timeout=POLLING_TIMEOUT
+                )
+            except Exception as e:
+                logger.error(f"Ошибка получения обновлений: {e}; повтор через {delay:.0f} с")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 30)
+                continue
+            delay = 1.0
+            for update in updates:
+                await self.dispatch(update)
+                offset = update['update_id'] + 1
+
+    async def handle_webhook(self, request: web.Request) -> web.Response:
+        if WEBHOOK_SECRET and not hmac.compare_digest(
+            request.headers.get('X-Telegram-Bot-Api-Secret-Token', ''), WEBHOOK_SECRET
+        ):
+            return web.Response(status=401, text='Unauthorized')
+        body = await request.read()
+        await self.dispatch(json.loads(body), body)
+        return web.json_response({})
+
+    async def start_webhook_server(self) -> web.AppRunner:
+        app = web.Application()
+        app.router.add_post(WEBHOOK_PATH, self.handle_webhook)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, host=WEBHOOK_HOST, port=WEBHOOK_PORT).start()
+        logger.info(f"Webhook-сервер супервизора запущен на http://{WEBHOOK_HOST}:{WEBHOOK_PORT}{WEBHOOK_PATH}")
+        if WEBHOOK_BASE_URL:
+            webhook_url = WEBHOOK_BASE_URL.rstrip('/') + WEBHOOK_PATH
+            await self._call_api('setWebhook', url=webhook_url, secret_token=WEBHOOK_SECRET or None)
+            logger.info(f"Webhook зарегистрирован: {webhook_url}")
+        return runner
+
+    def collect_metrics(self):
+        stats = [worker.stats() for worker in self.workers]
+        return [
+            ('bot_supervisor_updates_total', 'counter', 'Обновления, принятые супервизором',
+             [({}, self.received)]),
+            ('bot_worker_queued', 'gauge', 'Обновления в очереди на передачу воркеру',
+             [({'worker': str(index)}, values['queued']) for index, values in enumerate(stats)]),
+            ('bot_worker_forwarded_total', 'counter', 'Обновления, переданные воркеру',
+             [({'worker': str(index)}, values['forwarded']) for index, values in enumerate(stats)]),
+            ('bot_worker_restarts_total', 'counter', 'Перезапуски воркера',
+             [({'worker': str(index)}, values['restarts']) for index, values in enumerate(stats)]),
+            ('bot_worker_ready', 'gauge', 'Воркер отвечает на проверку здоровья',
+             [({'worker': str(index)}, int(values['ready'])) for index, values in enumerate(stats)]),
+        ]
+
+    async def run(self):
+        """
+        Работает до SIGINT/SIGTERM: при остановке прекращает прием обновлений,
+        передает воркерам уже принятые и останавливает процессы
+        """
+        with stop_signals() as stop_event:
+            session = await self.http_client.start()
+            for worker in self.workers:
+                await worker.start()
+            tasks = []
+            for worker in self.workers:
+                tasks.append(asyncio.create_task(worker.forward(session)))
+                tasks.append(asyncio.create_task(worker.supervise(
+                    session, WORKER_HEALTH_INTERVAL, WORKER_HEALTH_FAILURES, WORKER_START_TIMEOUT
+                )))
+
+            metrics_runner = None
+            webhook_runner = None
+            intake = None
+            try:
+                if METRICS_PORT:
+                    metrics_registry.add_collector(self.collect_metrics)
+                    metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+                if RUN_MODE == 'webhook':
+                    webhook_runner = await self.start_webhook_server()
+                else:
+                    intake = asyncio.create_task(self.poll())
+                await stop_event.wait()
+            finally:
+                logger.info("Остановка супервизора...")
+                if intake is not None:
+                    intake.cancel()
+                    await asyncio.gather(intake, return_exceptions=True)
+                if webhook_runner is not None:
+                    if WEBHOOK_BASE_URL:
+                        try:
+                            await self._call_api('deleteWebhook')
+                        except Exception as e:
+                            logger.error(f"Не удалось удалить webhook: {e}")
+                    await webhook_runner.cleanup()
+
+                # Передаем воркерам уже принятые обновления, затем останавливаем процессы
+                try:
+                    await asyncio.wait_for(
+                        asyncio.gather(*(worker.queue.join() for worker in self.workers)), 30
+                    )
+                except asyncio.TimeoutError:
+                    logger.warning("Не все принятые обновления переданы воркерам")
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                await asyncio.gather(*(worker.stop() for worker in self.workers))
+
+                if metrics_runner is not None:
+                    await metrics_runner.cleanup()
+                await self.http_client.close()
+
+
+def main():
+    if BOT_TOKEN == 'YOUR_BOT_TOKEN_HERE':
+        logger.error("Не установлен BOT_TOKEN! Создайте .env файл с токеном бота.")
+        return
+    logger.info(f"Запуск супервизора: процессов {WORKER_PROCESSES}, режим {RUN_MODE}")
+    asyncio.run(Supervisor(WORKER_PROCESSES, WORKER_BASE_PORT).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Предкомпилированные шаблоны сообщений и готовые тексты ответов
+"""
+
+import string
+from datetime import datetime
+
+from config import MESSAGES, BOT_NAME
+
+
+class Template:
+    """
+    Шаблон в формате str.format, разобранный один раз при импорте.
+
+    render() склеивает готовые куски текста с подставленными значениями
+    и не разбирает шаблон заново. Шаблоны без полей возвращают текст
+    как есть, а шаблоны со спецификаторами формата ({x:.1f}, {x!r})
+    рендерятся обычным str.format.
+    """
+
+    __slots__ = ('text', '_parts', '_simple')
+
+    def __init__(self, text: str):
+        self.text = text
+        parts = []
+        simple = True
+        for literal, field, spec, conversion in string.Formatter().parse(text):
+            if field is not None and (spec or conversion or not field.isidentifier()):
+                simple = False
+            parts.append((literal, field))
+        self._parts = tuple(parts)
+        self._simple = simple
+
+    @property
+    def is_static(self) -> bool:
+        return all(field is None for _, field in self._parts)
+
+    def render(self, **values) -> str:
+        if not self._simple:
+            return self.text.format(**values)
+        chunks = []
+        for literal, field in self._parts:
+            chunks.append(literal)
+            if field is not None:
+                chunks.append(str(values[field]))
+        return ''.join(chunks)
+
+
+# Все шаблоны из config.MESSAGES, разобранные при импорте
+TEMPLATES = {name: Template(text) for name, text in MESSAGES.items()}
+
+# Ответы, которые не зависят от запроса, рендерятся один раз
+STATIC_MESSAGES = {name: template.text for name, template in TEMPLATES.items() if template.is_static}
+STATIC_MESSAGES['start'] = TEMPLATES['start'].render(bot_name=BOT_NAME)
+
+
+def render(name: str, **values) -> str:
+    """
+    Рендерит шаблон MESSAGES[name]
+    """
+    return TEMPLATES[name].render(**values)
+
+
+def static(name: str) -> str:
+    """
+    Возвращает заранее отрендеренный ответ
+    """
+    return STATIC_MESSAGES[name]
+
+
+class WeatherRenderer:
+    """
+    Текст прогноза рендерится один раз на каждый новый ответ API:
+    пока в кэше погоды лежит тот же объект данных, возвращается
+    уже готовый текст. Время в сообщении - время наблюдения из ответа
+    (поле dt), а не время запроса пользователя.
+    """
+
+    def __init__(self):
+        self._rendered = {}  # id города -> (данные, текст)
+        self.renders = 0
+
+    def render(self, weather_data: dict) -> str:
+        key = weather_data.get('id')
+        cached = self._rendered.get(key)
+        if cached is not None and cached[0] is weather_data:
+            return cached[1]
+
+        text = self._format(weather_data)
+        self._rendered[key] = (weather_data, text)
+        self.renders += 1
+        return text
+
+    @staticmethod
+    def _format(weather_data: dict) -> str:
+        main = weather_data['main']
+        observed_at = weather_data.get('dt')
+        updated = datetime.fromtimestamp(observed_at) if observed_at else datetime.now()
+        return TEMPLATES['weather_format'].render(
+            city=weather_data.get('name', ''),
+            temp=round(main['temp']),
+            feels_like=round(main['feels_like']),
+            description=weather_data['weather'][0]['description'].title(),
+            wind_speed=weather_data['wind']['speed'],
+            humidity=main['humidity'],
+            pressure=round(main['pressure'] * 0.750062),  # Конвертация в мм рт.ст.
+            visibility=round(weather_data['visibility'] / 1000),  # Конвертация в км
+            time=updated.strftime("%H:%M %d.%m.%Y")
+        )
@@ -0,0 +1,72 @@
+"""
+Пакетный перевод: склеенный запрос разбирается обратно только по меткам
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from batch_translator import BatchingTranslator, split_marked  # noqa: E402
+
+
+class InlineExecutor:
+    async def run(self, name, func, *args):
+        return func(*args)
+
+
+class ScriptedTranslator:
+    """
+    Отвечает на склеенный запрос заданным текстом, translate_batch - верно
+    """
+
+    def __init__(self, joined_response: str):
+        self.joined_response = joined_response
+        self.batch_calls = 0
+
+    def translate(self, text: str) -> str:
+        return self.joined_response if '\n' in text else f"en:{text}"
+
+    def translate_batch(self, batch: list) -> list:
+        self.batch_calls += 1
+        return [f"en:{text}" for text in batch]
+
+
+class SplitMarkedTest(unittest.TestCase):
+    def test_aligned_lines(self):
+        self.assertEqual(split_marked('[[0]] one\n[[1]] two', 2), ['one', 'two'])
+
+    def test_merge_and_split_is_rejected(self):
+        # Строк столько же, сколько текстов, но первые две склеены, а третья разбита
+        self.assertIsNone(split_marked('[[0]] a [[1]] b\n[[2]] c\nd', 3))
+
+    def test_reordered_or_missing_markers_are_rejected(self):
+        self.assertIsNone(split_marked('[[1]] b\n[[0]] a', 2))
+        self.assertIsNone(split_marked('a\n[[1]] b', 2))
+
+
+class BatchingTranslatorTest(unittest.IsolatedAsyncioTestCase):
+    async def test_merge_and_split_response_falls_back_to_batch(self):
+        translator = ScriptedTranslator('[[0]] A [[1]] B\n[[2]] C\nD')
+        batching = BatchingTranslator(InlineExecutor(), translator_factory=lambda **kwargs: translator)
+        results = await asyncio.gather(
+            batching.translate('первый'),
+            batching.translate('второй'),
+            batching.translate('третий'),
+        )
+        self.assertEqual(results, ['en:первый', 'en:второй', 'en:третий'])
+        self.assertEqual(translator.batch_calls, 1)
+
+    async def test_marked_response_is_split(self):
+        translator = ScriptedTranslator('[[0]] one\n[[1]] two')
+        batching = BatchingTranslator(InlineExecutor(), translator_factory=lambda **kwargs: translator)
+        results = await asyncio.gather(batching.translate('раз'), batching.translate('два'))
+        self.assertEqual(results, ['one', 'two'])
+        self.assertEqual(translator.batch_calls, 0)
+        self.assertEqual(batching.upstream_calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+"""
+Семплирующий профилировщик LoopMonitor.profile()
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from collections import Counter
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import diagnostics  # noqa: E402
+from diagnostics import LoopMonitor  # noqa: E402
+
+
+class ProfileTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.monitor = LoopMonitor(profile_dir=self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    async def test_non_positive_seconds_are_rejected(self):
+        for seconds in (0, -1, float('nan')):
+            with self.assertRaises(ValueError):
+                await self.monitor.profile(seconds)
+        self.assertFalse(self.monitor.profiling)
+
+    async def test_empty_profile_is_not_saved(self):
+        with mock.patch.object(diagnostics, 'sample_stacks', return_value=Counter()):
+            path, samples = await self.monitor.profile(0.01)
+        self.assertIsNone(path)
+        self.assertEqual(os.listdir(self.tmp.name), [])
+
+    async def test_profile_is_saved(self):
+        path, samples = await self.monitor.profile(0.05)
+        self.assertTrue(samples)
+        self.assertTrue(os.path.exists(path))
+
+
+if __name__ == '__main__':
+    unittest.main()
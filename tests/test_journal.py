@@ -0,0 +1,173 @@
+"""
+Журнал обновлений при обработке средствами aiogram (UPDATE_WORKERS=0)
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram.methods import GetMe, GetUpdates  # noqa: E402
+from aiogram.types import Update  # noqa: E402
+
+from journal import (  # noqa: E402
+    DONE,
+    PENDING,
+    RECORD_HEADER,
+    JournalRequestMiddleware,
+    UpdateJournal,
+    list_segments,
+    segment_path,
+)
+
+
+class RequestMiddlewareTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.journal = UpdateJournal(self.tmp.name, fsync_interval=0)
+        self.journal.open()
+        self.middleware = JournalRequestMiddleware(self.journal)
+
+    async def asyncTearDown(self):
+        await self.journal.close()
+        self.tmp.cleanup()
+
+    async def test_updates_are_recorded_before_return(self):
+        updates = [Update(update_id=1), Update(update_id=2)]
+
+        async def make_request(bot, method):
+            return updates
+
+        result = await self.middleware(make_request, None, GetUpdates())
+        self.assertEqual(result, updates)
+        self.assertEqual(self.journal.status(1), PENDING)
+        self.assertEqual(self.journal.status(2), PENDING)
+        self.assertEqual(self.journal.stats()['fsyncs'], 1)
+
+    async def test_known_updates_are_returned(self):
+        await self.journal.record([Update(update_id=1)])
+        self.journal.finish(1)
+        updates = [Update(update_id=1), Update(update_id=2)]
+
+        async def make_request(bot, method):
+            return updates
+
+        # Повторы пропускает JournalMiddleware, aiogram получает все обновления
+        self.assertEqual(await self.middleware(make_request, None, GetUpdates()), updates)
+        self.assertEqual(self.journal.status(1), DONE)
+        self.assertEqual(self.journal.status(2), PENDING)
+
+    async def test_other_methods_are_not_recorded(self):
+        async def make_request(bot, method):
+            return True
+
+        self.assertTrue(await self.middleware(make_request, None, GetMe()))
+        self.assertEqual(self.journal.stats()['records']['update'], 0)
+
+
+async def reopen(directory: str) -> list:
+    """
+    update_id необработанных обновлений, которые журнал вернет при запуске
+    """
+    journal = UpdateJournal(directory, fsync_interval=0)
+    unfinished = [update['update_id'] for update in journal.open()]
+    await journal.close()
+    return unfinished
+
+
+class ReplayTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    async def write_journal(self, update_ids, finished) -> UpdateJournal:
+        journal = UpdateJournal(self.tmp.name, fsync_interval=0)
+        journal.open()
+        await journal.record([Update(update_id=update_id) for update_id in update_ids])
+        for update_id in finished:
+            journal.finish(update_id)
+        await journal.close()
+        return journal
+
+    async def test_unfinished_updates_are_replayed(self):
+        await self.write_journal(range(1, 7), finished=[1, 3, 5])
+        self.assertEqual(await reopen(self.tmp.name), [2, 4, 6])
+
+    async def test_replayed_updates_stay_pending_until_finished(self):
+        await self.write_journal(range(1, 4), finished=[2])
+        journal = UpdateJournal(self.tmp.name, fsync_interval=0)
+        self.assertEqual([update['update_id'] for update in journal.open()], [1, 3])
+        self.assertEqual(journal.status(1), PENDING)
+        self.assertEqual(journal.status(2), DONE)
+        journal.finish(1)
+        journal.finish(3)
+        await journal.close()
+        self.assertEqual(await reopen(self.tmp.name), [])
+
+    async def test_truncated_tail_is_skipped(self):
+        await self.write_journal(range(1, 7), finished=[1, 3, 5])
+        path = segment_path(self.tmp.name, list_segments(self.tmp.name)[-1])
+        with open(path, 'ab') as f:
+            # Процесс упал посреди записи: заголовок обещает 100 байт, записано 10
+            f.write(RECORD_HEADER.pack(100, 0, 1) + b'x' * 10)
+        self.assertEqual(await reopen(self.tmp.name), [2, 4, 6])
+
+    async def test_corrupted_record_ends_segment(self):
+        await self.write_journal(range(1, 4), finished=[])
+        path = segment_path(self.tmp.name, list_segments(self.tmp.name)[-1])
+        with open(path, 'r+b') as f:
+            data = f.read()
+            # Портим данные последней записи - crc32 не сойдется
+            f.seek(len(data) - 2)
+            f.write(b'##')
+        self.assertEqual(await reopen(self.tmp.name), [1, 2])
+
+
+class RotationTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    async def asyncTearDown(self):
+        self.tmp.cleanup()
+
+    async def test_segments_rotate_and_finished_ones_are_compacted(self):
+        journal = UpdateJournal(self.tmp.name, segment_bytes=100, fsync_interval=0, keep_segments=1)
+        journal.open()
+        for update_id in range(1, 11):
+            await journal.record([Update(update_id=update_id)])
+        self.assertGreater(len(list_segments(self.tmp.name)), 2)
+        # Ни одно обновление не обработано - ни один сегмент не удален
+        self.assertEqual(list_segments(self.tmp.name)[0], 1)
+
+        for update_id in range(1, 11):
+            journal.finish(update_id)
+        await journal.record([Update(update_id=11)])
+        await journal.close()
+
+        segments = list_segments(self.tmp.name)
+        # Остались текущий сегмент и не больше keep_segments завершенных
+        self.assertLessEqual(len(segments), 2)
+        self.assertNotIn(1, segments)
+        self.assertEqual(await reopen(self.tmp.name), [11])
+
+    async def test_segment_with_pending_update_is_kept(self):
+        journal = UpdateJournal(self.tmp.name, segment_bytes=100, fsync_interval=0, keep_segments=0)
+        journal.open()
+        for update_id in range(1, 6):
+            await journal.record([Update(update_id=update_id)])
+        for update_id in range(2, 6):
+            journal.finish(update_id)
+        await journal.record([Update(update_id=6)])
+        await journal.close()
+
+        # Сегменты удаляются только по порядку: первый держит обновление 1
+        self.assertEqual(list_segments(self.tmp.name)[0], 1)
+        self.assertEqual(await reopen(self.tmp.name), [1, 6])
+
+
+if __name__ == '__main__':
+    unittest.main()
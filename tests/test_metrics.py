@@ -0,0 +1,30 @@
+"""
+Коллекторы метрик приложения
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('BOT_TOKEN', '123456:test')
+
+import main  # noqa: E402
+from metrics import registry  # noqa: E402
+
+
+class CollectorTest(unittest.TestCase):
+    def test_closed_app_collector_is_removed(self):
+        before = len(registry._collectors)
+        app = main.create_app()
+        # Повторная регистрация того же коллектора не дублирует его
+        registry.add_collector(app.collect_metrics)
+        self.assertEqual(len(registry._collectors), before + 1)
+
+        asyncio.run(app.close())
+        self.assertEqual(len(registry._collectors), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,93 @@
+"""
+Постобработка фото: имя файла в хранилище остается хэшем его содержимого
+"""
+
+import hashlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image  # noqa: E402
+
+from photo_processing import process_photo  # noqa: E402
+from photo_storage import PhotoStore  # noqa: E402
+
+
+def jpeg_with_exif() -> bytes:
+    image = Image.new('RGB', (64, 48), (200, 120, 40))
+    exif = Image.Exif()
+    exif[0x010F] = 'Camera'  # Make
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=95, exif=exif)
+    return buffer.getvalue()
+
+
+class FakeFile:
+    file_path = 'photos/file.jpg'
+
+
+class FakeBot:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    async def get_file(self, file_id):
+        return FakeFile()
+
+    async def download_file(self, file_path, destination, seek=True):
+        destination.write(self.data)
+
+
+def file_digest(path: str) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+class StoreProcessedTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = PhotoStore(self.tmp.name, os.path.join(self.tmp.name, 'index.sqlite3'))
+        self.data = jpeg_with_exif()
+        self.bot = FakeBot(self.data)
+
+    async def asyncTearDown(self):
+        self.store.close()
+        self.tmp.cleanup()
+
+    async def test_processed_file_is_named_by_its_content(self):
+        stored = await self.store.ingest(self.bot, 'file-1', 'unique-1')
+        original_path = stored['save_path']
+        self.assertEqual(file_digest(original_path), stored['sha256'])
+
+        result = process_photo(original_path, self.store.thumb_path_for(stored['sha256']))
+        self.assertTrue(result['replaced'])
+        # Оригинал не перезаписывается в рабочем процессе
+        self.assertEqual(file_digest(original_path), stored['sha256'])
+
+        self.store.store_processed(stored['sha256'], result)
+        known = self.store.find_by_unique_id('unique-1')
+        self.assertNotEqual(known['save_path'], original_path)
+        self.assertFalse(os.path.exists(original_path))
+        self.assertFalse(os.path.exists(result['output_path']))
+        self.assertEqual(os.path.basename(known['save_path']), result['sha256'] + '.jpg')
+        self.assertEqual(file_digest(known['save_path']), result['sha256'])
+        self.assertEqual(known['file_size'], os.path.getsize(known['save_path']))
+        with Image.open(known['save_path']) as image:
+            self.assertFalse(image.getexif())
+
+        # То же содержимое под другим file_unique_id по-прежнему дубликат
+        again = await self.store.ingest(self.bot, 'file-2', 'unique-2')
+        self.assertTrue(again['duplicate'])
+        self.assertEqual(again['save_path'], known['save_path'])
+
+    async def test_unchanged_photo_is_left_in_place(self):
+        stored = await self.store.ingest(self.bot, 'file-1', 'unique-1')
+        self.store.store_processed(stored['sha256'], {'replaced': False, 'output_path': None, 'size': 0})
+        self.assertEqual(self.store.find_by_unique_id('unique-1')['save_path'], stored['save_path'])
+
+
+if __name__ == '__main__':
+    unittest.main()
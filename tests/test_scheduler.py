@@ -0,0 +1,88 @@
+"""
+Рассылка прогнозов по подписке
+"""
+
+import asyncio
+import os
+import sys
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scheduler  # noqa: E402
+from scheduler import BatchedSender, SubscriptionScheduler  # noqa: E402
+
+MSK = timezone(timedelta(hours=3))
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        self.sent.append((chat_id, text))
+
+
+class BatchedSenderTest(unittest.IsolatedAsyncioTestCase):
+    async def test_no_pause_after_last_message(self):
+        bot = FakeBot()
+        sender = BatchedSender(bot, max_rate=1000, window=0.4)
+        started = time.monotonic()
+        await sender.send([(1, 'a'), (2, 'b')])
+        elapsed = time.monotonic() - started
+        self.assertEqual(bot.sent, [(1, 'a'), (2, 'b')])
+        # Одна пауза между сообщениями (window / 2), после последнего - без паузы
+        self.assertGreaterEqual(elapsed, 0.19)
+        self.assertLess(elapsed, 0.35)
+
+    async def test_single_message_is_sent_without_pause(self):
+        bot = FakeBot()
+        sender = BatchedSender(bot, max_rate=1000, window=1)
+        await asyncio.wait_for(sender.send([(1, 'a')]), 0.5)
+        self.assertEqual(sender.sent, 1)
+
+
+class SchedulerClockTest(unittest.IsolatedAsyncioTestCase):
+    async def test_lagging_wall_clock_does_not_repeat_minute(self):
+        # Системные часы отстают от монотонных: после сна задача видит hh:mm:59.9x
+        wall_clock = iter([
+            datetime(2026, 1, 1, 10, 0, 30, tzinfo=MSK),
+            datetime(2026, 1, 1, 10, 0, 59, 950000, tzinfo=MSK),
+            datetime(2026, 1, 1, 10, 1, 59, 990000, tzinfo=MSK),
+        ])
+        delivered = []
+        sleeps = []
+        real_sleep = asyncio.sleep
+
+        class FakeDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return next(wall_clock)
+
+        async def fake_sleep(seconds):
+            sleeps.append(round(seconds, 2))
+            await real_sleep(0)
+
+        subscription_scheduler = SubscriptionScheduler(None, None, None, MSK)
+
+        async def deliver(minute):
+            delivered.append(minute)
+
+        subscription_scheduler._deliver_safely = deliver
+        with mock.patch.object(scheduler, 'datetime', FakeDatetime), \
+                mock.patch.object(scheduler.asyncio, 'sleep', fake_sleep):
+            task = asyncio.create_task(subscription_scheduler.run())
+            while len(delivered) < 3 and not task.done():
+                await real_sleep(0)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        self.assertEqual(delivered, [10 * 60 + 1, 10 * 60 + 2, 10 * 60 + 3])
+        self.assertEqual(sleeps, [30.0, 60.05, 60.01])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,28 @@
+"""
+Остановка по SIGINT/SIGTERM
+"""
+
+import asyncio
+import os
+import signal
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from shutdown import stop_signals  # noqa: E402
+
+
+@unittest.skipIf(sys.platform == 'win32', 'Windows не поддерживает add_signal_handler')
+class StopSignalsTest(unittest.IsolatedAsyncioTestCase):
+    async def test_signal_sets_event_and_handlers_are_removed(self):
+        loop = asyncio.get_running_loop()
+        with stop_signals() as stop_event:
+            os.kill(os.getpid(), signal.SIGTERM)
+            await asyncio.wait_for(stop_event.wait(), 1)
+        self.assertFalse(loop.remove_signal_handler(signal.SIGTERM))
+        self.assertFalse(loop.remove_signal_handler(signal.SIGINT))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+"""
+Передача обновлений из супервизора процессу-воркеру
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+import aiohttp
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from supervisor import WORKER_UPDATE_PATH, WorkerProcess  # noqa: E402
+
+
+class ForwardTest(unittest.IsolatedAsyncioTestCase):
+    async def test_slow_worker_receives_update_once(self):
+        received = []
+
+        async def handle(request):
+            received.append(await request.read())
+            # Воркер держит ответ дольше общего таймаута сессии (очередь переполнена)
+            await asyncio.sleep(0.3)
+            return web.json_response({})
+
+        app = web.Application()
+        app.router.add_post(WORKER_UPDATE_PATH, handle)
+        server = TestServer(app)
+        await server.start_server()
+        worker = WorkerProcess(0, server.port, {}, 'secret', queue_size=10)
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=0.1)) as session:
+            task = asyncio.create_task(worker.forward(session))
+            await worker.queue.put(b'{"update_id": 1}')
+            await asyncio.wait_for(worker.queue.join(), 5)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+        await server.close()
+
+        self.assertEqual(received, [b'{"update_id": 1}'])
+        self.assertEqual(worker.forwarded, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,107 @@
+"""
+Кэш голосовых сообщений: формат аудио в ключе и имени файла
+"""
+
+import json
+import os
+import sys
+import tempfile
+import unittest
+from itertools import count
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tts_cache import TTSCache  # noqa: E402
+
+
+class FormatTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache_dir = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_format_is_part_of_key_and_file_name(self):
+        cache = TTSCache(self.cache_dir, max_bytes=1024 * 1024)
+        mp3_key = cache.make_key('Привет', 'ru', False, 'mp3')
+        ogg_key = cache.make_key('Привет', 'ru', False, 'ogg')
+        self.assertNotEqual(mp3_key, ogg_key)
+
+        cache.store(mp3_key, b'mp3 data')
+        self.assertTrue(cache.path_for(mp3_key).endswith('.mp3'))
+        # MP3, синтезированный без ffmpeg, не выдается за OGG
+        self.assertEqual(cache.lookup(ogg_key), (None, None))
+        self.assertEqual(cache.lookup(mp3_key), (None, cache.path_for(mp3_key)))
+
+    def test_legacy_entries_are_dropped(self):
+        legacy_key = 'a' * 64
+        with open(os.path.join(self.cache_dir, legacy_key + '.ogg'), 'wb') as f:
+            f.write(b'mp3 data')
+        with open(os.path.join(self.cache_dir, TTSCache.INDEX_NAME), 'w', encoding='utf-8') as f:
+            json.dump({legacy_key: {'size': 8, 'file_id': 'old', 'last_used': 0.0}}, f)
+
+        cache = TTSCache(self.cache_dir, max_bytes=1024 * 1024)
+        self.assertEqual(cache.total_bytes(), 0)
+        self.assertFalse(os.path.exists(os.path.join(self.cache_dir, legacy_key + '.ogg')))
+
+
+class EvictionTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        # Каждое обращение к часам - на секунду позже предыдущего
+        clock = count(1)
+        patcher = mock.patch('tts_cache.time.time', side_effect=lambda: float(next(clock)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_oldest_files_are_deleted_first_and_file_ids_kept(self):
+        cache = TTSCache(self.tmp.name, max_bytes=250)
+        keys = [cache.make_key(text, 'ru', False, 'ogg') for text in ('a', 'b', 'c', 'd')]
+        cache.store(keys[0], b'x' * 100)
+        cache.set_file_id(keys[0], 'file-a')
+        cache.store(keys[1], b'x' * 100)
+        cache.store(keys[2], b'x' * 100)
+
+        # Самый старый файл удален, но file_id остался - фраза отправляется без синтеза
+        self.assertFalse(os.path.exists(cache.path_for(keys[0])))
+        self.assertEqual(cache.lookup(keys[0]), ('file-a', None))
+        self.assertTrue(os.path.exists(cache.path_for(keys[1])))
+        self.assertEqual(cache.total_bytes(), 200)
+
+        # Следующий по возрасту файл без file_id удаляется вместе с записью
+        cache.store(keys[3], b'x' * 100)
+        self.assertFalse(os.path.exists(cache.path_for(keys[1])))
+        self.assertEqual(cache.lookup(keys[1]), (None, None))
+        self.assertEqual(cache.lookup(keys[2]), (None, cache.path_for(keys[2])))
+        self.assertEqual(cache.lookup(keys[3]), (None, cache.path_for(keys[3])))
+
+    def test_recently_used_file_survives(self):
+        cache = TTSCache(self.tmp.name, max_bytes=250)
+        keys = [cache.make_key(text, 'ru', False, 'ogg') for text in ('a', 'b', 'c')]
+        cache.store(keys[0], b'x' * 100)
+        cache.store(keys[1], b'x' * 100)
+        cache.lookup(keys[0])
+        cache.store(keys[2], b'x' * 100)
+
+        self.assertTrue(os.path.exists(cache.path_for(keys[0])))
+        self.assertFalse(os.path.exists(cache.path_for(keys[1])))
+
+    def test_entry_limit_drops_oldest_entries(self):
+        cache = TTSCache(self.tmp.name, max_bytes=1024 * 1024, max_entries=2)
+        keys = [cache.make_key(text, 'ru', False, 'ogg') for text in ('a', 'b', 'c')]
+        cache.store(keys[0], b'x' * 10)
+        cache.set_file_id(keys[0], 'file-a')
+        cache.store(keys[1], b'x' * 10)
+        cache.store(keys[2], b'x' * 10)
+
+        self.assertEqual(cache.lookup(keys[0]), (None, None))
+        self.assertFalse(os.path.exists(cache.path_for(keys[0])))
+
+
+if __name__ == '__main__':
+    unittest.main()
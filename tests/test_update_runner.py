@@ -0,0 +1,135 @@
+"""
+OrderedUpdateRunner: порядок внутри чата, параллельность между чатами,
+ограничение очереди чата и общей очереди
+"""
+
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiogram.types import Update  # noqa: E402
+
+from journal import DROPPED  # noqa: E402
+from update_runner import OrderedUpdateRunner  # noqa: E402
+
+
+def make_update(update_id: int, chat_id: int) -> Update:
+    return Update.model_validate({
+        'update_id': update_id,
+        'message': {
+            'message_id': update_id,
+            'date': 0,
+            'chat': {'id': chat_id, 'type': 'private'},
+            'text': str(update_id),
+        },
+    })
+
+
+class FakeDispatcher:
+    """
+    feed_update ждет release (если задан) и записывает порядок обработки
+    """
+
+    def __init__(self, release: asyncio.Event = None):
+        self.release = release
+        self.started = []
+        self.finished = []
+        self.active = {}  # чат -> обрабатываемых сейчас обновлений
+        self.max_active_per_chat = 0
+        self.max_active = 0
+
+    async def feed_update(self, bot, update):
+        chat_id = update.message.chat.id
+        self.started.append(update.update_id)
+        self.active[chat_id] = self.active.get(chat_id, 0) + 1
+        self.max_active_per_chat = max(self.max_active_per_chat, self.active[chat_id])
+        self.max_active = max(self.max_active, sum(self.active.values()))
+        try:
+            if self.release is not None:
+                await self.release.wait()
+            else:
+                await asyncio.sleep(0.001 * (update.update_id % 3))
+        finally:
+            self.active[chat_id] -= 1
+            self.finished.append(update.update_id)
+
+
+class FakeJournal:
+    def __init__(self):
+        self.finished = []
+
+    def finish(self, update_id, outcome=0, duration=0.0):
+        self.finished.append((update_id, outcome))
+
+
+class OrderTest(unittest.IsolatedAsyncioTestCase):
+    async def test_updates_of_one_chat_are_processed_in_order(self):
+        dp = FakeDispatcher()
+        runner = OrderedUpdateRunner(dp, None, workers=8)
+        runner.start()
+        for update_id in range(1, 21):
+            await runner.submit(make_update(update_id, chat_id=update_id % 2))
+        await asyncio.wait_for(runner.join(), 5)
+        await runner.stop()
+
+        for chat_id in (0, 1):
+            expected = [update_id for update_id in range(1, 21) if update_id % 2 == chat_id]
+            self.assertEqual([update_id for update_id in dp.finished if update_id % 2 == chat_id], expected)
+        self.assertEqual(dp.max_active_per_chat, 1)
+        self.assertEqual(runner.processed, 20)
+
+    async def test_chats_are_processed_concurrently(self):
+        release = asyncio.Event()
+        dp = FakeDispatcher(release)
+        runner = OrderedUpdateRunner(dp, None, workers=8)
+        runner.start()
+        for chat_id in range(3):
+            await runner.submit(make_update(chat_id + 1, chat_id))
+        await asyncio.sleep(0.05)
+        # Все три чата обрабатываются одновременно, пока ни одно обновление не завершено
+        self.assertEqual(dp.max_active, 3)
+        self.assertEqual(runner.stats()['active'], 3)
+        release.set()
+        await asyncio.wait_for(runner.join(), 5)
+        await runner.stop()
+
+
+class LimitsTest(unittest.IsolatedAsyncioTestCase):
+    async def test_per_chat_cap_drops_updates(self):
+        journal = FakeJournal()
+        runner = OrderedUpdateRunner(FakeDispatcher(), None, workers=1, max_per_chat=2, journal=journal)
+        self.assertTrue(await runner.submit(make_update(1, 7)))
+        self.assertTrue(await runner.submit(make_update(2, 7)))
+        self.assertFalse(await runner.submit(make_update(3, 7)))
+        # Другой чат не затронут
+        self.assertTrue(await runner.submit(make_update(4, 8)))
+        self.assertEqual(runner.dropped, 1)
+        self.assertEqual(journal.finished, [(3, DROPPED)])
+
+        runner.start()
+        await asyncio.wait_for(runner.join(), 5)
+        await runner.stop()
+        self.assertEqual(runner.processed, 3)
+
+    async def test_submit_waits_while_queue_is_full(self):
+        runner = OrderedUpdateRunner(FakeDispatcher(), None, workers=2, max_pending=2)
+        await runner.submit(make_update(1, 1))
+        await runner.submit(make_update(2, 2))
+
+        blocked = asyncio.create_task(runner.submit(make_update(3, 3)))
+        await asyncio.sleep(0.05)
+        self.assertFalse(blocked.done())
+
+        # Воркеры освобождают места в очереди - submit продолжается
+        runner.start()
+        self.assertTrue(await asyncio.wait_for(blocked, 5))
+        await asyncio.wait_for(runner.join(), 5)
+        await runner.stop()
+        self.assertEqual(runner.processed, 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
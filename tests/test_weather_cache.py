@@ -0,0 +1,93 @@
+"""
+Кэш погоды: single-flight, stale-while-revalidate, устаревшие данные при ошибке
+"""
+
+import asyncio
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from weather_cache import WeatherCache  # noqa: E402
+
+
+class Loader:
+    def __init__(self, *results, delay: float = 0.01):
+        self.results = list(results)
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        result = self.results.pop(0) if len(self.results) > 1 else self.results[0]
+        if isinstance(result, BaseException):
+            raise result
+        return result
+
+
+def age_entry(cache: WeatherCache, key, seconds: float):
+    data, _ = cache._entries[key]
+    cache._entries[key] = (data, time.monotonic() - seconds)
+
+
+class WeatherCacheTest(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_misses_share_one_load(self):
+        cache = WeatherCache(ttl=60)
+        loader = Loader({'temp': 1})
+        results = await asyncio.gather(*(cache.get(1, loader) for _ in range(50)))
+        self.assertEqual(loader.calls, 1)
+        self.assertEqual(results, [{'temp': 1}] * 50)
+
+    async def test_fresh_entry_is_served_from_memory(self):
+        cache = WeatherCache(ttl=60)
+        loader = Loader({'temp': 1})
+        await cache.get(1, loader)
+        self.assertEqual(await cache.get(1, loader), {'temp': 1})
+        self.assertEqual(loader.calls, 1)
+        self.assertEqual(cache.hits, 1)
+
+    async def test_stale_entry_is_served_and_refreshed_in_background(self):
+        cache = WeatherCache(ttl=60, stale_ttl=60)
+        loader = Loader({'temp': 1}, {'temp': 2})
+        await cache.get(1, loader)
+        age_entry(cache, 1, 90)
+
+        # Устаревшие данные отдаются сразу, не дожидаясь загрузки
+        self.assertEqual(await cache.get(1, loader), {'temp': 1})
+        self.assertEqual(cache.stale_hits, 1)
+        await asyncio.gather(*cache._inflight.values())
+        self.assertEqual(await cache.get(1, loader), {'temp': 2})
+        self.assertEqual(loader.calls, 2)
+
+    async def test_failed_refresh_keeps_stale_data(self):
+        cache = WeatherCache(ttl=60, stale_ttl=60)
+        loader = Loader({'temp': 1}, RuntimeError('API недоступен'))
+        await cache.get(1, loader)
+        age_entry(cache, 1, 90)
+
+        self.assertEqual(await cache.get(1, loader), {'temp': 1})
+        await asyncio.gather(*cache._inflight.values())
+        # Ошибка обновления не стирает последние данные
+        self.assertEqual(await cache.get(1, loader), {'temp': 1})
+        self.assertEqual(cache.peek(1), {'temp': 1})
+
+    async def test_expired_entry_is_reloaded(self):
+        cache = WeatherCache(ttl=60, stale_ttl=60)
+        loader = Loader({'temp': 1}, {'temp': 2})
+        await cache.get(1, loader)
+        age_entry(cache, 1, 200)
+        self.assertEqual(await cache.get(1, loader), {'temp': 2})
+        self.assertEqual(cache.misses, 2)
+
+    async def test_failed_load_on_miss_returns_none(self):
+        cache = WeatherCache(ttl=60)
+        loader = Loader(RuntimeError('API недоступен'))
+        self.assertIsNone(await cache.get(1, loader))
+        self.assertIsNone(cache.peek(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
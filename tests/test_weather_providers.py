@@ -0,0 +1,136 @@
+"""
+Circuit breaker и обработка ошибок источников погоды
+"""
+
+import asyncio
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from weather_providers import (  # noqa: E402
+    OpenWeatherMapProvider,
+    ResilientWeatherProvider,
+    WeatherProviderError,
+    WeatherUnavailable,
+)
+
+RESET_TIMEOUT = 0.05
+
+
+class FakeProvider:
+    """
+    Источник, который по очереди выдает заданные результаты или исключения
+    """
+
+    name = 'fake'
+
+    def __init__(self, *outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = 0
+
+    async def fetch(self, city_id):
+        self.calls += 1
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+
+def make_resilient(provider) -> ResilientWeatherProvider:
+    return ResilientWeatherProvider(
+        [provider],
+        attempts=1,
+        attempt_timeout=1,
+        backoff=0,
+        deadline=1,
+        failure_threshold=1,
+        reset_timeout=RESET_TIMEOUT,
+    )
+
+
+class HalfOpenTest(unittest.IsolatedAsyncioTestCase):
+    async def test_probe_success_closes_breaker(self):
+        provider = FakeProvider(WeatherProviderError('fake: HTTP 500'), {'id': 1})
+        resilient = make_resilient(provider)
+
+        with self.assertRaises(WeatherUnavailable):
+            await resilient.fetch(1)
+        self.assertTrue(resilient.stats()['fake']['open'])
+
+        # Пока breaker открыт, источник не вызывается
+        with self.assertRaises(WeatherUnavailable):
+            await resilient.fetch(1)
+        self.assertEqual(provider.calls, 1)
+
+        await asyncio.sleep(RESET_TIMEOUT * 1.5)
+        self.assertEqual(await resilient.fetch(1), {'id': 1})
+        self.assertFalse(resilient.stats()['fake']['open'])
+
+    async def test_unexpected_probe_error_does_not_stick(self):
+        provider = FakeProvider(
+            WeatherProviderError('fake: HTTP 500'),
+            json.JSONDecodeError('Expecting value', '', 0),
+            {'id': 1},
+        )
+        resilient = make_resilient(provider)
+
+        with self.assertRaises(WeatherUnavailable):
+            await resilient.fetch(1)
+        await asyncio.sleep(RESET_TIMEOUT * 1.5)
+
+        # Пробный запрос упал непредвиденной ошибкой - breaker снова открыт
+        with self.assertRaises(WeatherUnavailable):
+            await resilient.fetch(1)
+        self.assertTrue(resilient.stats()['fake']['open'])
+
+        # ...но после reset_timeout пробный запрос снова разрешен
+        await asyncio.sleep(RESET_TIMEOUT * 1.5)
+        self.assertEqual(await resilient.fetch(1), {'id': 1})
+        self.assertEqual(provider.calls, 3)
+
+
+class FakeResponse:
+    def __init__(self, status: int, body: str):
+        self.status = status
+        self.body = body
+
+    async def json(self):
+        return json.loads(self.body)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeHttpClient:
+    def __init__(self, status: int, body: str):
+        self.session = self
+        self.response = FakeResponse(status, body)
+
+    def get(self, url, params=None):
+        return self.response
+
+
+class PayloadTest(unittest.IsolatedAsyncioTestCase):
+    async def test_malformed_json_is_provider_error(self):
+        provider = OpenWeatherMapProvider(FakeHttpClient(200, '<html>'), 'http://owm', 'key')
+        with self.assertRaises(WeatherProviderError):
+            await provider.fetch(1)
+
+    async def test_non_dict_payload_is_provider_error(self):
+        provider = OpenWeatherMapProvider(FakeHttpClient(200, '[1, 2]'), 'http://owm', 'key')
+        with self.assertRaises(WeatherProviderError):
+            await provider.fetch_group([1, 2])
+
+    async def test_unknown_city_is_none(self):
+        provider = OpenWeatherMapProvider(FakeHttpClient(404, '{}'), 'http://owm', 'key')
+        self.assertIsNone(await provider.fetch(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
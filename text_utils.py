@@ -0,0 +1,10 @@
+"""
+Общие функции обработки текста
+"""
+
+
+def normalize_text(text: str) -> str:
+    """
+    Нормализует текст для ключа кэша: схлопывает пробелы и переводы строк
+    """
+    return ' '.join(text.split())
@@ -0,0 +1,168 @@
+"""
+Ограничение частоты запросов: по пользователю и команде, а также общий
+лимит исходящих запросов к Telegram API
+"""
+
+import asyncio
+import logging
+import time
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware
+from aiogram.dispatcher.flags import get_flag
+from aiogram.methods import GetUpdates
+from aiogram.types import Message
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """
+    Token bucket: rate токенов в секунду, не больше capacity в запасе
+    """
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated_at')
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def reserve(self, max_wait: float = None):
+        """
+        Резервирует токен. Возвращает, сколько секунд нужно подождать
+        (0 - токен доступен сразу), или None, если ждать дольше max_wait
+        """
+        self._refill(time.monotonic())
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        wait = (1 - self.tokens) / self.rate
+        if max_wait is not None and wait > max_wait:
+            return None
+        # Токен уходит в минус: следующие запросы встанут в очередь за этим
+        self.tokens -= 1
+        return wait
+
+    def is_idle(self, now: float) -> bool:
+        """
+        Бакет полностью восстановился и его можно удалить без потери состояния
+        """
+        return self.tokens + (now - self.updated_at) * self.rate >= self.capacity
+
+
+class RateLimiter:
+    """
+    Набор token bucket'ов по ключу (пользователь, команда).
+
+    Запрос сверх лимита ждет своей очереди, если ждать не дольше max_wait,
+    иначе отклоняется. Неактивные бакеты периодически удаляются.
+    """
+
+    PURGE_EVERY = 1000
+
+    def __init__(self, limits: dict, max_wait: float = 2.0):
+        self.limits = limits  # команда -> (токенов в секунду, запас)
+        self.max_wait = max_wait
+        self._buckets = {}
+        self._calls = 0
+        self.allowed = {}
+        self.queued = {}
+        self.rejected = {}
+
+    async def acquire(self, user_id: int, name: str):
+        """
+        Возвращает (True, 0) если запрос можно выполнять (возможно, после
+        ожидания), или (False, retry_after) если он отклонен
+        """
+        limit = self.limits.get(name)
+        if limit is None:
+            return True, 0
+
+        key = (user_id, name)
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(*limit)
+
+        self._calls += 1
+        if self._calls % self.PURGE_EVERY == 0:
+            self._purge()
+
+        wait = bucket.reserve(self.max_wait)
+        if wait is None:
+            self.rejected[name] = self.rejected.get(name, 0) + 1
+            return False, (1 - bucket.tokens) / bucket.rate
+
+        if wait > 0:
+            self.queued[name] = self.queued.get(name, 0) + 1
+            await asyncio.sleep(wait)
+        self.allowed[name] = self.allowed.get(name, 0) + 1
+        return True, 0
+
+    def stats(self) -> dict:
+        return {
+            'buckets': len(self._buckets),
+            'allowed': dict(self.allowed),
+            'queued': dict(self.queued),
+            'rejected': dict(self.rejected),
+        }
+
+    def _purge(self):
+        now = time.monotonic()
+        for key in [key for key, bucket in self._buckets.items() if bucket.is_idle(now)]:
+            del self._buckets[key]
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    Middleware для хендлеров с флагом rate_limit, например
+    @dp.message(Command("weather"), flags={'rate_limit': 'weather'})
+    """
+
+    def __init__(self, limiter: RateLimiter, reject_template):
+        self.limiter = limiter
+        # Шаблон ответа с полем {seconds} (templates.Template)
+        self.reject_template = reject_template
+
+    async def __call__(self, handler, event: Message, data: dict):
+        name = get_flag(data, 'rate_limit')
+        if not name or event.from_user is None:
+            return await handler(event, data)
+
+        allowed, retry_after = await self.limiter.acquire(event.from_user.id, name)
+        if not allowed:
+            logger.info(f"Запрос {name} от {event.from_user.id} отклонен лимитом")
+            await event.answer(self.reject_template.render(seconds=int(retry_after) + 1))
+            return None
+        return await handler(event, data)
+
+
+class OutboundRateLimiter(BaseRequestMiddleware):
+    """
+    Общий лимит исходящих запросов бота к Telegram API.
+
+    Запросы сверх лимита не отклоняются, а ждут своей очереди.
+    Long polling (getUpdates) не учитывается.
+    """
+
+    def __init__(self, rate: float = 30, capacity: float = 30):
+        self.bucket = TokenBucket(rate, capacity)
+        self.sent = 0
+        self.queued = 0
+
+    async def __call__(self, make_request, bot: Bot, method):
+        if not isinstance(method, GetUpdates):
+            wait = self.bucket.reserve()
+            if wait > 0:
+                self.queued += 1
+                await asyncio.sleep(wait)
+            self.sent += 1
+        return await make_request(bot, method)
+
+    def stats(self) -> dict:
+        return {'sent': self.sent, 'queued': self.queued}
@@ -0,0 +1,114 @@
+"""
+LRU-кэш переводов с необязательным хранением в SQLite
+"""
+
+import logging
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+from text_utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class TranslationCache:
+    """
+    Кэш переводов по ключу (язык источника, язык перевода, нормализованный текст).
+
+    В памяти хранится не больше max_size последних переводов (LRU).
+    Если указан db_path, переводы также сохраняются в SQLite и переживают
+    перезапуск: промах в памяти проверяется по базе.
+    """
+
+    def __init__(self, max_size: int = 10000, db_path: str = None):
+        self.max_size = max_size
+        self.db_path = db_path
+        self._entries = OrderedDict()
+        self._db = None
+        self.hits = 0
+        self.misses = 0
+
+        if db_path:
+            try:
+                db_dir = os.path.dirname(db_path)
+                if db_dir:
+                    os.makedirs(db_dir, exist_ok=True)
+                self._db = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+                self._db.execute('PRAGMA journal_mode=WAL')
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS translations ('
+                    'source TEXT NOT NULL, target TEXT NOT NULL, text TEXT NOT NULL, '
+                    'translated TEXT NOT NULL, created_at REAL NOT NULL, '
+                    'PRIMARY KEY (source, target, text))'
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Не удалось открыть базу кэша переводов {db_path}: {e}")
+                self._db = None
+
+    def get(self, source: str, target: str, text: str):
+        """
+        Возвращает сохраненный перевод или None
+        """
+        key = (source, target, normalize_text(text))
+        translated = self._entries.get(key)
+        if translated is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return translated
+
+        if self._db is not None:
+            try:
+                row = self._db.execute(
+                    'SELECT translated FROM translations WHERE source = ? AND target = ? AND text = ?',
+                    key
+                ).fetchone()
+            except sqlite3.Error as e:
+                logger.error(f"Ошибка чтения кэша переводов: {e}")
+                row = None
+            if row is not None:
+                self._remember(key, row[0])
+                self.hits += 1
+                return row[0]
+
+        self.misses += 1
+        return None
+
+    def set(self, source: str, target: str, text: str, translated: str):
+        """
+        Сохраняет перевод в памяти и, если включено, в базе
+        """
+        key = (source, target, normalize_text(text))
+        self._remember(key, translated)
+
+        if self._db is not None:
+            try:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?)',
+                    key + (translated, time.time())
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Ошибка записи в кэш переводов: {e}")
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            'size': len(self._entries),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _remember(self, key, translated: str):
+        self._entries[key] = translated
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
@@ -0,0 +1,197 @@
+"""
+Дисковый кэш синтезированной речи с адресацией по содержимому
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+
+from text_utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+
+class TTSCache:
+    """
+    Кэш аудиофайлов gTTS, ключ - sha256 от (нормализованный текст, язык,
+    slow) с форматом аудио в конце (`<sha256>.ogg` или `<sha256>.mp3`).
+    Ключ одновременно имя файла, поэтому файл всегда отправляется с
+    настоящим расширением, а MP3, синтезированные без ffmpeg, не
+    выдаются за OGG после его установки.
+
+    Помимо файла на диске запоминает Telegram file_id отправленного
+    голосового сообщения: повторная фраза отправляется по file_id без
+    синтеза и без загрузки файла. Размер файлов на диске ограничен
+    max_bytes, при превышении удаляются давно не использованные файлы (LRU).
+
+    Папку могут использовать несколько процессов: у каждого свой индекс,
+    а файл, синтезированный другим процессом, находится по имени.
+    """
+
+    INDEX_NAME = 'index.json'
+
+    def __init__(self, cache_dir: str, max_bytes: int, max_entries: int = 10000):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+        self._index_path = os.path.join(cache_dir, self.INDEX_NAME)
+        # key -> {'size': int, 'file_id': str | None, 'last_used': float}
+        self._index = {}
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    @staticmethod
+    def make_key(text: str, lang: str, slow: bool, audio_format: str) -> str:
+        raw = f"{lang}\x00{int(slow)}\x00{normalize_text(text)}"
+        return f"{hashlib.sha256(raw.encode('utf-8')).hexdigest()}.{audio_format}"
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def lookup(self, key: str):
+        """
+        Возвращает (file_id, path) для ключа; любой из элементов может быть None
+        """
+        entry = self._index.get(key)
+        if entry is None:
+            entry = self._adopt(key)
+        if entry is None:
+            self.misses += 1
+            return None, None
+
+        path = self.path_for(key)
+        if entry['size'] and not os.path.exists(path):
+            entry['size'] = 0
+        if not entry['file_id'] and not entry['size']:
+            del self._index[key]
+            self.misses += 1
+            return None, None
+
+        self.hits += 1
+        entry['last_used'] = time.time()
+        return entry['file_id'], (path if entry['size'] else None)
+
+    def _adopt(self, key: str):
+        """
+        Добавляет в индекс файл, записанный другим процессом, если он есть
+        """
+        try:
+            size = os.path.getsize(self.path_for(key))
+        except OSError:
+            return None
+        entry = self._index[key] = {'size': size, 'file_id': None, 'last_used': 0.0}
+        return entry
+
+    def put(self, key: str):
+        """
+        Регистрирует файл, уже записанный по пути path_for(key)
+        """
+        size = os.path.getsize(self.path_for(key))
+        entry = self._index.setdefault(key, {'size': 0, 'file_id': None, 'last_used': 0.0})
+        entry['size'] = size
+        entry['last_used'] = time.time()
+        self._evict()
+        self._save_index()
+
+    def store(self, key: str, data: bytes):
+        """
+        Атомарно записывает аудио для ключа и регистрирует его
+        """
+        tmp_path = f"{self.path_for(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path_for(key))
+        self.put(key)
+
+    def set_file_id(self, key: str, file_id: str):
+        """
+        Запоминает Telegram file_id для ключа
+        """
+        entry = self._index.setdefault(key, {'size': 0, 'file_id': None, 'last_used': 0.0})
+        entry['file_id'] = file_id
+        entry['last_used'] = time.time()
+        self._save_index()
+
+    def forget_file_id(self, key: str):
+        """
+        Забывает file_id (например, если Telegram перестал его принимать)
+        """
+        entry = self._index.get(key)
+        if entry is not None and entry['file_id']:
+            entry['file_id'] = None
+            self._save_index()
+
+    def total_bytes(self) -> int:
+        return sum(entry['size'] for entry in self._index.values())
+
+    def _evict(self):
+        by_age = sorted(self._index.items(), key=lambda item: item[1]['last_used'])
+
+        # Удаляем самые старые записи целиком, если их слишком много
+        while len(self._index) > self.max_entries and by_age:
+            key, entry = by_age.pop(0)
+            self._remove_file(key, entry)
+            del self._index[key]
+
+        # Удаляем самые старые файлы, пока не уложимся в лимит.
+        # file_id при этом сохраняется: Telegram по-прежнему хранит файл у себя
+        total = self.total_bytes()
+        for key, entry in by_age:
+            if total <= self.max_bytes:
+                break
+            if entry['size']:
+                total -= entry['size']
+                self._remove_file(key, entry)
+                if not entry['file_id']:
+                    del self._index[key]
+
+    def _remove_file(self, key: str, entry: dict):
+        try:
+            os.unlink(self.path_for(key))
+        except FileNotFoundError:
+            pass
+        entry['size'] = 0
+
+    def _load_index(self):
+        try:
+            with open(self._index_path, 'r', encoding='utf-8') as f:
+                self._index = json.load(f)
+        except FileNotFoundError:
+            self._index = {}
+        except Exception as e:
+            logger.error(f"Не удалось прочитать индекс кэша голосовых сообщений: {e}")
+            self._index = {}
+        self._drop_legacy_entries()
+
+    def _drop_legacy_entries(self):
+        """
+        Удаляет записи старого формата: ключ без формата аудио, файл
+        `<ключ>.ogg`, в котором мог оказаться MP3
+        """
+        legacy = [key for key in self._index if '.' not in key]
+        for key in legacy:
+            try:
+                os.unlink(os.path.join(self.cache_dir, key + '.ogg'))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.error(f"Не удалось удалить старый файл кэша голосовых сообщений {key}: {e}")
+            del self._index[key]
+        if legacy:
+            logger.info(f"Из кэша голосовых сообщений удалено записей старого формата: {len(legacy)}")
+            self._save_index()
+
+    def _save_index(self):
+        # Временный файл у каждого процесса свой
+        tmp_path = f"{self._index_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(self._index, f)
+            os.replace(tmp_path, self._index_path)
+        except Exception as e:
+            logger.error(f"Не удалось сохранить индекс кэша голосовых сообщений: {e}")
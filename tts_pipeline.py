@@ -0,0 +1,134 @@
+"""
+Синтез речи в памяти: параллельный синтез фрагментов текста gTTS
+и кодирование в OGG/Opus через ffmpeg
+"""
+
+import asyncio
+import logging
+import re
+import shutil
+
+from metrics import track_backend
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_END = re.compile(r'(?<=[.!?…;])\s+')
+
+
+def gtts_factory(**kwargs):
+    """
+    Создает gTTS; gtts (вместе с requests) импортируется при первом синтезе
+    """
+    from gtts import gTTS
+    return gTTS(**kwargs)
+
+
+def split_segments(text: str, max_chars: int = 200) -> list:
+    """
+    Делит текст на фрагменты не длиннее max_chars по границам предложений.
+    Короткие предложения объединяются, слишком длинные делятся по словам
+    """
+    pieces = []
+    for sentence in SENTENCE_END.split(' '.join(text.split())):
+        if len(sentence) <= max_chars:
+            pieces.append(sentence)
+            continue
+        words = []
+        for word in sentence.split(' '):
+            if words and len(' '.join(words)) + 1 + len(word) > max_chars:
+                pieces.append(' '.join(words))
+                words = []
+            words.append(word)
+        if words:
+            pieces.append(' '.join(words))
+
+    segments = []
+    for piece in pieces:
+        if not piece:
+            continue
+        if segments and len(segments[-1]) + 1 + len(piece) <= max_chars:
+            segments[-1] += ' ' + piece
+        else:
+            segments.append(piece)
+    return segments
+
+
+class SpeechSynthesizer:
+    """
+    Синтезирует речь без временных файлов.
+
+    Текст делится на фрагменты по предложениям, фрагменты синтезируются
+    параллельно в пуле потоков (с лимитом бэкенда 'tts'), и их MP3-потоки
+    склеиваются в памяти. Если доступен ffmpeg, результат перекодируется
+    в OGG/Opus, как у голосовых сообщений Telegram; иначе остается MP3.
+    """
+
+    def __init__(
+        self,
+        executor,
+        tts_factory=gtts_factory,
+        segment_chars: int = 200,
+        ffmpeg: str = 'ffmpeg',
+        opus_bitrate: str = '32k',
+    ):
+        self.executor = executor
+        self.tts_factory = tts_factory
+        self.segment_chars = segment_chars
+        self.ffmpeg = shutil.which(ffmpeg) if ffmpeg else None
+        self.opus_bitrate = opus_bitrate
+        if ffmpeg and self.ffmpeg is None:
+            logger.warning(f"ffmpeg ({ffmpeg}) не найден, голосовые сообщения будут отправляться в MP3")
+
+    @property
+    def audio_format(self) -> str:
+        """
+        Формат, который synthesize() возвращает, если перекодирование не сломалось
+        """
+        return 'ogg' if self.ffmpeg is not None else 'mp3'
+
+    async def synthesize(self, text: str, lang: str = 'ru', slow: bool = False):
+        """
+        Возвращает (аудио, формат), формат - 'ogg' или 'mp3'
+        """
+        segments = split_segments(text, self.segment_chars) or [text]
+        parts = await asyncio.gather(*(self._synthesize_segment(segment, lang, slow) for segment in segments))
+        audio = b''.join(parts)
+        if not audio or self.ffmpeg is None:
+            return audio, 'mp3'
+        try:
+            with track_backend('ffmpeg'):
+                return await self._encode_opus(audio), 'ogg'
+        except Exception as e:
+            logger.error(f"Не удалось перекодировать голосовое сообщение в OGG/Opus: {e}")
+            return audio, 'mp3'
+
+    async def _synthesize_segment(self, text: str, lang: str, slow: bool) -> bytes:
+        with track_backend('gtts'):
+            return await self.executor.run('tts', self._read_stream, text, lang, slow)
+
+    async def _encode_opus(self, audio: bytes) -> bytes:
+        process = await asyncio.create_subprocess_exec(
+            self.ffmpeg, '-hide_banner', '-loglevel', 'error',
+            '-f', 'mp3', '-i', 'pipe:0',
+            '-c:a', 'libopus', '-b:a', self.opus_bitrate, '-application', 'voip',
+            '-f', 'ogg', 'pipe:1',
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            encoded, errors = await process.communicate(audio)
+        except asyncio.CancelledError:
+            process.kill()
+            await process.wait()
+            raise
+        if process.returncode != 0 or not encoded:
+            raise RuntimeError(f"ffmpeg завершился с кодом {process.returncode}: {errors.decode(errors='replace').strip()}")
+        return encoded
+
+    def _read_stream(self, text: str, lang: str, slow: bool) -> bytes:
+        """
+        Собирает MP3-поток gTTS в память (выполняется в пуле потоков)
+        """
+        tts = self.tts_factory(text=text, lang=lang, slow=slow)
+        return b''.join(tts.stream())
@@ -0,0 +1,217 @@
+"""
+Параллельная обработка обновлений с сохранением порядка внутри чата
+"""
+
+import asyncio
+import logging
+from collections import deque
+
+from aiogram import Bot, Dispatcher
+from aiogram.methods import GetUpdates, TelegramMethod
+from aiogram.types import Update
+from aiogram.utils.backoff import Backoff, BackoffConfig
+
+from journal import DROPPED
+from shutdown import stop_signals
+
+logger = logging.getLogger(__name__)
+
+POLLING_BACKOFF = BackoffConfig(min_delay=1.0, max_delay=5.0, factor=1.3, jitter=0.1)
+
+
+def update_key(update: Update):
+    """
+    Ключ очереди обновления: чат, иначе пользователь. Обновления без чата
+    и пользователя получают собственный ключ и порядок для них не важен
+    """
+    try:
+        event = update.event
+    except Exception:
+        return ('update', update.update_id)
+    chat = getattr(event, 'chat', None) or getattr(getattr(event, 'message', None), 'chat', None)
+    if chat is not None:
+        return chat.id
+    user = getattr(event, 'from_user', None)
+    if user is not None:
+        return ('user', user.id)
+    return ('update', update.update_id)
+
+
+class OrderedUpdateRunner:
+    """
+    Обрабатывает обновления пулом из workers задач.
+
+    Обновления разных чатов обрабатываются параллельно, а одного чата -
+    строго по очереди: следующее начинается только после завершения
+    предыдущего (важно для состояний вроде waiting_for_voice_text).
+    Воркер берет из очереди чата одно обновление и возвращает чат в конец
+    общей очереди, поэтому активный чат не занимает воркер надолго.
+
+    Очередь ограничена: submit() ждет, пока в очереди больше max_pending
+    обновлений (при polling это задерживает следующий getUpdates), а
+    обновления сверх max_per_chat в очереди одного чата отбрасываются.
+
+    С journal (journal.UpdateJournal) обновления записываются в журнал
+    при получении, до подтверждения Telegram (см. poll_updates и webhook).
+    """
+
+    def __init__(self, dp: Dispatcher, bot: Bot, workers: int = 64, max_pending: int = 1000, max_per_chat: int = 100, journal=None):
+        self.dp = dp
+        self.bot = bot
+        self.journal = journal
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_per_chat = max_per_chat
+        self._chats = {}  # ключ чата -> deque ожидающих обновлений
+        self._ready = asyncio.Queue()  # чаты, которые ждут свободного воркера
+        self._slots = asyncio.Semaphore(max_pending)
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = []
+        self.pending = 0
+        self.active = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def submit(self, update: Update) -> bool:
+        """
+        Ставит обновление в очередь его чата. Возвращает False, если
+        обновление отброшено из-за переполнения очереди чата
+        """
+        key = update_key(update)
+        queue = self._chats.get(key)
+        if queue is not None and len(queue) >= self.max_per_chat:
+            self.dropped += 1
+            logger.warning(f"Очередь чата {key} переполнена, обновление {update.update_id} отброшено")
+            if self.journal is not None:
+                self.journal.finish(update.update_id, DROPPED)
+            return False
+
+        await self._slots.acquire()
+        queue = self._chats.get(key)
+        if queue is None:
+            # Чат не обрабатывается и не ждет воркера - ставим его в очередь
+            queue = self._chats[key] = deque()
+            self._ready.put_nowait(key)
+        queue.append(update)
+        self.pending += 1
+        self._idle.clear()
+        return True
+
+    async def _worker(self):
+        while True:
+            key = await self._ready.get()
+            queue = self._chats[key]
+            update = queue.popleft()
+            self.active += 1
+            try:
+                await self._process(update)
+            finally:
+                self.active -= 1
+                self.pending -= 1
+                self._slots.release()
+                if queue:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._chats[key]
+                if not self.pending:
+                    self._idle.set()
+
+    async def _process(self, update: Update):
+        try:
+            result = await self.dp.feed_update(self.bot, update)
+            if isinstance(result, TelegramMethod):
+                await self.dp.silent_call_request(bot=self.bot, result=result)
+            self.processed += 1
+        except Exception as e:
+            self.failed += 1
+            logger.exception(f"Ошибка обработки обновления {update.update_id}: {e}")
+
+    async def join(self):
+        """
+        Ждет, пока очередь опустеет
+        """
+        await self._idle.wait()
+
+    async def stop(self, timeout: float = 30):
+        """
+        Дожидается обработки очереди (не дольше timeout) и останавливает воркеры
+        """
+        if self._tasks and self.pending:
+            try:
+                await asyncio.wait_for(self.join(), timeout)
+            except asyncio.TimeoutError:
+                logger.warning(f"Не обработано обновлений при остановке: {self.pending}")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def stats(self) -> dict:
+        return {
+            'workers': self.workers,
+            'pending': self.pending,
+            'active': self.active,
+            'chats': len(self._chats),
+            'processed': self.processed,
+            'failed': self.failed,
+            'dropped': self.dropped,
+        }
+
+
+async def poll_updates(bot: Bot, runner: OrderedUpdateRunner, polling_timeout: int = 30, allowed_updates=None):
+    """
+    Long polling с передачей обновлений в runner. Следующий getUpdates
+    выполняется только после того, как все полученные обновления приняты
+    в очередь, поэтому при перегрузке обновления ждут на стороне Telegram.
+    С журналом обновления подтверждаются (offset) только после записи на диск
+    """
+    backoff = Backoff(config=POLLING_BACKOFF)
+    get_updates = GetUpdates(timeout=polling_timeout, allowed_updates=allowed_updates)
+    request_timeout = int(bot.session.timeout + polling_timeout) if bot.session.timeout else None
+    while True:
+        try:
+            updates = await bot(get_updates, request_timeout=request_timeout)
+        except Exception as e:
+            logger.error(f"Ошибка получения обновлений: {e}; повтор через {backoff.next_delay:.1f} с")
+            await backoff.asleep()
+            continue
+        backoff.reset()
+        if not updates:
+            continue
+
+        offset = updates[-1].update_id + 1
+        if runner.journal is not None:
+            # Уже записанные (повторно доставленные) обновления не обрабатываются второй раз
+            updates = await runner.journal.record(updates)
+        for update in updates:
+            await runner.submit(update)
+        get_updates.offset = offset
+
+
+async def run_polling(dp: Dispatcher, bot: Bot, runner: OrderedUpdateRunner, polling_timeout: int = 30):
+    """
+    Запускает polling через runner и работает до SIGINT/SIGTERM или отмены задачи.
+    При остановке дожидается обработки уже принятых обновлений
+    """
+    with stop_signals() as stop_event:
+        await dp.emit_startup(bot=bot, dispatcher=dp, bots=[bot], **dp.workflow_data)
+        runner.start()
+        user = await bot.me()
+        logger.info(f"Polling запущен для @{user.username}, воркеров: {runner.workers}")
+        polling = asyncio.create_task(
+            poll_updates(bot, runner, polling_timeout, allowed_updates=dp.resolve_used_update_types())
+        )
+        try:
+            await stop_event.wait()
+        finally:
+            logger.info("Остановка polling...")
+            polling.cancel()
+            await asyncio.gather(polling, return_exceptions=True)
+            await runner.stop()
+            await dp.emit_shutdown(bot=bot, dispatcher=dp, bots=[bot], **dp.workflow_data)
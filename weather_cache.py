@@ -0,0 +1,150 @@
+"""
+In-process кэш данных о погоде с TTL, single-flight и stale-while-revalidate
+"""
+
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class WeatherCache:
+    """
+    Кэш результатов загрузки погоды по ключу (например, ID города).
+
+    - данные моложе ttl отдаются сразу, без запроса к API;
+    - данные старше ttl, но не старше ttl + stale_ttl, тоже отдаются сразу,
+      а обновление запускается в фоне (stale-while-revalidate);
+    - пока для ключа идет загрузка, остальные вызовы ждут ее результат
+      и не отправляют собственных запросов (single-flight).
+
+    Если указан db_path, загруженные данные также пишутся в SQLite, а
+    промах в памяти сначала проверяется по базе: несколько процессов бота
+    с общей базой не запрашивают у API одни и те же города повторно.
+    """
+
+    def __init__(self, ttl: float, stale_ttl: float = 0, db_path: str = None):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = {}   # key -> (data, updated_at)
+        self._inflight = {}  # key -> asyncio.Task
+        self._db = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+        if db_path:
+            try:
+                db_dir = os.path.dirname(db_path)
+                if db_dir:
+                    os.makedirs(db_dir, exist_ok=True)
+                self._db = sqlite3.connect(db_path, timeout=5, check_same_thread=False)
+                self._db.execute('PRAGMA journal_mode=WAL')
+                self._db.execute(
+                    'CREATE TABLE IF NOT EXISTS weather ('
+                    'key TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)'
+                )
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Не удалось открыть базу кэша погоды {db_path}: {e}")
+                self._db = None
+
+    async def get(self, key, loader):
+        """
+        Возвращает данные для key, при необходимости вызывая loader().
+        loader - корутинная функция без аргументов, возвращающая данные или None
+        """
+        entry = self._entries.get(key)
+        if self._db is not None and (entry is None or time.monotonic() - entry[1] >= self.ttl):
+            # Данные могли обновить другие процессы
+            entry = self._read_shared(key, entry)
+        if entry is not None:
+            data, updated_at = entry
+            age = time.monotonic() - updated_at
+            if age < self.ttl:
+                self.hits += 1
+                return data
+            if age < self.ttl + self.stale_ttl:
+                # Отдаем устаревшие данные и обновляем их в фоне
+                self.stale_hits += 1
+                self._refresh(key, loader)
+                return data
+
+        self.misses += 1
+        # shield: отмена одного ожидающего хендлера не должна отменять общую загрузку
+        return await asyncio.shield(self._refresh(key, loader))
+
+    def put(self, key, data):
+        """
+        Кладет в кэш данные, полученные в обход get() (например, пакетом)
+        """
+        self._entries[key] = (data, time.monotonic())
+        self._write_shared(key, data)
+
+    def peek(self, key):
+        """
+        Возвращает закэшированные данные без учета TTL (или None)
+        """
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def _refresh(self, key, loader):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, loader))
+            self._inflight[key] = task
+        return task
+
+    async def _load(self, key, loader):
+        try:
+            data = await loader()
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении кэша погоды ({key}): {e}")
+            data = None
+        finally:
+            self._inflight.pop(key, None)
+
+        if data is not None:
+            self._entries[key] = (data, time.monotonic())
+            self._write_shared(key, data)
+        return data
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _read_shared(self, key, entry):
+        """
+        Возвращает запись из базы, если она новее записи в памяти
+        """
+        try:
+            row = self._db.execute('SELECT data, updated_at FROM weather WHERE key = ?', (str(key),)).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка чтения кэша погоды: {e}")
+            return entry
+        if row is None:
+            return entry
+
+        # Время записи в базе - по часам системы, в памяти - monotonic
+        updated_at = time.monotonic() - max(0.0, time.time() - row[1])
+        if entry is not None and entry[1] >= updated_at:
+            return entry
+        entry = self._entries[key] = (json.loads(row[0]), updated_at)
+        return entry
+
+    def _write_shared(self, key, data):
+        if self._db is None:
+            return
+        try:
+            self._db.execute(
+                'INSERT OR REPLACE INTO weather VALUES (?, ?, ?)',
+                (str(key), json.dumps(data, ensure_ascii=False), time.time())
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка записи в кэш погоды: {e}")
@@ -0,0 +1,206 @@
+"""
+Источники данных о погоде: таймауты, повторы с джиттером, circuit breaker
+и переключение на резервный источник
+"""
+
+import asyncio
+import logging
+import random
+import time
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+
+class WeatherProviderError(Exception):
+    """
+    Источник не ответил или ответил ошибкой
+    """
+
+
+class WeatherUnavailable(Exception):
+    """
+    Ни один источник не вернул данные
+    """
+
+
+class OpenWeatherMapProvider:
+    """
+    Источник с API OpenWeatherMap (или совместимым с ним).
+
+    fetch() возвращает данные в формате OpenWeatherMap или None, если
+    город неизвестен источнику. Любой другой сбой - WeatherProviderError.
+    """
+
+    def __init__(self, http_client, base_url: str, api_key: str, name: str = 'openweathermap'):
+        self.http_client = http_client
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.name = name
+
+    async def fetch(self, city_id: int):
+        return await self._get('weather', city_id)
+
+    async def fetch_group(self, city_ids: list) -> list:
+        data = await self._get('group', ','.join(str(city_id) for city_id in city_ids))
+        if not data:
+            return []
+        cities = data.get('list', [])
+        if not isinstance(cities, list):
+            raise WeatherProviderError(f"{self.name}: неожиданный ответ group: {type(cities).__name__}")
+        return cities
+
+    async def _get(self, endpoint: str, ids):
+        params = {'id': ids, 'appid': self.api_key, 'units': 'metric', 'lang': 'ru'}
+        try:
+            async with self.http_client.session.get(f"{self.base_url}/{endpoint}", params=params) as response:
+                if response.status == 404:
+                    return None
+                if response.status != 200:
+                    raise WeatherProviderError(f"{self.name}: HTTP {response.status}")
+                data = await response.json()
+        except aiohttp.ClientError as e:
+            raise WeatherProviderError(f"{self.name}: {e}") from e
+        except ValueError as e:
+            # Ответ 200 с некорректным JSON
+            raise WeatherProviderError(f"{self.name}: некорректный JSON: {e}") from e
+        if not isinstance(data, dict):
+            raise WeatherProviderError(f"{self.name}: неожиданный ответ: {type(data).__name__}")
+        return data
+
+
+class CircuitBreaker:
+    """
+    После failure_threshold сбоев подряд запросы к источнику не
+    выполняются reset_timeout секунд. Затем пропускается один пробный
+    запрос: успех закрывает breaker, сбой снова открывает его.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+        self.opened = 0
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        if self.opened_at is None:
+            return True
+        if self._probing or time.monotonic() - self.opened_at < self.reset_timeout:
+            return False
+        self._probing = True
+        return True
+
+    def record_success(self):
+        if self.opened_at is not None:
+            logger.info(f"Источник погоды {self.name} снова доступен, circuit breaker закрыт")
+        self.failures = 0
+        self.opened_at = None
+        self._probing = False
+
+    def cancel_probe(self):
+        """
+        Пробный запрос отменен, не успев завершиться
+        """
+        self._probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            if not self._probing:
+                logger.warning(f"Circuit breaker источника {self.name} открыт после {self.failures} сбоев подряд")
+                self.opened += 1
+            self.opened_at = time.monotonic()
+            self._probing = False
+
+
+class ResilientWeatherProvider:
+    """
+    Цепочка источников: основной и резервные, у каждого свой circuit breaker.
+
+    Каждая попытка ограничена attempt_timeout, после сбоя делается до
+    attempts попыток с паузой со случайным джиттером (full jitter от
+    backoff * 2^n), а весь вызов, включая переход к резервному источнику,
+    укладывается в deadline секунд. Источник с открытым breaker'ом
+    пропускается без запроса; если недоступны все, WeatherUnavailable
+    возникает сразу.
+    """
+
+    def __init__(
+        self,
+        providers: list,
+        attempts: int = 2,
+        attempt_timeout: float = 3,
+        backoff: float = 0.3,
+        deadline: float = 8,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30,
+    ):
+        self.providers = [
+            (provider, CircuitBreaker(provider.name, failure_threshold, reset_timeout))
+            for provider in providers
+        ]
+        self.attempts = attempts
+        self.attempt_timeout = attempt_timeout
+        self.backoff = backoff
+        self.deadline = deadline
+
+    async def fetch(self, city_id: int):
+        return await self._call('fetch', city_id)
+
+    async def fetch_group(self, city_ids: list) -> list:
+        return await self._call('fetch_group', city_ids)
+
+    async def _call(self, method: str, *args):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        errors = []
+        for provider, breaker in self.providers:
+            if deadline - loop.time() <= 0:
+                break
+            if not breaker.allow():
+                errors.append(f"{provider.name}: circuit breaker открыт")
+                continue
+            for attempt in range(self.attempts):
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    result = await asyncio.wait_for(
+                        getattr(provider, method)(*args),
+                        min(self.attempt_timeout, remaining),
+                    )
+                except asyncio.CancelledError:
+                    breaker.cancel_probe()
+                    raise
+                except Exception as e:
+                    # Любой сбой, в том числе непредвиденный, завершает пробный
+                    # запрос - иначе breaker остался бы открытым навсегда
+                    breaker.record_failure()
+                    if not isinstance(e, (WeatherProviderError, asyncio.TimeoutError)):
+                        logger.error(f"Непредвиденная ошибка источника погоды {provider.name}: {e!r}")
+                    if isinstance(e, asyncio.TimeoutError):
+                        errors.append(f"{provider.name}: таймаут")
+                    else:
+                        errors.append(str(e) or f"{provider.name}: {e!r}")
+                    if breaker.is_open or attempt + 1 == self.attempts:
+                        break
+                    pause = random.uniform(0, self.backoff * 2 ** attempt)
+                    await asyncio.sleep(min(pause, max(0.0, deadline - loop.time())))
+                    continue
+                breaker.record_success()
+                return result
+        raise WeatherUnavailable('; '.join(errors) or 'нет источников')
+
+    def stats(self) -> dict:
+        return {
+            provider.name: {'open': breaker.is_open, 'failures': breaker.failures, 'opened': breaker.opened}
+            for provider, breaker in self.providers
+        }
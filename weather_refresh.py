@@ -0,0 +1,78 @@
+"""
+Фоновое пакетное обновление погоды для закрепленных и самых запрашиваемых городов
+"""
+
+import asyncio
+import logging
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+
+class PopularCitiesRefresher:
+    """
+    Считает запросы по городам и раз в interval секунд обновляет погоду
+    для закрепленных городов (pinned() - например, город по умолчанию и
+    города подписок) и top_n самых популярных пачками по batch_size через
+    fetch_group(ids). Первое обновление выполняется сразу при запуске.
+
+    Счетчики после каждого цикла уменьшаются вдвое, чтобы список
+    популярных городов подстраивался под текущую нагрузку.
+    """
+
+    def __init__(self, cache, fetch_group, interval: float, top_n: int = 20, batch_size: int = 20, pinned=None):
+        self.cache = cache
+        self.fetch_group = fetch_group
+        self.pinned = pinned
+        self.interval = interval
+        self.top_n = top_n
+        self.batch_size = batch_size
+        self._counts = Counter()
+        self._task = None
+
+    def record(self, city_id: int):
+        self._counts[city_id] += 1
+
+    def popular(self) -> list:
+        return [city_id for city_id, _ in self._counts.most_common(self.top_n)]
+
+    async def refresh_once(self):
+        """
+        Обновляет погоду для закрепленных и популярных городов и кладет ее в кэш
+        """
+        city_ids = list(self.pinned() if self.pinned else [])
+        city_ids += [city_id for city_id in self.popular() if city_id not in city_ids]
+        for start in range(0, len(city_ids), self.batch_size):
+            batch = city_ids[start:start + self.batch_size]
+            results = await self.fetch_group(batch)
+            for data in results or []:
+                self.cache.put(data['id'], data)
+        if city_ids:
+            logger.info(f"Обновлена погода для городов: {len(city_ids)}")
+
+        # Затухание счетчиков
+        for city_id in list(self._counts):
+            self._counts[city_id] //= 2
+            if not self._counts[city_id]:
+                del self._counts[city_id]
+
+    async def run(self):
+        while True:
+            try:
+                await self.refresh_once()
+            except Exception as e:
+                logger.error(f"Ошибка фонового обновления погоды: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,167 @@
+"""
+Режим webhook: aiohttp-сервер, принимающий обновления от Telegram
+"""
+
+import hmac
+import logging
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+
+from journal import UpdateJournal
+from shutdown import stop_signals
+from update_runner import OrderedUpdateRunner
+
+logger = logging.getLogger(__name__)
+
+
+def ordered_webhook_handler(bot: Bot, runner: OrderedUpdateRunner, secret_token: str = None):
+    """
+    Обработчик POST-запросов Telegram, ставящий обновления в очередь runner.
+    Пока очередь переполнена, ответ задерживается и Telegram не шлет новые
+    обновления сверх своего лимита соединений. С журналом Telegram получает
+    ответ только после записи обновления на диск
+    """
+    async def handle(request: web.Request) -> web.Response:
+        if secret_token and not hmac.compare_digest(
+            request.headers.get('X-Telegram-Bot-Api-Secret-Token', ''), secret_token
+        ):
+            return web.Response(status=401, text='Unauthorized')
+        update = Update.model_validate(
+            await request.json(loads=bot.session.json_loads),
+            context={'bot': bot},
+        )
+        if runner.journal is not None and not await runner.journal.record([update]):
+            # Повторная доставка уже записанного обновления
+            return web.json_response({})
+        await runner.submit(update)
+        return web.json_response({})
+
+    return handle
+
+
+class JournalRequestHandler(SimpleRequestHandler):
+    """
+    SimpleRequestHandler, который отвечает Telegram только после записи
+    обновления в журнал; обработка, как и раньше, идет в фоне.
+    Повторная доставка уже записанного обновления сразу подтверждается
+    """
+
+    def __init__(self, journal: UpdateJournal, **kwargs):
+        super().__init__(**kwargs)
+        self.journal = journal
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if not self.verify_secret(request.headers.get('X-Telegram-Bot-Api-Secret-Token', ''), self.bot):
+            return web.Response(status=401, text='Unauthorized')
+        update = Update.model_validate(
+            await request.json(loads=self.bot.session.json_loads),
+            context={'bot': self.bot},
+        )
+        if not await self.journal.record([update]):
+            return web.json_response({})
+        return await super().handle(request)
+
+
+def health_handler(runner: OrderedUpdateRunner = None):
+    """
+    GET /health: процесс жив и event loop отвечает (используется супервизором)
+    """
+    async def handle(request: web.Request) -> web.Response:
+        return web.json_response({
+            'status': 'ok',
+            'updates': runner.stats() if runner is not None else None,
+        })
+
+    return handle
+
+
+def create_webhook_app(
+    dp: Dispatcher,
+    bot: Bot,
+    path: str,
+    secret_token: str = None,
+    runner: OrderedUpdateRunner = None,
+    journal: UpdateJournal = None,
+) -> web.Application:
+    """
+    Создает aiohttp-приложение, передающее обновления в те же хендлеры dp
+    (через очередь runner, если он задан). Без runner обновления
+    записываются в journal, если он задан, до ответа Telegram
+    """
+    app = web.Application()
+    app.router.add_get('/health', health_handler(runner))
+    if runner is not None:
+        app.router.add_post(path, ordered_webhook_handler(bot, runner, secret_token or None))
+    elif journal is not None:
+        JournalRequestHandler(
+            journal,
+            dispatcher=dp,
+            bot=bot,
+            secret_token=secret_token or None,
+        ).register(app, path=path)
+    else:
+        SimpleRequestHandler(
+            dispatcher=dp,
+            bot=bot,
+            secret_token=secret_token or None,
+        ).register(app, path=path)
+    setup_application(app, dp, bot=bot)
+    return app
+
+
+async def run_webhook(
+    dp: Dispatcher,
+    bot: Bot,
+    host: str,
+    port: int,
+    path: str,
+    secret_token: str = None,
+    base_url: str = None,
+    runner: OrderedUpdateRunner = None,
+    journal: UpdateJournal = None,
+):
+    """
+    Запускает webhook-сервер и работает до SIGINT/SIGTERM или отмены задачи.
+
+    Если задан base_url, при запуске webhook регистрируется в Telegram
+    (base_url + path), а при остановке удаляется. Без base_url сервер
+    просто принимает POST-запросы, что удобно для локальной проверки.
+    С runner обновления обрабатываются его воркерами, а при остановке
+    сервер дожидается обработки уже принятых обновлений. Без runner
+    обновления записываются в journal (если задан) до ответа Telegram.
+    """
+    app = create_webhook_app(dp, bot, path, secret_token, runner, journal)
+    if runner is not None:
+        runner.start()
+    app_runner = web.AppRunner(app)
+    await app_runner.setup()
+    site = web.TCPSite(app_runner, host=host, port=port)
+    await site.start()
+    logger.info(f"Webhook-сервер запущен на http://{host}:{port}{path}")
+
+    with stop_signals() as stop_event:
+        try:
+            if base_url:
+                webhook_url = base_url.rstrip('/') + path
+                await bot.set_webhook(
+                    url=webhook_url,
+                    secret_token=secret_token or None,
+                    allowed_updates=dp.resolve_used_update_types(),
+                )
+                logger.info(f"Webhook зарегистрирован: {webhook_url}")
+
+            await stop_event.wait()
+        finally:
+            logger.info("Остановка webhook-сервера...")
+            if base_url:
+                try:
+                    await bot.delete_webhook()
+                except Exception as e:
+                    logger.error(f"Не удалось удалить webhook: {e}")
+            # cleanup() дожидается завершения обработчиков и вызывает on_shutdown
+            if runner is not None:
+                await runner.stop()
+            await app_runner.cleanup()